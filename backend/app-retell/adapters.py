@@ -1,12 +1,19 @@
+import asyncio
 import json
-from typing import Any, Dict, Optional
+import logging
+from typing import Any, Dict, List, Optional
 from fastapi import WebSocket
 from .custom_types import ResponseResponse
 
+logger = logging.getLogger(__name__)
+
 
 class MessageAdapter:
     """Base adapter interface for different communication channels"""
 
+    # Trace id of the turn currently being answered, set by process_message
+    trace_id: Optional[str] = None
+
     async def receive_text(self) -> str:
         raise NotImplementedError
 
@@ -34,7 +41,13 @@ class SMSAdapter(MessageAdapter):
 
     def __init__(self, message: str):
         self.message = message
-        self.response: Optional[str] = None
+        self.responses: List[str] = []
+
+    @property
+    def response(self) -> Optional[str]:
+        # A turn can send more than one response, e.g. a reply followed by a
+        # confirmation request; SMS delivers them as one message.
+        return "\n\n".join(self.responses) if self.responses else None
 
     async def receive_text(self) -> str:
         # Return the SMS message in the same format as WebSocket
@@ -42,7 +55,7 @@ class SMSAdapter(MessageAdapter):
 
     async def send_json(self, data: Dict[str, Any]) -> None:
         # Store the response content
-        self.response = data["content"]
+        self.responses.append(data["content"])
 
 
 class RetellSocketAdapter(MessageAdapter):
@@ -50,12 +63,28 @@ class RetellSocketAdapter(MessageAdapter):
 
     def __init__(self, websocket: WebSocket):
         self.websocket = websocket
+        # Set once real content has been sent for this turn
+        self.first_content = asyncio.Event()
 
     async def receive_text(self) -> str:
         return await self.websocket.receive_text()
 
+    async def send_partial(self, response_id: int, content: str) -> None:
+        """Stream content that the rest of the response will follow."""
+        response = ResponseResponse(
+            response_id=response_id,
+            content=content,
+            content_complete=False,
+            end_call=False,
+        )
+        await self.websocket.send_json(response.__dict__)
+
     async def send_json(self, data: Dict[str, Any]) -> None:
-        print(f"Sending data from RetellSocketAdapter: {data}")
+        self.first_content.set()
+        logger.debug(
+            "Sending response to Retell",
+            extra={"response_id": data["response_id"], "payload": data["content"]},
+        )
         response = ResponseResponse(
             response_id=data["response_id"],
             content=data["content"],
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import List
+
+from .adapters import RetellSocketAdapter
+
+logger = logging.getLogger(__name__)
+
+# Seconds of silence on a voice turn before a filler is spoken
+FILLER_DELAY = float(os.getenv("VOICE_FILLER_DELAY", "1.2"))
+
+SEARCH_WORDS = {"house", "home", "homes", "bed", "bedroom", "bedrooms", "bath", "bathroom",
+                "price", "listing", "listings", "property", "properties", "apartment", "condo",
+                "buy", "budget", "under", "city", "area", "neighborhood"}
+APPOINTMENT_WORDS = {"appointment", "schedule", "book", "booking", "tour", "visit", "viewing",
+                     "calendar", "reschedule", "cancel", "meeting", "available"}
+
+FILLERS = {
+    "search": [
+        "Let me pull that up for you. ",
+        "Okay, let me take a look at what's out there. ",
+        "Sure, give me a second to search. ",
+    ],
+    "appointment": [
+        "One moment while I check the calendar. ",
+        "Let me take a look at the schedule. ",
+    ],
+    "general": [
+        "Hmm, let me think about that. ",
+        "Sure, one moment. ",
+    ],
+}
+
+# Fillers fired and silence they covered, for monitoring
+filler_stats = {"turns": 0, "fired": 0, "gap_seconds_total": 0.0}
+
+
+def choose_filler(user_text: str) -> str:
+    words = set(user_text.lower().replace("?", " ").replace(",", " ").split())
+    if words & APPOINTMENT_WORDS:
+        kind = "appointment"
+    elif words & SEARCH_WORDS:
+        kind = "search"
+    else:
+        kind = "general"
+    return random.choice(FILLERS[kind])
+
+
+class FillerTimer:
+    """
+    Watches a voice turn's deadline and speaks a filler if it's missed.
+
+    If the adapter hasn't sent any content within `delay` seconds, a short
+    context-appropriate filler is streamed as a non-final response, then the
+    real answer follows under the same response_id.
+    """
+
+    def __init__(
+        self,
+        adapter: RetellSocketAdapter,
+        response_id: int,
+        user_text: str,
+        delay: float = FILLER_DELAY,
+    ):
+        self.adapter = adapter
+        self.response_id = response_id
+        self.user_text = user_text
+        self.delay = delay
+        self.task = None
+        self.fired = False
+
+    def start(self) -> "FillerTimer":
+        filler_stats["turns"] += 1
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    async def _run(self) -> None:
+        try:
+            await asyncio.wait_for(self.adapter.first_content.wait(), self.delay)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+        self.fired = True
+        await self.adapter.send_partial(self.response_id, choose_filler(self.user_text))
+        fired_at = time.monotonic()
+        filler_stats["fired"] += 1
+        await self.adapter.first_content.wait()
+        gap = time.monotonic() - fired_at
+        filler_stats["gap_seconds_total"] += gap
+        logger.info(
+            f"Voice filler covered {gap:.2f}s "
+            f"({filler_stats['fired']}/{filler_stats['turns']} turns needed one)",
+            extra={
+                "response_id": self.response_id,
+                "trace_id": self.adapter.trace_id,
+                "filler_gap": gap,
+            },
+        )
+
+    async def finish(self) -> None:
+        """
+        Call when the turn is over; lets a fired filler record its gap. If the
+        turn sent nothing after the filler, Retell is still waiting for the
+        rest of the response, so an empty final one closes it.
+        """
+        if not self.fired:
+            self.task.cancel()
+        elif not self.adapter.first_content.is_set():
+            try:
+                await self.adapter.send_json({"response_id": self.response_id, "content": ""})
+            except Exception as e:
+                logger.warning(f"Could not close response {self.response_id} after a filler: {e}")
+            # Also lets a fired filler record its gap
+            self.adapter.first_content.set()
+
+
+def last_user_text(messages: List) -> str:
+    return messages[-1].content if messages else ""
@@ -0,0 +1,92 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List
+
+# Messages on the same thread arriving within this many seconds of each other
+# are answered as a single turn
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0.5"))
+
+# Set on a waiting message's future to make it the batch's leader
+_LEAD = object()
+
+
+@dataclass
+class _Pending:
+    content: str
+    run: Callable[[List[str]], Awaitable[None]]
+    done: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class ThreadMailbox:
+    """
+    Serialises graph runs per thread and coalesces bursts of messages.
+
+    The first message of a burst waits `window` seconds for more to arrive,
+    then takes the thread's lock and runs every message queued so far as one
+    turn: `run` gets them in order, for message_handler.burst_input to join
+    into a single user message. Messages that arrive while a
+    turn is running queue up behind it and are merged into the next turn, so
+    two runs never race on the same checkpoint.
+
+    The merged turn is run with the `run` callback of the latest message, so
+    the reply goes to the channel the user used last.
+    """
+
+    def __init__(self, window: float = COALESCE_WINDOW):
+        self.window = window
+        self.pending: Dict[str, List[_Pending]] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.runs = 0
+        self.messages = 0
+
+    async def submit(
+        self, thread_id: str, content: str, run: Callable[[List[str]], Awaitable[None]]
+    ) -> bool:
+        """
+        Queue `content` for `thread_id`; returns once the turn that included
+        it has finished. Returns True for the message whose `run` was used.
+        """
+        entry = _Pending(content, run)
+        batch = self.pending.setdefault(thread_id, [])
+        batch.append(entry)
+        self.messages += 1
+        if len(batch) > 1:
+            # Another message leads this batch and will run it, unless it's
+            # cancelled first and hands the lead on
+            if await entry.done is not _LEAD:
+                return entry.done.result()
+            entry.done = asyncio.get_running_loop().create_future()
+
+        lock = self.locks.setdefault(thread_id, asyncio.Lock())
+        try:
+            if self.window:
+                await asyncio.sleep(self.window)
+            await lock.acquire()
+        except asyncio.CancelledError:
+            # The batch isn't popped yet; leaving it without a leader would
+            # strand it and every later message on the thread
+            batch = self.pending[thread_id]
+            batch.remove(entry)
+            waiting = [e for e in batch if not e.done.done()]
+            if waiting:
+                waiting[0].done.set_result(_LEAD)
+            else:
+                del self.pending[thread_id]
+            raise
+        try:
+            batch = self.pending.pop(thread_id)
+            self.runs += 1
+            try:
+                await batch[-1].run([e.content for e in batch])
+            finally:
+                for e in batch:
+                    if not e.done.done():
+                        e.done.set_result(e is batch[-1])
+        finally:
+            lock.release()
+        # A waiting leader always has an unpopped batch, so this can't drop a
+        # lock someone is about to use
+        if thread_id not in self.pending and not lock.locked():
+            self.locks.pop(thread_id, None)
+        return entry.done.result()
@@ -3,7 +3,10 @@ import json
 import logging
 from datetime import datetime
 from langchain_core.messages import HumanMessage, ToolMessage, AIMessageChunk
-from src.util.appointment_tools import sensitive_tool_names
+from src.util.llm_scheduler import LlmOverloaded, current_channel
+from src.util.latency_budget import start_turn
+from src.util.metrics import TURN_SECONDS, current_trace_id, new_trace_id, span
+from src.util.structured_logging import bind_log_context
 from .adapters import MessageAdapter
 from typing import List
 from .custom_types import (
@@ -14,34 +17,114 @@ from .custom_types import (
 
 logger = logging.getLogger(__name__)
 
+BUSY_MESSAGE = "Sorry, I'm handling a lot of requests right now. Please try again in a moment."
+CONFIRMATION_PROMPT = "Confirmation Required, to confirm please reply with 'yes'"
+
+
+def stream_final_message(graph, graph_input, config):
+    """
+    Run the graph and return its last message and last non-empty content.
+
+    Uses stream_mode="updates" so each step yields only what the node just
+    wrote, instead of the whole state (and the whole message history).
+    """
+    last_message = None
+    final_content = ""
+    for event in graph.stream(graph_input, config, stream_mode="updates"):
+        for update in event.values():
+            if not isinstance(update, dict) or not update.get("messages"):
+                continue
+            messages = update["messages"]
+            last_message = messages[-1] if isinstance(messages, list) else messages
+            if last_message.content:
+                final_content = last_message.content
+                logger.debug("Updated final content", extra={"payload": final_content})
+    return last_message, final_content
+
+
+def burst_input(contents: List[str]):
+    """
+    process_message input for a burst of messages answered as one turn: the
+    messages joined, and the messages themselves, in case an approval is
+    pending that only the first of them answers.
+    """
+    return {"content": "\n".join(contents), "burst": contents}
+
 
 async def process_message(
     receiver: MessageAdapter, sender: MessageAdapter, graph, config, data
 ):
     """Main processing logic for incoming messages."""
-    print("Starting process_message")
     raw_data = data
-    print(f"Received raw data: {raw_data}")
-    if raw_data and "content" in raw_data:
-        message_content = raw_data["content"]
-        user_message = HumanMessage(content=message_content)
-
-        # Stream and collect the final response
-        last_event = None
-        final_content = ""
-
-        for event in graph.stream(
-            {"messages": [user_message]}, config, stream_mode="values"
-        ):
-            if "messages" in event and event["messages"]:
-                last_event = event["messages"][-1]
-                if last_event.content:
-                    final_content = last_event.content
-                    print(f"Updated final content: {final_content}")
+    logger.debug("Processing message", extra={"payload": raw_data})
+    if raw_data and ("content" in raw_data or "messages" in raw_data):
+        # Callers that already built the graph input (e.g. from a voice
+        # transcript) pass "messages"; everyone else passes plain "content".
+        # Voice callers also pass "new_input", what the user just said, which
+        # is None for a reminder or a frame that only corrects earlier speech.
+        if "messages" in raw_data:
+            input_messages = raw_data["messages"]
+            new_input = raw_data.get("new_input")
+        else:
+            input_messages = [HumanMessage(content=raw_data["content"])]
+            new_input = raw_data["content"]
+        burst = raw_data.get("burst") or []
+        # Messages of the burst left for a turn after the approval
+        follow_up = []
+        thread_config = config
+
+        # Stream and collect the final response. If the thread is parked on a
+        # sensitive tool call, the user's new input is the answer to it.
+        # LLM calls made for this turn are scheduled with the channel's
+        # priority, and nodes size their work to the channel's latency budget
+        channel = config["configurable"].get("channel", "web")
+        current_channel.set(channel)
+        config = start_turn(config, channel)
+
+        # Each turn gets a trace id; it follows the turn into the worker
+        # thread (context variables are copied) and out through the adapter
+        trace_id = new_trace_id()
+        current_trace_id.set(trace_id)
+        config["configurable"]["trace_id"] = trace_id
+        sender.trace_id = trace_id
+        bind_log_context(thread_id=config["configurable"]["thread_id"])
+
+        # The graph is synchronous, so it runs in a worker thread to keep the
+        # event loop free for other connections and webhooks.
+        try:
+            with span(TURN_SECONDS, channel=channel):
+                pending_tool_calls = await asyncio.to_thread(
+                    get_pending_sensitive_tool_calls, graph, config
+                )
+                if pending_tool_calls and new_input is None:
+                    # Only something the user says answers the approval
+                    last_event, final_content = None, CONFIRMATION_PROMPT
+                elif pending_tool_calls:
+                    # Only the first message of a burst answers, so "yes" and
+                    # "thanks" approve, then get a turn of their own
+                    if len(burst) > 1:
+                        new_input, follow_up = burst[0], burst[1:]
+                    last_event, final_content = await asyncio.to_thread(
+                        resume_pending_approval,
+                        graph,
+                        config,
+                        pending_tool_calls,
+                        new_input,
+                    )
+                elif not input_messages:
+                    logger.debug("Nothing new for the graph, skipping the turn")
+                    return
+                else:
+                    last_event, final_content = await asyncio.to_thread(
+                        stream_final_message, graph, {"messages": input_messages}, config
+                    )
+        except LlmOverloaded as e:
+            logger.warning(f"Turn shed by LLM scheduler: {e}")
+            await send_response(sender, BUSY_MESSAGE, config)
+            return
 
         # Only send the final response
         if final_content:
-            print(f"Sending final content")
             await send_response(sender, final_content, config)
 
         if last_event:
@@ -49,86 +132,104 @@ async def process_message(
             if response:
                 await send_response(sender, response, config)
 
+        if follow_up:
+            await process_message(receiver, sender, graph, thread_config, burst_input(follow_up))
+
 
 async def handle_event(last_event, sender, graph, config):
     """Handle the last event and return the appropriate response."""
-    print(f"Handling event: {last_event}")
+    from src.util.appointment_tools import sensitive_tool_names
+
+    logger.debug("Handling event", extra={"payload": last_event})
     tool_calls = last_event.additional_kwargs.get("tool_calls")
     if tool_calls and tool_calls[-1]["function"]["name"] in sensitive_tool_names:
-        print(f"Sensitive tool call detected: {tool_calls[-1]}")
+        logger.info(
+            "Sensitive tool call detected",
+            extra={"tool": tool_calls[-1]["function"]["name"]},
+        )
         return await handle_sensitive_tool_call(
             sender, graph, tool_calls[-1]["id"], config
         )
     else:
-        logger.info("Processing regular event")
-        print("Processing regular event")
+        logger.debug("Processing regular event")
         return None
 
 
 async def handle_sensitive_tool_call(sender, graph, tool_call_id, config):
-    """Handle the logic for sensitive tool calls."""
+    """
+    Ask the user to confirm a sensitive tool call.
+
+    The graph is already interrupted before `sensitive_appointment_tools` and
+    the interrupt lives in the checkpoint, so nothing waits here: the next
+    inbound message on the thread, on any channel, resumes or rejects it
+    (see `resume_pending_approval`).
+    """
     logger.info("Interruption detected for sensitive tool")
-    print("Interruption detected for sensitive tool")
-    await send_response(
-        sender, "Confirmation Required, to confirm please reply with 'yes'", config
+    await send_response(sender, CONFIRMATION_PROMPT, config)
+    return None
+
+
+def get_pending_sensitive_tool_calls(graph, config):
+    """Return the tool calls awaiting approval on this thread, if any."""
+    snapshot = graph.get_state(config)
+    if "sensitive_appointment_tools" not in (snapshot.next or ()):
+        return []
+    return snapshot.values["messages"][-1].tool_calls
+
+
+def record_transcript_corrections(graph, config, messages):
+    """
+    Write ASR corrections of earlier utterances into the checkpoint without
+    running a turn. A thread waiting on an approval is left as it is, so the
+    update can't move it past the interrupt.
+    """
+    if messages and not get_pending_sensitive_tool_calls(graph, config):
+        graph.update_state(config, {"messages": messages})
+
+
+def approval_input(tool_calls, user_reply: str):
+    """
+    Graph input that answers pending tool calls: None resumes them as they
+    are, anything but "yes" rejects them with the user's reply.
+    """
+    user_approval = user_reply.strip().strip(".!").lower()
+    if user_approval == "yes":
+        return None
+
+    prompt = (
+        f"Action not approved. User replied: '{user_reply}'. "
+        "Please suggest alternatives or ask if there's anything else you can help with."
     )
+    logger.info("Rejected tool calls", extra={"tool_call_ids": [tc["id"] for tc in tool_calls]})
+    return {
+        "messages": [
+            ToolMessage(content=prompt, tool_call_id=tc["id"]) for tc in tool_calls
+        ]
+    }
 
-    approval_data = await receive_message(sender)
-    if approval_data:
-        user_approval = approval_data.get("content", "").strip().lower()
-        if user_approval == "yes":
-            final_content = ""
-            for event in graph.stream(None, config, stream_mode="values"):
-                if "messages" in event and event["messages"]:
-                    message = event["messages"][-1]
-                    if message.content:
-                        final_content = message.content
-            # Send only the final response
-            if final_content:
-                await send_response(sender, final_content, config)
-            return None
-        else:
-            prompt = "Action not approved. Please suggest alternatives or ask if there's anything else you can help with."
-            print(f"last_toolcall: {tool_call_id} \n")
-            final_content = ""
-            for event in graph.stream(
-                {"messages": [ToolMessage(content=prompt, tool_call_id=tool_call_id)]},
-                config,
-                stream_mode="values",
-            ):
-                if "messages" in event and event["messages"]:
-                    message = event["messages"][-1]
-                    if message.content:
-                        final_content = message.content
-
-            # Send only the final response
-            if final_content:
-                await send_response(sender, final_content, config)
-            return None
-
-    return "User did not respond in time."
+
+def resume_pending_approval(graph, config, tool_calls, user_reply: str):
+    """Resume an interrupted thread from its checkpoint with the user's answer."""
+    return stream_final_message(graph, approval_input(tool_calls, user_reply), config)
 
 
 async def receive_message(receiver: MessageAdapter, timeout=3600):
     """Receive a message from the specified receiver (websocket, SMS, etc.)."""
-    print("Waiting to receive message")
     try:
         raw_data = await asyncio.wait_for(receiver.receive_text(), timeout)
-        print(f"Raw data received: {raw_data}")
+        logger.debug("Raw data received", extra={"payload": raw_data})
         return json.loads(raw_data)
     except asyncio.TimeoutError:
         logger.warning("Message reception timed out.")
-        print("Message reception timed out.")
         return None
     except json.JSONDecodeError as e:
         logger.error(f"Failed to decode JSON: {e}")
-        print(f"Failed to decode JSON: {e}")
         return None
 
 
 async def send_response(sender: MessageAdapter, response, config):
     """Send a response back through the specified sender (websocket, SMS, etc.)."""
-    print(f"Sending response: {response}")
+    logger.debug("Sending response", extra={"payload": response})
     response_payload = {
         "type": "bot_response",
         "content": response,
@@ -136,6 +237,8 @@ async def send_response(sender: MessageAdapter, response, config):
     }
     if "response_id" in config["configurable"]:
         response_payload["response_id"] = config["configurable"]["response_id"]
+    if "trace_id" in config["configurable"]:
+        response_payload["trace_id"] = config["configurable"]["trace_id"]
     await sender.send_json(response_payload)
 
 
@@ -1,11 +1,53 @@
-import os
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
 beginSentence = "How may I help you?"
+fallbackSentence = "I am sorry, can you say that again?"
 
 
 class LlmDummyMock:
-    def __init__(self):
-        pass
+    """
+    Stand-in for the LLM, for running the voice socket and the graph offline.
+
+    `draft_response` answers every Retell turn with a fixed line. For the
+    graph, `chat_model` returns a chat model that replays scripted responses
+    in order (e.g. recorded conversations, see benchmarks/replay.py) and
+    falls back to the same fixed line once the script runs out.
+
+    A scripted response is {"content": ...}, {"tool_calls": [{"name": ...,
+    "args": {...}}]} or both, optionally with the "latency" it took when
+    it was recorded.
+    """
+
+    def __init__(self, responses: Optional[Iterable[Dict]] = None, latency_scale: float = 0.0):
+        self.responses = deque(responses or [])
+        # Recorded latencies are replayed scaled by this; 0 answers at once
+        self.latency_scale = latency_scale
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def push(self, responses: Iterable[Dict]) -> None:
+        with self.lock:
+            self.responses.extend(responses)
+
+    def next_response(self) -> Dict:
+        with self.lock:
+            self.calls += 1
+            if self.responses:
+                return self.responses.popleft()
+        return {"content": fallbackSentence}
+
+    def chat_model(self, model: str = "mock") -> "ScriptedChatModel":
+        return ScriptedChatModel(mock=self, model_name=model)
 
     def draft_begin_messsage(self):
         return {
@@ -18,7 +60,72 @@ class LlmDummyMock:
     def draft_response(self, request):
         yield {
             "response_id": request["response_id"],
-            "content": "I am sorry, can you say that again?",
+            "content": fallbackSentence,
             "content_complete": True,
             "end_call": False,
         }
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that answers with the next response scripted on an LlmDummyMock."""
+
+    mock: Any
+    model_name: str = "mock"
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        response = self.mock.next_response()
+        if response.get("latency") and self.mock.latency_scale:
+            time.sleep(response["latency"] * self.mock.latency_scale)
+
+        content = response.get("content") or ""
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        tool_calls: List[Dict] = [
+            {
+                "id": call.get("id") or f"call_{self.mock.calls}_{i}",
+                "name": call["name"],
+                "args": call.get("args", {}),
+            }
+            for i, call in enumerate(response.get("tool_calls", []))
+        ]
+        # The OpenAI wire format, which message_handler reads for approvals
+        additional_kwargs = {}
+        if tool_calls:
+            additional_kwargs["tool_calls"] = [
+                {
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["args"])},
+                }
+                for call in tool_calls
+            ]
+        message = AIMessage(
+            content=content, tool_calls=tool_calls, additional_kwargs=additional_kwargs
+        )
+
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(content) // 4 + 10 * len(tool_calls)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={
+                "model_name": self.model_name,
+                "token_usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def with_structured_output(self, schema, *, method: str = "json_mode", include_raw: bool = False, **kwargs):
+        # Only JSON mode is scripted, as used by search_criteria_agent
+        return self.bind(response_format={"type": "json_object"}) | PydanticOutputParser(
+            pydantic_object=schema
+        )
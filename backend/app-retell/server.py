@@ -1,46 +1,102 @@
 import asyncio
-from email import generator
 import logging
 import json
 import os
 from datetime import datetime
-from tracemalloc import start
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, Request, WebSocket, Depends, Response, WebSocketDisconnect
+from fastapi import FastAPI, Request, WebSocket, WebSocketException, Depends, Response, WebSocketDisconnect, status
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from langchain_core.messages import HumanMessage, ToolMessage
-from twilio.twiml.messaging_response import MessagingResponse
-from twilio.twiml.voice_response import VoiceResponse
 from concurrent.futures import TimeoutError as ConnectionTimeoutError
-from retell import Retell
 from .custom_types import (
     ConfigResponse,
     ResponseRequiredRequest,
 )
 from .voice_llm_client import VoiceLlmClient
 
-from src.graph import create_graph
+from src.util.llm import aclose_http_clients, aprewarm
+from src.util.llm_scheduler import get_llm_scheduler
+from src.util.metrics import registry
+from src.util.structured_logging import bind_log_context, configure_logging, stop_logging
 from .adapters import RetellSocketAdapter, WebChatSocketAdapter, SMSAdapter
+from .sms_pipeline import EMPTY_TWIML, SmsPipeline
+from .mailbox import ThreadMailbox
+from .filler import FillerTimer, filler_stats, last_user_text
 from .message_handler import (
+    burst_input,
     convert_transcript_to_message,
     process_message,
+    record_transcript_corrections,
     handle_event,
     handle_sensitive_tool_call,
     receive_message,
     send_response,
 )
 
+# The only place the environment is loaded for the server process
 load_dotenv(override=True)
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 
 app = FastAPI()
-load_dotenv()
-retell = Retell(api_key=os.getenv("RETELL_API_KEY", ""))
+
+# "sync" answers inside the Twilio webhook request; "async" acknowledges it
+# at once and sends the reply later through the Twilio REST API.
+SMS_MODE = os.getenv("SMS_MODE", "sync")
+
+# Serialises graph runs per thread across web chat and SMS, merging bursts
+mailbox = ThreadMailbox()
+
+# Fire-and-forget tasks, held until they finish so they aren't garbage
+# collected mid-flight
+background_tasks = set()
+
+
+def run_in_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def collect_app_metrics():
+    """State kept outside the metrics registry, reported at scrape time."""
+    scheduler = get_llm_scheduler().stats()
+    for key, name, kind, description in (
+        ("queue_depth", "llm_scheduler_queue_depth", "gauge", "LLM calls waiting for admission"),
+        ("admitted", "llm_scheduler_admitted_total", "counter", "LLM calls admitted"),
+        ("shed", "llm_scheduler_shed_total", "counter", "LLM calls shed under load"),
+        ("wait_seconds_total", "llm_scheduler_wait_seconds_total", "counter", "Time LLM calls waited for admission"),
+    ):
+        yield name, kind, description, [
+            ({"channel": channel}, stats[key]) for channel, stats in scheduler.items()
+        ]
+    yield "voice_filler_turns_total", "counter", "Voice turns watched for a filler", [({}, filler_stats["turns"])]
+    yield "voice_filler_fired_total", "counter", "Voice fillers spoken", [({}, filler_stats["fired"])]
+    yield "voice_filler_gap_seconds_total", "counter", "Silence covered by voice fillers", [({}, filler_stats["gap_seconds_total"])]
+    yield "mailbox_messages_total", "counter", "Messages submitted to the thread mailbox", [({}, mailbox.messages)]
+    yield "mailbox_runs_total", "counter", "Graph runs started by the thread mailbox", [({}, mailbox.runs)]
+    if SMS_MODE == "async" and hasattr(app.state, "sms_pipeline"):
+        depth = app.state.sms_pipeline.queue.depth()
+        yield "sms_queue_depth", "gauge", "Queued SMS messages", [
+            ({"direction": direction}, count) for direction, count in depth.items()
+        ]
+
+
+registry.register_collector(collect_app_metrics)
+
+
+@lru_cache(maxsize=None)
+def get_retell():
+    from retell import Retell
+
+    return Retell(api_key=os.getenv("RETELL_API_KEY", ""))
+
 
 # CORS middleware setup
 app.add_middleware(
@@ -52,21 +108,80 @@ app.add_middleware(
 )
 
 
+class GraphUnavailable(Exception):
+    """The graph failed to build, so this worker can't answer messages."""
+
+
 class Graph:
-    def __init__(self):
-        self.graph = create_graph()
+    """
+    Compiles the LangGraph graph once per worker, off the event loop.
+
+    Importing the graph pulls in LangGraph, LangChain and the agent modules,
+    so that happens in a worker thread after startup rather than at import
+    time. Requests wait for it; `/ready` reports when it's done. If the build
+    fails, waiting requests get GraphUnavailable instead of hanging.
+    """
 
-    def get_graph(self):
+    def __init__(self):
+        self.graph = None
+        self.error: Optional[BaseException] = None
+        self.ready = asyncio.Event()
+
+    async def build(self):
+        def _build():
+            from src.graph import create_graph
+            from src.listings import get_listing_backend
+            from src.listings.warm_cache import get_warm_cache
+
+            # In-memory backends load the listings now, not on the first search
+            get_listing_backend()
+            # The most searched markets are answered from memory from the start
+            get_warm_cache().refresh()
+            return create_graph()
+
+        try:
+            self.graph = await asyncio.to_thread(_build)
+            logger.info("Graph compiled")
+        except Exception as e:
+            self.error = e
+            logger.exception("Failed to compile graph")
+        finally:
+            self.ready.set()
+
+    async def get_graph(self):
+        await self.ready.wait()
+        if self.error is not None:
+            raise GraphUnavailable(f"Graph failed to build: {self.error!r}") from self.error
         return self.graph
 
 
-def get_graph():
-    return app.state.graph.get_graph()
+async def get_graph():
+    try:
+        return await app.state.graph.get_graph()
+    except GraphUnavailable as e:
+        # Closes the websocket handshake instead of accepting a dead connection
+        raise WebSocketException(code=status.WS_1011_INTERNAL_ERROR, reason=str(e)[:120])
 
 
 @app.on_event("startup")
 async def startup_event():
     app.state.graph = Graph()
+    run_in_background(app.state.graph.build())
+    # Open LLM connections before the first request needs them
+    run_in_background(aprewarm(force=True))
+    if SMS_MODE == "async":
+        app.state.sms_pipeline = SmsPipeline.from_env(
+            app.state.graph.get_graph, coalesce_window=mailbox.window
+        )
+        app.state.sms_pipeline.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if SMS_MODE == "async":
+        await app.state.sms_pipeline.stop()
+    await aclose_http_clients()
+    stop_logging()
 
 
 @app.get("/")
@@ -74,6 +189,36 @@ async def main_route() -> str:
     return "Hello World! I'm a Real Estate Assistant"
 
 
+# Admission control state for outbound LLM calls, per priority class
+@app.get("/llm-scheduler")
+async def llm_scheduler_route():
+    return get_llm_scheduler().stats()
+
+
+# Prometheus scrape endpoint: per-node, LLM, SQLite and calendar timings,
+# token counts, and the scheduler, filler, mailbox and SMS queue state
+@app.get("/metrics")
+async def metrics_route():
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# How often voice turns needed a filler and how much silence they covered
+@app.get("/voice-fillers")
+async def voice_fillers_route():
+    return filler_stats
+
+
+# Readiness probe: only route traffic to this worker once the graph is compiled
+@app.get("/ready")
+async def ready_route():
+    graph = app.state.graph
+    if graph.error is not None:
+        return JSONResponse(status_code=503, content={"ready": False, "error": repr(graph.error)})
+    if graph.ready.is_set():
+        return JSONResponse(status_code=200, content={"ready": True})
+    return JSONResponse(status_code=503, content={"ready": False})
+
+
 # WebSocket endpoint for browser chat
 @app.websocket("/ws/{website_id}/{thread_id}")
 async def websocket_endpoint(
@@ -83,56 +228,89 @@ async def websocket_endpoint(
     graph: Graph = Depends(get_graph),
 ):
     await websocket.accept()
+    bind_log_context(thread_id=thread_id)
 
     config = {
         "configurable": {
             "user_id": website_id,
             "thread_id": thread_id,
+            "channel": "web",
         }
     }
 
     adapter = WebChatSocketAdapter(websocket)
+
+    async def run(contents: List[str]) -> None:
+        await process_message(adapter, adapter, graph, config, burst_input(contents))
+
+    # Cleared once the socket is gone, so no task sends on it afterwards
+    connected = True
+
+    async def handle(content: str) -> None:
+        try:
+            await mailbox.submit(thread_id, content, run)
+        except Exception as e:
+            logger.error(f"Error during WebSocket message processing: {str(e)}")
+            if connected:
+                await send_response(adapter, "An error occurred during processing.", config)
+
+    # Messages are handed to the mailbox without waiting for the reply, so
+    # a burst from the widget can be merged into one turn
+    tasks = set()
     try:
-        # while True:
         async for data in websocket.iter_json():
-            try:
-                print(f"Received data: {data}")
-                await process_message(adapter, adapter, graph, config, data)
-            except Exception as e:
-                logger.error(f"Error during WebSocket message processing: {str(e)}")
-                await send_response(
-                    adapter, "An error occurred during processing.", config
-                )
-                break
+            logger.debug("Received web chat message", extra={"payload": data})
+            if not data.get("content"):
+                continue
+            task = asyncio.create_task(handle(data["content"]))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for thread {thread_id}")
     except Exception as e:
         logger.error(f"Unexpected error in WebSocket connection: {str(e)}")
+    finally:
+        # Nobody is left to read the replies of turns still queued or running
+        connected = False
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 # SMS endpoint for Twilio
 @app.post("/sms")
-async def handle_sms(request: Request, graph: Graph = Depends(get_graph)):
+async def handle_sms(request: Request):
+    from twilio.twiml.messaging_response import MessagingResponse
+
     try:
         form_data = await request.form()
         user_message = form_data.get("Body", "").strip()
         sender_id = form_data.get("From", "unknown")
 
+        if SMS_MODE == "async":
+            # Persist the message and let Twilio go; the reply is sent out-of-band
+            app.state.sms_pipeline.submit(sender_id, user_message)
+            return Response(content=EMPTY_TWIML, media_type="application/xml")
+
+        graph = await app.state.graph.get_graph()
         config = {
             "configurable": {
                 "user_id": sender_id,
                 "thread_id": f"sms_{sender_id}",
+                "channel": "sms",
             }
         }
 
         # Create SMS adapter with the incoming message
         adapter = SMSAdapter(user_message)
 
-        # Process the message using the same flow as WebSocket
-        await process_message(
-            adapter, adapter, graph, config, config["configurable"]["thread_id"]
-        )
+        async def run(contents: List[str]) -> None:
+            await process_message(adapter, adapter, graph, config, burst_input(contents))
+
+        # Process the message using the same flow as WebSocket. If it was
+        # merged into a later message's turn, that webhook carries the reply.
+        await mailbox.submit(config["configurable"]["thread_id"], user_message, run)
 
         # Create Twilio response
         twilio_response = MessagingResponse()
@@ -165,7 +343,7 @@ async def handle_webhook(request: Request):
                 status_code=401, content={"message": "Missing signature header"}
             )
 
-        valid_signature = retell.verify(
+        valid_signature = get_retell().verify(
             json.dumps(post_data, separators=(",", ":"), ensure_ascii=False),
             api_key=str(os.environ["RETELL_API_KEY"]),
             signature=signature,
@@ -184,6 +362,7 @@ async def handle_webhook(request: Request):
         match event_type:
             case "call_started":
                 logger.info("Call started", extra={"call_id": call_id})
+                run_in_background(aprewarm())
             case "call_ended":
                 logger.info("Call ended", extra={"call_id": call_id})
             case "call_analyzed":
@@ -198,6 +377,9 @@ async def handle_webhook(request: Request):
     except json.JSONDecodeError:
         logger.error("Invalid JSON payload")
         return JSONResponse(status_code=400, content={"message": "Invalid JSON format"})
+    except GraphUnavailable:
+        logger.exception("Graph unavailable for webhook")
+        return JSONResponse(status_code=503, content={"message": "Service unavailable"})
     except Exception as err:
         logger.exception("Error processing webhook")
         return JSONResponse(
@@ -214,7 +396,8 @@ async def websocket_handler(
 ):
     try:
         await websocket.accept()
-        llm_client = VoiceLlmClient()
+        bind_log_context(call_id=call_id, thread_id=call_id)
+        llm_client = VoiceLlmClient(call_id)
 
         # Send optional initial config to Retell server
         config = ConfigResponse(
@@ -240,12 +423,10 @@ async def websocket_handler(
 
                 match interaction_type:
                     case "call_details":
-                        logger.info(
-                            "Call details received",
-                            extra={
-                                "call_id": call_id,
-                                "details": json.dumps(request_json),
-                            },
+                        run_in_background(aprewarm())
+                        logger.info("Call details received")
+                        logger.debug(
+                            "Call details", extra={"payload": request_json}
                         )
                         return
 
@@ -263,30 +444,47 @@ async def websocket_handler(
 
                     case "response_required" | "reminder_required":
                         response_id = request_json["response_id"]
-                        request = ResponseRequiredRequest(
-                            interaction_type=interaction_type,
-                            response_id=response_id,
-                            transcript=request_json["transcript"],
-                        )
 
                         handler_config = {
                             "configurable": {
                                 "user_id": call_id,
                                 "thread_id": call_id,
                                 "response_id": response_id,
+                                "channel": "voice",
                             }
                         }
 
                         adapter = RetellSocketAdapter(websocket)
-                        # convert transcript to openai messages
-                        message = llm_client.convert_transcript_to_message(
-                            request.transcript
-                        )
-                        data = {"content": message}
-
-                        await process_message(
-                            adapter, adapter, graph, handler_config, data
+                        # only pass on what the graph hasn't seen of the transcript
+                        diff = llm_client.transcript_to_graph_messages(
+                            interaction_type,
+                            request_json["transcript"],
+                            graph,
+                            handler_config,
                         )
+                        if diff.new_input is None and interaction_type == "response_required":
+                            # Only corrections or stale history: keep the
+                            # corrections, answer nothing
+                            await asyncio.to_thread(
+                                record_transcript_corrections,
+                                graph,
+                                handler_config,
+                                diff.messages,
+                            )
+                            await adapter.send_json({"response_id": response_id, "content": ""})
+                            return
+                        data = {"messages": diff.messages, "new_input": diff.new_input}
+
+                        # Speak a filler if the answer is slow to arrive
+                        filler = FillerTimer(
+                            adapter, response_id, last_user_text(diff.messages)
+                        ).start()
+                        try:
+                            await process_message(
+                                adapter, adapter, graph, handler_config, data
+                            )
+                        finally:
+                            await filler.finish()
 
                         # async for event in llm_client.draft_response(
                         #     request, graph, config
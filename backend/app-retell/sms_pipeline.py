@@ -0,0 +1,474 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from src.listings.saved_searches import SavedSearches, get_saved_searches
+from .adapters import SMSAdapter
+from .message_handler import burst_input, process_message
+
+logger = logging.getLogger(__name__)
+
+# Returned to Twilio straight away; the real reply is sent out-of-band
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response />'
+
+MAX_INBOUND_ATTEMPTS = 3
+MAX_OUTBOUND_ATTEMPTS = 5
+MAX_RETRY_DELAY = 60.0
+# Seconds a claimed job may stay in flight before another worker takes it
+# over, as it would after the claiming worker died; longer than any turn
+CLAIM_LEASE_SECONDS = float(os.getenv("SMS_CLAIM_LEASE_SECONDS", "300"))
+# How often queued saved-search alerts are turned into texts
+ALERT_POLL_SECONDS = float(os.getenv("SAVED_SEARCH_ALERT_POLL_SECONDS", "30"))
+# SMS conversations are threads named after the sender's number
+SMS_THREAD_PREFIX = "sms_"
+
+
+class SmsQueue:
+    """
+    Durable work queue for SMS, backed by a local SQLite file.
+
+    Inbound messages are stored before the webhook is acknowledged, so a
+    crash or restart never loses a message. Every worker process may share
+    the file: a claim reads and marks its jobs in one write transaction, and
+    records when it was made, so jobs left in flight by a dead worker are
+    taken over once the claim is CLAIM_LEASE_SECONDS old.
+    """
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sms_inbound (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sender_id TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                received_at REAL NOT NULL,
+                claimed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sms_inbound_status
+                ON sms_inbound (status, id);
+            CREATE TABLE IF NOT EXISTS sms_outbound (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                body TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sms_outbound_status
+                ON sms_outbound (status, next_attempt_at);
+            """
+        )
+        # Queues written before claims had a time; their in-flight jobs have
+        # none, so they count as abandoned
+        for table in ("sms_inbound", "sms_outbound"):
+            columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+            if "claimed_at" not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN claimed_at REAL")
+        self.conn.commit()
+
+    @contextmanager
+    def _claiming(self) -> Iterator[None]:
+        """
+        A transaction that takes SQLite's write lock up front, so no other
+        worker sharing the file can claim between its reads and updates.
+        """
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+
+    def enqueue_inbound(self, sender_id: str, body: str) -> int:
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO sms_inbound (sender_id, body, received_at) VALUES (?, ?, ?)",
+                (sender_id, body, time.time()),
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def claim_inbound(self, coalesce_window: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        Claim every pending message from the sender with the oldest pending
+        message, skipping senders that have a turn in flight, so each sender
+        is handled in order and a burst becomes one turn.
+
+        A sender's messages only become claimable once the oldest of them is
+        `coalesce_window` seconds old, giving the rest of a burst time to land.
+        Messages whose claim has outlived its lease are claimed again.
+        """
+        now = time.time()
+        expired = now - CLAIM_LEASE_SECONDS
+        with self._claiming():
+            row = self.conn.execute(
+                """
+                SELECT sender_id FROM sms_inbound
+                WHERE (
+                    (status = 'pending' AND received_at <= ?)
+                    OR (status = 'processing' AND (claimed_at IS NULL OR claimed_at < ?))
+                ) AND sender_id NOT IN (
+                    SELECT sender_id FROM sms_inbound WHERE status = 'processing' AND claimed_at >= ?
+                )
+                ORDER BY id LIMIT 1
+                """,
+                (now - coalesce_window, expired, expired),
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self.conn.execute(
+                """
+                SELECT id, body, attempts FROM sms_inbound
+                WHERE sender_id = ? AND (
+                    status = 'pending' OR (status = 'processing' AND (claimed_at IS NULL OR claimed_at < ?))
+                )
+                ORDER BY id
+                """,
+                (row[0], expired),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE sms_inbound SET status = 'processing', attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                [(now, r[0]) for r in rows],
+            )
+        return {
+            "ids": [r[0] for r in rows],
+            "sender_id": row[0],
+            "body": "\n".join(r[1] for r in rows),
+            "bodies": [r[1] for r in rows],
+            "attempts": max(r[2] for r in rows),
+        }
+
+    def complete_inbound(self, ids: List[int]) -> None:
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM sms_inbound WHERE id = ?", [(i,) for i in ids]
+            )
+            self.conn.commit()
+
+    def fail_inbound(self, ids: List[int], attempts: int) -> None:
+        status = "failed" if attempts + 1 >= MAX_INBOUND_ATTEMPTS else "pending"
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE sms_inbound SET status = ? WHERE id = ?",
+                [(status, i) for i in ids],
+            )
+            self.conn.commit()
+
+    def enqueue_outbound(self, recipient: str, body: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO sms_outbound (recipient, body, next_attempt_at) VALUES (?, ?, ?)",
+                (recipient, body, time.time()),
+            )
+            self.conn.commit()
+
+    def claim_outbound_batch(self, limit: int) -> List[Dict[str, Any]]:
+        """Claim up to `limit` replies that are due, or whose claim has outlived its lease."""
+        now = time.time()
+        with self._claiming():
+            rows = self.conn.execute(
+                """
+                SELECT id, recipient, body, attempts FROM sms_outbound
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                    OR (status = 'sending' AND (claimed_at IS NULL OR claimed_at < ?))
+                ORDER BY id LIMIT ?
+                """,
+                (now, now - CLAIM_LEASE_SECONDS, limit),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE sms_outbound SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row[0]) for row in rows],
+            )
+        return [
+            dict(zip(("id", "recipient", "body", "attempts"), row))
+            for row in rows
+        ]
+
+    def complete_outbound(self, ids: List[int]) -> None:
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM sms_outbound WHERE id = ?", [(i,) for i in ids]
+            )
+            self.conn.commit()
+
+    def retry_outbound(self, ids: List[int], attempts: int) -> None:
+        """Back off exponentially, giving up after MAX_OUTBOUND_ATTEMPTS."""
+        attempts += 1
+        status = "failed" if attempts >= MAX_OUTBOUND_ATTEMPTS else "pending"
+        delay = min(2**attempts, MAX_RETRY_DELAY)
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE sms_outbound SET status = ?, attempts = ?, next_attempt_at = ? WHERE id = ?",
+                [(status, attempts, time.time() + delay, i) for i in ids],
+            )
+            self.conn.commit()
+
+    def depth(self) -> Dict[str, int]:
+        with self.lock:
+            inbound = self.conn.execute(
+                "SELECT COUNT(*) FROM sms_inbound WHERE status != 'failed'"
+            ).fetchone()[0]
+            outbound = self.conn.execute(
+                "SELECT COUNT(*) FROM sms_outbound WHERE status != 'failed'"
+            ).fetchone()[0]
+        return {"inbound": inbound, "outbound": outbound}
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class TwilioSender:
+    """Sends SMS through the Twilio Messages REST API."""
+
+    def __init__(
+        self,
+        account_sid: str,
+        auth_token: str,
+        from_number: str,
+        base_url: str = "https://api.twilio.com",
+    ):
+        self.from_number = from_number
+        self.url = f"{base_url.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.client = httpx.AsyncClient(
+            auth=(account_sid, auth_token), timeout=httpx.Timeout(10.0)
+        )
+
+    @classmethod
+    def from_env(cls) -> "TwilioSender":
+        return cls(
+            account_sid=os.getenv("TWILIO_ACCOUNT_SID", ""),
+            auth_token=os.getenv("TWILIO_AUTH_TOKEN", ""),
+            from_number=os.getenv("PHONE_NUMBER_FROM", ""),
+            base_url=os.getenv("TWILIO_API_BASE_URL", "https://api.twilio.com"),
+        )
+
+    async def send(self, recipient: str, body: str) -> None:
+        response = await self.client.post(
+            self.url, data={"To": recipient, "From": self.from_number, "Body": body}
+        )
+        response.raise_for_status()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def alert_text(listings: List[Dict[str, Any]]) -> str:
+    """One text about the new listings matching a saved search."""
+    lines = ["New listings match your saved search:"]
+    for listing in listings:
+        rooms = ", ".join(
+            f"{listing[key]} {unit}" for key, unit in (("bed", "bd"), ("bath", "ba")) if listing.get(key) is not None
+        )
+        where = ", ".join(str(listing[key]) for key in ("city", "state") if listing.get(key))
+        where = f"{where} {listing.get('zip_code') or ''}".strip()
+        price = f"${listing['price']:,.0f}" if listing.get("price") is not None else "price on request"
+        lines.append(f"- {' in '.join(part for part in (rooms, where) if part)}, {price}")
+    # Not STOP, which carriers take as opting out of every text from this number
+    lines.append("Reply 'cancel alerts' to turn these off.")
+    return "\n".join(lines)
+
+
+class SmsPipeline:
+    """
+    Handles SMS outside the Twilio webhook request.
+
+    The webhook only enqueues the message. Inbound workers run the graph and
+    queue the reply; the outbound loop drains replies in batches, merging
+    replies to the same recipient into one SMS and retrying failed sends.
+    Given the saved searches, it also turns their queued alerts into texts,
+    one per SMS thread; web chat and voice threads have no number to text,
+    so their alerts are dropped.
+    """
+
+    def __init__(
+        self,
+        queue: SmsQueue,
+        sender: TwilioSender,
+        get_graph: Callable[[], Awaitable[Any]],
+        workers: int = 4,
+        batch_size: int = 20,
+        coalesce_window: float = 0.0,
+        alerts: Optional[SavedSearches] = None,
+    ):
+        self.queue = queue
+        self.sender = sender
+        self.get_graph = get_graph
+        self.workers = workers
+        self.batch_size = batch_size
+        self.coalesce_window = coalesce_window
+        self.alerts = alerts
+        self.inbound_ready = asyncio.Event()
+        self.outbound_ready = asyncio.Event()
+        self.tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_env(
+        cls, get_graph: Callable[[], Awaitable[Any]], coalesce_window: float = 0.0
+    ) -> "SmsPipeline":
+        default_path = os.path.join(
+            os.path.dirname(__file__), "..", "data", "sms_queue.db"
+        )
+        return cls(
+            SmsQueue(os.getenv("SMS_QUEUE_PATH", default_path)),
+            TwilioSender.from_env(),
+            get_graph,
+            workers=int(os.getenv("SMS_WORKERS", "4")),
+            coalesce_window=coalesce_window,
+            alerts=get_saved_searches(),
+        )
+
+    def start(self) -> None:
+        self.tasks = [
+            asyncio.create_task(self._inbound_worker()) for _ in range(self.workers)
+        ]
+        self.tasks.append(asyncio.create_task(self._outbound_loop()))
+        if self.alerts is not None:
+            self.tasks.append(asyncio.create_task(self._alert_loop()))
+        # Pick up anything persisted before a restart
+        self.inbound_ready.set()
+        self.outbound_ready.set()
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.sender.aclose()
+        self.queue.close()
+
+    def submit(self, sender_id: str, body: str) -> int:
+        job_id = self.queue.enqueue_inbound(sender_id, body)
+        self.inbound_ready.set()
+        return job_id
+
+    async def _wait(self, event: asyncio.Event, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    async def _inbound_worker(self) -> None:
+        while True:
+            job = self.queue.claim_inbound(self.coalesce_window)
+            if job is None:
+                # A burst may still be inside its window, so don't sleep past it
+                await self._wait(self.inbound_ready, self.coalesce_window or 1.0)
+                continue
+            # Other workers may be able to take the next job
+            self.inbound_ready.set()
+            try:
+                await self._handle_inbound(job)
+                self.queue.complete_inbound(job["ids"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Error processing queued SMS {job['ids']}")
+                self.queue.fail_inbound(job["ids"], job["attempts"])
+            self.inbound_ready.set()
+
+    async def _handle_inbound(self, job: Dict[str, Any]) -> None:
+        sender_id = job["sender_id"]
+        config = {
+            "configurable": {
+                "user_id": sender_id,
+                "thread_id": f"sms_{sender_id}",
+                "channel": "sms",
+            }
+        }
+        adapter = SMSAdapter(job["body"])
+        graph = await self.get_graph()
+        await process_message(adapter, adapter, graph, config, burst_input(job["bodies"]))
+        if adapter.response:
+            self.queue.enqueue_outbound(sender_id, adapter.response)
+            self.outbound_ready.set()
+
+    async def _outbound_loop(self) -> None:
+        while True:
+            try:
+                batch = self.queue.claim_outbound_batch(self.batch_size)
+                if not batch:
+                    await self._wait(self.outbound_ready, 1.0)
+                    continue
+
+                by_recipient: Dict[str, List[Dict[str, Any]]] = {}
+                for message in batch:
+                    by_recipient.setdefault(message["recipient"], []).append(message)
+
+                await asyncio.gather(
+                    *(
+                        self._send_merged(recipient, messages)
+                        for recipient, messages in by_recipient.items()
+                    )
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. the queue file is locked; the loop must outlive it
+                logger.exception("Error draining the SMS outbound queue")
+                await asyncio.sleep(1.0)
+
+    def forward_alerts(self, limit: int = 100) -> int:
+        """Queues a text per SMS thread for its pending saved-search alerts; returns how many were sent on."""
+        forwarded = 0
+        while True:
+            alerts = self.alerts.claim_alerts(limit)
+            by_recipient: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for alert in alerts:
+                if alert["thread_id"].startswith(SMS_THREAD_PREFIX):
+                    by_recipient[alert["thread_id"][len(SMS_THREAD_PREFIX) :]].append(alert["listing"])
+            for recipient, listings in by_recipient.items():
+                self.queue.enqueue_outbound(recipient, alert_text(listings))
+            self.alerts.complete_alerts([alert["id"] for alert in alerts])
+
+            sent = sum(len(listings) for listings in by_recipient.values())
+            if sent < len(alerts):
+                logger.info(f"Dropped {len(alerts) - sent} saved-search alerts for threads that can't be texted")
+            forwarded += sent
+            if len(alerts) < limit:
+                break
+        if forwarded:
+            self.outbound_ready.set()
+        return forwarded
+
+    async def _alert_loop(self) -> None:
+        while True:
+            try:
+                self.forward_alerts()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error forwarding saved-search alerts")
+            await asyncio.sleep(ALERT_POLL_SECONDS)
+
+    async def _send_merged(
+        self, recipient: str, messages: List[Dict[str, Any]]
+    ) -> None:
+        ids = [m["id"] for m in messages]
+        try:
+            await self.sender.send(recipient, "\n\n".join(m["body"] for m in messages))
+            self.queue.complete_outbound(ids)
+        except asyncio.CancelledError:
+            raise
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to send SMS to {recipient}: {e}")
+            self.queue.retry_outbound(ids, max(m["attempts"] for m in messages))
+        except Exception:
+            logger.exception(f"Error sending SMS to {recipient}")
+            self.queue.retry_outbound(ids, max(m["attempts"] for m in messages))
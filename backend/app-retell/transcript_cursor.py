@@ -0,0 +1,89 @@
+from typing import Any, List, NamedTuple, Optional, Tuple
+from langchain_core.messages import HumanMessage
+
+from .custom_types import Utterance
+
+# How many already-seen utterances at the end of the transcript are re-checked
+# for ASR corrections on every frame. Retell only revises recent speech, so
+# this keeps per-frame work constant regardless of call length.
+CORRECTION_WINDOW = 3
+
+
+class TranscriptDiff(NamedTuple):
+    # New user utterances and corrected earlier ones, with stable ids
+    messages: List[HumanMessage]
+    # The new user utterances' text; None when the frame only corrects or
+    # repeats what the graph has already seen
+    new_input: Optional[str]
+
+
+class TranscriptCursor:
+    """
+    Tracks how much of a Retell call transcript the graph has already seen.
+
+    Every `response_required` frame carries the full transcript. Instead of
+    rebuilding the conversation from it, the cursor diffs the tail of the new
+    transcript against what it has seen and returns only the messages the
+    graph needs: new user utterances, plus replacements for recent user
+    utterances that ASR has since corrected. User utterances get stable ids
+    derived from their transcript position, so `add_messages` replaces a
+    corrected utterance in place instead of appending a duplicate.
+
+    Agent and any other non-user utterances are tracked for positioning only;
+    the graph already has its own replies.
+    """
+
+    def __init__(self, call_id: str):
+        self.call_id = call_id
+        # (role, content) per transcript index; None when only known to exist
+        self.seen: List[Optional[Tuple[str, str]]] = []
+        self.synced = False
+
+    def message_id(self, index: int) -> str:
+        return f"{self.call_id}:utterance:{index}"
+
+    def sync_from_checkpoint(self, graph, config) -> None:
+        """
+        Rebuild the cursor from the checkpoint, e.g. after Retell reconnects a
+        call on a new WebSocket.
+        """
+        self.synced = True
+        snapshot = graph.get_state(config)
+        messages = (snapshot.values or {}).get("messages", [])
+        prefix = f"{self.call_id}:utterance:"
+
+        known = {}
+        for message in messages:
+            if message.id and message.id.startswith(prefix):
+                known[int(message.id[len(prefix) :])] = ("user", message.content)
+        if known:
+            self.seen = [known.get(i) for i in range(max(known) + 1)]
+
+    def diff(self, transcript: List[Any]) -> TranscriptDiff:
+        """
+        Return the messages needed to bring the graph up to `transcript`, and
+        whether the user said anything new the graph should answer.
+        """
+        start = max(0, min(len(self.seen), len(transcript)) - CORRECTION_WINDOW)
+        messages = []
+        new_input = []
+        for index in range(start, len(transcript)):
+            utterance = transcript[index]
+            if not isinstance(utterance, Utterance):
+                utterance = Utterance(**utterance)
+            entry = (utterance.role, utterance.content)
+
+            if index < len(self.seen):
+                if self.seen[index] is None or self.seen[index] == entry:
+                    continue
+                self.seen[index] = entry
+            else:
+                self.seen.append(entry)
+                if utterance.role == "user":
+                    new_input.append(utterance.content)
+
+            if utterance.role == "user":
+                messages.append(
+                    HumanMessage(content=utterance.content, id=self.message_id(index))
+                )
+        return TranscriptDiff(messages, " ".join(new_input) if new_input else None)
@@ -1,20 +1,28 @@
-from openai import AsyncOpenAI
+import asyncio
+import logging
 import os
-from typing import List
+from typing import Any, List
+from langchain_core.messages import HumanMessage
 from .custom_types import (
     ResponseRequiredRequest,
     ResponseResponse,
     Utterance,
 )
-from dotenv import load_dotenv
+from .transcript_cursor import TranscriptCursor, TranscriptDiff
+from src.util.llm import get_async_openai_client
+from src.util.llm_scheduler import get_llm_scheduler
 
-load_dotenv()
 begin_sentence = "Hey there, I'm an AI real estate assistant. How can I help you?"
+reminder_prompt = "(Now the user has not responded in a while, you would say:)"
+
+logger = logging.getLogger(__name__)
 
 
 class VoiceLlmClient:
-    def __init__(self):
-        self.client = AsyncOpenAI()
+    def __init__(self, call_id: str = ""):
+        # Shared across calls so a new call reuses pooled connections
+        self.client = get_async_openai_client()
+        self.transcript_cursor = TranscriptCursor(call_id)
 
     def draft_begin_message(self):
         response = ResponseResponse(
@@ -26,15 +34,32 @@ class VoiceLlmClient:
         return response
 
     def convert_transcript_to_message(self, transcript: List[Utterance]):
-        print(f"Converting transcript to OpenAI messages: {transcript}")
         messages = []
         for utterance in transcript:
             if utterance.role == "agent":
                 messages.append({"role": "assistant", "content": utterance.content})
             else:
                 messages.append({"role": "user", "content": utterance.content})
-        print(f"Converted transcript to OpenAI messages: {messages}")
-        return messages[-1]["content"]
+        logger.debug(
+            "Converted transcript to OpenAI messages",
+            extra={"utterances": len(transcript), "payload": messages},
+        )
+        return messages
+
+    def transcript_to_graph_messages(
+        self, interaction_type: str, transcript: List[Any], graph, config
+    ) -> TranscriptDiff:
+        """
+        Messages to feed the graph for a response_required/reminder_required
+        frame: only utterances it hasn't seen yet, plus ASR corrections. A
+        reminder without new user input gets the reminder prompt instead.
+        """
+        if not self.transcript_cursor.synced:
+            self.transcript_cursor.sync_from_checkpoint(graph, config)
+        diff = self.transcript_cursor.diff(transcript)
+        if interaction_type == "reminder_required" and diff.new_input is None:
+            diff.messages.append(HumanMessage(content=reminder_prompt))
+        return diff
 
     def prepare_prompt(self, request: ResponseRequiredRequest):
         prompt = []
@@ -48,13 +73,18 @@ class VoiceLlmClient:
             prompt.append(
                 {
                     "role": "user",
-                    "content": "(Now the user has not responded in a while, you would say:)",
+                    "content": reminder_prompt,
                 }
             )
         return prompt
 
     async def draft_response(self, request: ResponseRequiredRequest):
         prompt = self.prepare_prompt(request)
+        await asyncio.to_thread(
+            get_llm_scheduler().acquire,
+            "voice",
+            sum(len(m["content"]) for m in prompt) // 4 + 256,
+        )
         stream = await self.client.chat.completions.create(
             model="gpt-4o-mini",
             messages=prompt,
@@ -0,0 +1,133 @@
+"""
+Point-filter, range and aggregate query latency, SQLite vs Parquet on DuckDB.
+
+Runs the same SQL against the `real_estate` table in SQLite and against the
+state-partitioned Parquet files of the duckdb backend, with parameters from
+random existing listings, and checks both return the same number of rows.
+Uses LISTINGS_DB_PATH (or --db), or generates --rows synthetic listings.
+Needs `pip install duckdb pyarrow`.
+
+Run from the backend directory:
+    python -m benchmarks.analytical_bench [--db data/real_estate_data.db]
+        [--rows 2200000] [--queries 10]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.listing_filters_bench import sample_listings
+from data.generate_listings import generate_rows, write_sqlite
+from src.listings import DB_PATH
+from src.listings.duckdb_backend import DuckDBListings, write_parquet
+
+# (kind, name, SQL, parameters from a listing)
+QUERIES = [
+    (
+        "point",
+        "city + state + bed + bath",
+        "SELECT price, bed, bath, city, state, zip_code FROM real_estate"
+        " WHERE state = ? AND city = ? AND bed = ? AND bath = ?",
+        lambda l: [l["state"], l["city"], l["bed"], l["bath"]],
+    ),
+    (
+        "point",
+        "zip code",
+        "SELECT price, bed, bath, city, state, zip_code FROM real_estate WHERE zip_code = ?",
+        lambda l: [l["zip_code"]],
+    ),
+    (
+        "range",
+        "price band + min bed",
+        "SELECT price, bed, bath, city, state, zip_code FROM real_estate"
+        " WHERE price BETWEEN ? AND ? AND bed >= ?",
+        lambda l: [l["price"] * 0.95, l["price"] * 1.05, l["bed"]],
+    ),
+    (
+        "range",
+        "state + price band",
+        "SELECT price, bed, bath, city, state, zip_code FROM real_estate"
+        " WHERE state = ? AND price BETWEEN ? AND ?",
+        lambda l: [l["state"], l["price"] * 0.9, l["price"] * 1.1],
+    ),
+    (
+        "aggregate",
+        "price stats by state",
+        "SELECT state, COUNT(*), AVG(price), MIN(price), MAX(price) FROM real_estate GROUP BY state",
+        lambda l: [],
+    ),
+    (
+        "aggregate",
+        "count and average by city and bed in a state",
+        "SELECT city, bed, COUNT(*), AVG(price) FROM real_estate WHERE state = ? GROUP BY city, bed",
+        lambda l: [l["state"]],
+    ),
+    (
+        "aggregate",
+        "listings under a price",
+        "SELECT COUNT(*) FROM real_estate WHERE price <= ?",
+        lambda l: [l["price"]],
+    ),
+]
+
+
+def timed(execute, sql: str, params: List) -> Tuple[float, int]:
+    start = time.perf_counter()
+    rows = execute(sql, params).fetchall()
+    return time.perf_counter() - start, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--rows", type=int, default=2200000, help="listings to generate without --db")
+    parser.add_argument("--queries", type=int, default=10, help="parameter sets per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    db_path = args.db
+    workdir = tempfile.mkdtemp()
+    if not os.path.exists(db_path):
+        db_path = os.path.join(workdir, "listings.db")
+        write_sqlite(generate_rows(args.rows, args.seed), db_path)
+        print(f"No database at {args.db}; generated {args.rows:,} listings")
+    start = time.monotonic()
+    parquet_dir = write_parquet(db_path, os.path.join(workdir, "parquet"))
+    print(f"Parquet written in {time.monotonic() - start:.1f}s")
+
+    sqlite_conn = sqlite3.connect(db_path)
+    duckdb_cursor = DuckDBListings(parquet_dir).cursor()
+    engines = {"sqlite": sqlite_conn.execute, "duckdb": duckdb_cursor.execute}
+    listings = sample_listings(db_path, args.queries, args.seed)
+
+    print(f"\n{'kind':<10}{'query':<48}{'sqlite ms':>12}{'duckdb ms':>12}{'speedup':>10}  rows")
+    by_kind: Dict[str, List[float]] = {}
+    for kind, name, sql, params_for in QUERIES:
+        latencies = {engine: [] for engine in engines}
+        rows, mismatches = [], 0
+        for listing in listings:
+            counts = {}
+            for engine, execute in engines.items():
+                seconds, counts[engine] = timed(execute, sql, params_for(listing))
+                latencies[engine].append(seconds)
+            mismatches += counts["sqlite"] != counts["duckdb"]
+            rows.append(counts["sqlite"])
+        sqlite_ms = statistics.median(latencies["sqlite"]) * 1000
+        duckdb_ms = statistics.median(latencies["duckdb"]) * 1000
+        by_kind.setdefault(kind, []).append(sqlite_ms / duckdb_ms)
+        print(
+            f"{kind:<10}{name:<48}{sqlite_ms:>12.2f}{duckdb_ms:>12.2f}{sqlite_ms / duckdb_ms:>9.1f}x"
+            f"  {statistics.median(rows):,.0f}{' (row counts differ)' if mismatches else ''}"
+        )
+
+    print()
+    for kind, speedups in by_kind.items():
+        print(f"{kind:<10}geometric mean speedup {statistics.geometric_mean(speedups):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+LLM calls saved by the per-thread mailbox under bursty traffic.
+
+Simulates users who each fire a quick burst of messages at the same thread
+(e.g. "hi" / "looking for a house" / "in Austin") and counts how many graph
+turns, and so LLM calls, the mailbox runs with and without coalescing.
+
+Run from the backend directory:
+    python -m benchmarks.coalescing_bench [--users 50] [--burst 4]
+"""
+
+import argparse
+import asyncio
+import importlib
+import random
+import statistics
+import time
+
+ThreadMailbox = importlib.import_module("app-retell.mailbox").ThreadMailbox
+
+
+async def simulate(args, window: float):
+    mailbox = ThreadMailbox(window=window)
+    turn_latencies = []
+
+    async def run(contents) -> None:
+        # A turn costs a few LLM calls (router, criteria, answer) back to back
+        await asyncio.sleep(args.turn_latency)
+
+    async def user(i: int):
+        thread_id = f"thread_{i}"
+        await asyncio.sleep(random.uniform(0, 1))
+
+        async def send(j):
+            start = time.monotonic()
+            await mailbox.submit(thread_id, f"message {j}", run)
+            turn_latencies.append(time.monotonic() - start)
+
+        sends = []
+        for j in range(args.burst):
+            sends.append(asyncio.create_task(send(j)))
+            await asyncio.sleep(random.expovariate(1 / args.gap))
+        await asyncio.gather(*sends)
+
+    await asyncio.gather(*(user(i) for i in range(args.users)))
+    return mailbox, turn_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=4, help="messages per user")
+    parser.add_argument("--gap", type=float, default=0.2, help="mean seconds between messages")
+    parser.add_argument("--turn-latency", type=float, default=1.5)
+    parser.add_argument("--llm-calls-per-turn", type=int, default=3)
+    parser.add_argument("--window", type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{args.users} users x {args.burst} messages, mean gap {args.gap}s")
+    for label, window in (("serialise only", 0.0), (f"coalesce {args.window}s", args.window)):
+        random.seed(0)
+        mailbox, latencies = asyncio.run(simulate(args, window))
+        llm_calls = mailbox.runs * args.llm_calls_per_turn
+        print(
+            f"{label:>16}: {mailbox.messages} messages -> {mailbox.runs} turns, "
+            f"{llm_calls} LLM calls, mean wait for reply {statistics.mean(latencies):.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Local stand-in for the OpenAI chat completions API with configurable latency.
+
+Answers like the real agents would on a search turn: the main agent's first
+call on a user message delegates with a `ToSearchAgent` tool call, the
+criteria extractor (JSON mode) returns search criteria, and any other call
+returns a short text reply. Each model gets its own latency, with lognormal
+jitter, so model tiering can be benchmarked without network access.
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DEFAULT_CRITERIA = {"city": "Austin", "state": "Texas", "min_bedroom": 3}
+
+
+class FakeLlmServer:
+    def __init__(
+        self,
+        latencies: Dict[str, float],
+        default_latency: float = 0.5,
+        jitter: float = 0.25,
+        port: int = 0,
+        criteria: Optional[dict] = None,
+    ):
+        self.latencies = latencies
+        self.default_latency = default_latency
+        self.jitter = jitter
+        self.criteria = criteria or DEFAULT_CRITERIA
+        self.calls: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def latency_for(self, model: str) -> float:
+        base = self.latencies.get(model, self.default_latency)
+        return base * random.lognormvariate(0, self.jitter) if self.jitter else base
+
+    def completion(self, request: dict) -> dict:
+        model = request.get("model", "")
+        messages = request.get("messages", [])
+        tool_names = {t["function"]["name"] for t in request.get("tools", [])}
+        last = messages[-1] if messages else {}
+
+        message = {"role": "assistant", "content": None}
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            message["content"] = json.dumps(self.criteria)
+        elif "ToSearchAgent" in tool_names and last.get("role") == "user":
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{random.getrandbits(32):08x}",
+                    "type": "function",
+                    "function": {
+                        "name": "ToSearchAgent",
+                        "arguments": json.dumps({"request": str(last.get("content"))}),
+                    },
+                }
+            ]
+        else:
+            message["content"] = "I found a lovely three bedroom home in Austin for you."
+
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4
+        return {
+            "id": f"chatcmpl-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": 20,
+                "total_tokens": prompt_tokens + 20,
+            },
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, payload: dict, status: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.endswith("/models"):
+                    self._send({"object": "list", "data": []})
+                else:
+                    self._send({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send({"error": "not found"}, 404)
+                    return
+                model = request.get("model", "")
+                with fake.lock:
+                    fake.calls[model] = fake.calls.get(model, 0) + 1
+                time.sleep(fake.latency_for(model))
+                self._send(fake.completion(request))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeLlmServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,100 @@
+"""
+Turn latency against the per-channel latency budget, with and without model
+tiering.
+
+Runs search turns through the real graph against a fake OpenAI server whose
+models answer with configurable latencies, then reports turn latency
+percentiles. With budgets on, nodes fall back to the fast model and skip the
+post-query LLM call when time is short; with budgets off, every node uses
+its primary model.
+
+Run from the backend directory:
+    python -m benchmarks.latency_budget_bench [--turns 200] [--channel voice]
+        [--primary-latency 1.0] [--fast-latency 0.3]
+"""
+
+import argparse
+import importlib
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.fake_llm_server import FakeLlmServer
+from benchmarks.stubs import create_listings_db
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--channel", default="voice", choices=["voice", "web", "sms"])
+    parser.add_argument("--primary-latency", type=float, default=1.0)
+    parser.add_argument("--fast-latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.25)
+    args = parser.parse_args()
+
+    from src.util.latency_budget import NODE_MODELS, TURN_BUDGETS
+
+    primary, fast = NODE_MODELS["main_agent"]
+    fake = FakeLlmServer(
+        {primary: args.primary_latency, fast: args.fast_latency}, jitter=args.jitter
+    ).start()
+    os.environ["OPENAI_BASE_URL"] = fake.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    db_path = os.path.join(tempfile.mkdtemp(), "listings.db")
+    create_listings_db(db_path)
+    os.environ["LISTINGS_DB_PATH"] = db_path
+    os.environ["QUERY_LOG_PATH"] = os.path.join(os.path.dirname(db_path), "query_log.db")
+
+    from src.graph import create_graph
+    from src.util.latency_budget import start_turn
+
+    stream_final_message = importlib.import_module(
+        "app-retell.message_handler"
+    ).stream_final_message
+
+    graph = create_graph()
+    budget = TURN_BUDGETS[args.channel]
+
+    def turn(with_budget: bool) -> float:
+        config = {"configurable": {"thread_id": str(uuid.uuid4()), "channel": args.channel}}
+        if with_budget:
+            config = start_turn(config, args.channel)
+        start = time.monotonic()
+        stream_final_message(
+            graph,
+            {"messages": [HumanMessage(content="Any 3 bedroom homes in Austin?")]},
+            config,
+        )
+        return time.monotonic() - start
+
+    print(
+        f"{args.turns} {args.channel} turns, budget {budget}s, "
+        f"{primary} {args.primary_latency}s, {fast} {args.fast_latency}s"
+    )
+    for label, with_budget in (("no budget", False), ("with budget", True)):
+        fake.calls.clear()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            latencies = list(pool.map(lambda _: turn(with_budget), range(args.turns)))
+        within = sum(latency <= budget for latency in latencies) / len(latencies)
+        print(
+            f"{label:>12}: p50 {statistics.median(latencies):.2f}s"
+            f"  p99 {percentile(latencies, 0.99):.2f}s"
+            f"  within budget {within:.1%}  calls {dict(fake.calls)}"
+        )
+
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Listing search latency per backend, over every filter combination.
+
+Loads the listings database (LISTINGS_DB_PATH, or --db) into each backend
+in --backends, then runs all 64 SearchCriteriaObject filter combinations
+with values from random existing listings, checking that every backend
+returns the same listings as SQLite. Without a database, generates --rows
+synthetic listings with data/generate_listings.py.
+
+Reports load time and data size (file, arrays or Parquet) per backend and p50 latency per combination.
+The numpy and snapshot backends need `pip install numpy`, the duckdb backend
+`pip install duckdb pyarrow`.
+
+Run from the backend directory:
+    python -m benchmarks.listing_backends_bench [--db data/real_estate_data.db]
+        [--backends sqlite numpy snapshot duckdb sharded] [--queries 20] [--limit 2] [--output backends.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from benchmarks.listing_filters_bench import combinations, criteria_for, sample_listings
+from data.generate_listings import generate_rows, write_sqlite
+from src.listings import DB_PATH, ListingBackend, create_listing_backend
+
+
+def data_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def load_backend(name: str, db_path: str) -> Tuple[ListingBackend, float, int]:
+    """The backend over `db_path`, its load time excluding any ingest step, and data size."""
+    if name == "snapshot":
+        from src.listings.snapshot import SnapshotListings, build_snapshot
+
+        snapshot_dir = tempfile.mkdtemp()
+        build_snapshot(db_path, snapshot_dir)
+        start = time.monotonic()
+        backend = SnapshotListings(snapshot_dir)
+        return backend, time.monotonic() - start, backend.nbytes()
+    if name == "duckdb":
+        from src.listings.duckdb_backend import DuckDBListings, write_parquet
+
+        parquet_dir = write_parquet(db_path, os.path.join(tempfile.mkdtemp(), "parquet"))
+        start = time.monotonic()
+        return DuckDBListings(parquet_dir), time.monotonic() - start, data_size(parquet_dir)
+    if name == "sharded":
+        from src.listings.sharded_backend import ShardedListings, write_shards
+
+        shard_dir = write_shards(db_path, os.path.join(tempfile.mkdtemp(), "shards"))
+        start = time.monotonic()
+        return ShardedListings(shard_dir), time.monotonic() - start, data_size(shard_dir)
+    start = time.monotonic()
+    backend = create_listing_backend(name, db_path)
+    size = backend.nbytes() if hasattr(backend, "nbytes") else data_size(db_path)
+    return backend, time.monotonic() - start, size
+
+
+def run_queries(backend: ListingBackend, queries: List[Dict], limit: int):
+    latencies, results = [], []
+    for criteria in queries:
+        start = time.perf_counter()
+        results.append(backend.search(criteria, limit))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--rows", type=int, default=2200000, help="listings to generate without --db")
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "numpy"])
+    parser.add_argument("--queries", type=int, default=20, help="queries per combination")
+    parser.add_argument("--limit", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    db_path = args.db
+    if not os.path.exists(db_path):
+        db_path = os.path.join(tempfile.mkdtemp(), "listings.db")
+        start = time.monotonic()
+        write_sqlite(generate_rows(args.rows, args.seed), db_path)
+        print(f"No database at {args.db}; generated {args.rows:,} listings in {time.monotonic() - start:.1f}s")
+
+    listings = sample_listings(db_path, args.queries, args.seed)
+    queries = {
+        "+".join(combination) or "(none)": [criteria_for(listing, combination) for listing in listings]
+        for combination in combinations()
+    }
+
+    summary, latencies, answers = {}, {}, {}
+    for name in ["sqlite"] + [b for b in args.backends if b != "sqlite"]:
+        backend, load_seconds, size = load_backend(name, db_path)
+        summary[name] = {"load_s": load_seconds, "data_mib": size / 2**20}
+        latencies[name], answers[name] = {}, {}
+        for combination, criteria in queries.items():
+            latencies[name][combination], answers[name][combination] = run_queries(backend, criteria, args.limit)
+
+    mismatches = {
+        name: sum(
+            answers[name][combination] != answers["sqlite"][combination] for combination in queries
+        )
+        for name in summary
+    }
+    for name, stats in summary.items():
+        all_latencies = [l for values in latencies[name].values() for l in values]
+        stats.update(
+            p50_ms=statistics.median(all_latencies) * 1000,
+            max_ms=max(all_latencies) * 1000,
+            mismatched_combinations=mismatches[name],
+        )
+        print(
+            f"{name:<8} load {stats['load_s']:6.1f}s  data {stats['data_mib']:7.1f}MiB"
+            f"  p50 {stats['p50_ms']:7.3f}ms  max {stats['max_ms']:8.2f}ms"
+            f"  mismatched combinations {stats['mismatched_combinations']}"
+        )
+
+    names = list(summary)
+    print(f"\np50 latency (ms), limit {args.limit}\n{'filters':<58}" + "".join(f"{n:>10}" for n in names))
+    by_combination = {}
+    for combination in queries:
+        p50s = {name: statistics.median(latencies[name][combination]) * 1000 for name in names}
+        by_combination[combination] = p50s
+        print(f"{combination:<58}" + "".join(f"{p50s[name]:>10.3f}" for name in names))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"backends": summary, "p50_ms": by_combination}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
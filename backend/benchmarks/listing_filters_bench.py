@@ -0,0 +1,108 @@
+"""
+Listing search latency for every SearchCriteriaObject filter combination,
+at growing dataset sizes.
+
+For each size, generates a synthetic `real_estate` table with
+data/generate_listings.py, then runs all 64 combinations of the city,
+state, min_bedroom, min_bathroom, min_price and max_price filters through
+search_listings, with values taken from random existing listings so every
+query has matches.
+
+Run from the backend directory:
+    python -m benchmarks.listing_filters_bench [--sizes 100000 1000000]
+        [--queries 20] [--output filters.json]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from data.generate_listings import generate_rows, write_sqlite
+from src.graph_nodes.database_query_node import search_listings
+
+FILTERS = ("city", "state", "min_bedroom", "min_bathroom", "min_price", "max_price")
+
+
+def criteria_for(listing: Dict, combination: Tuple[str, ...]) -> Dict:
+    values = {
+        "city": listing["city"],
+        "state": listing["state"],
+        "min_bedroom": listing["bed"],
+        "min_bathroom": listing["bath"],
+        "min_price": round(listing["price"] * 0.9, -3),
+        "max_price": round(listing["price"] * 1.1, -3),
+    }
+    return {key: values[key] for key in combination}
+
+
+def sample_listings(db_path: str, count: int, seed: int) -> List[Dict]:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    total = conn.execute("SELECT COUNT(*) FROM real_estate").fetchone()[0]
+    rng = random.Random(seed)
+    rows = [
+        dict(conn.execute("SELECT * FROM real_estate WHERE rowid = ?", (rng.randrange(1, total + 1),)).fetchone())
+        for _ in range(count)
+    ]
+    conn.close()
+    return rows
+
+
+def combinations() -> List[Tuple[str, ...]]:
+    return [c for n in range(len(FILTERS) + 1) for c in itertools.combinations(FILTERS, n)]
+
+
+def benchmark_size(size: int, queries: int, workdir: str, seed: int) -> Dict[str, Dict]:
+    db_path = os.path.join(workdir, f"listings_{size}.db")
+    start = time.monotonic()
+    write_sqlite(generate_rows(size, seed), db_path)
+    print(f"{size} listings generated in {time.monotonic() - start:.1f}s")
+
+    listings = sample_listings(db_path, queries, seed)
+    results = {}
+    for combination in combinations():
+        latencies, empty = [], 0
+        for listing in listings:
+            criteria = criteria_for(listing, combination)
+            start = time.perf_counter()
+            found = search_listings(criteria, db_path=db_path)
+            latencies.append(time.perf_counter() - start)
+            empty += not found
+        results["+".join(combination) or "(none)"] = {
+            "p50_ms": statistics.median(latencies) * 1000,
+            "max_ms": max(latencies) * 1000,
+            "empty": empty,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=20, help="queries per combination and size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        by_size = {size: benchmark_size(size, args.queries, workdir, args.seed) for size in args.sizes}
+
+    header = f"{'filters':<58}" + "".join(f"{size:>14,}" for size in args.sizes)
+    print(f"\np50 latency (ms) by dataset size\n{header}")
+    for name in by_size[args.sizes[0]]:
+        print(f"{name:<58}" + "".join(f"{by_size[size][name]['p50_ms']:>14.2f}" for size in args.sizes))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({str(size): results for size, results in by_size.items()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
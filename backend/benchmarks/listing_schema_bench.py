@@ -0,0 +1,130 @@
+"""
+Search latency for the square footage, price per square foot, status and sale
+date filters, per index set.
+
+Generates --rows synthetic listings into a SQLite file without indexes, a
+copy with data/generate_listings.py's state and city indexes and a copy that
+also indexes the new filter columns, loads the numpy backend, and runs each
+filter shape with values from random existing listings, checking every
+variant returns the same listings.
+
+Run from the backend directory:
+    python -m benchmarks.listing_schema_bench [--rows 2200000] [--queries 20] [--limits 2 20]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.listing_filters_bench import sample_listings
+from benchmarks.shard_bench import percentile
+from data.generate_listings import CREATE_INDEXES, generate_rows, write_sqlite
+from src.listings.numpy_backend import NumpyListings
+from src.listings.sqlite_backend import SqliteListings
+
+
+def criteria_for(listing: Dict, shape: str) -> Dict:
+    """`shape`'s filters, with values around `listing`'s so every search has matches."""
+    sold = listing["prev_sold_date"] or "2015-06-01"
+    values = {
+        "city": listing["city"],
+        "state": listing["state"],
+        "min_bedroom": listing["bed"],
+        "max_price": round(listing["price"] * 1.1, -3),
+        "min_sqft": listing["house_size"],
+        # Whole dollars, which float32 holds exactly
+        "max_price_per_sqft": round(listing["price_per_sqft"] or 200),
+        "status": listing["status"],
+        "sold_after": sold,
+    }
+    return {key: values[key] for key in shape.split("+")}
+
+
+# Indexes for the new filters, which csv_to_sql.py leaves out: with the
+# default limit SQLite walks one and sorts the matches by rowid
+RANGE_INDEXES = """
+CREATE INDEX real_estate_house_size ON real_estate (house_size);
+CREATE INDEX real_estate_price_per_sqft ON real_estate (price_per_sqft);
+CREATE INDEX real_estate_status_sold ON real_estate (status, prev_sold_date);
+"""
+
+SHAPES = [
+    "min_sqft",
+    "max_price_per_sqft",
+    "status",
+    "sold_after",
+    "status+sold_after",
+    "state+min_sqft",
+    "city+max_price_per_sqft",
+    "state+status+sold_after",
+    "status+max_price+min_sqft",
+    "city+min_bedroom+min_sqft+max_price_per_sqft",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2200000)
+    parser.add_argument("--queries", type=int, default=20, help="queries per filter shape")
+    parser.add_argument("--limits", type=int, nargs="+", default=[2, 20])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        plain = os.path.join(workdir, "plain.db")
+        write_sqlite(generate_rows(args.rows, args.seed), plain, indexes=False)
+        print(f"{args.rows:,} listings: {os.path.getsize(plain) / 2**20:.0f}MiB without indexes")
+        backends = {"sqlite": SqliteListings(plain)}
+        for name, script in (("+state,city", CREATE_INDEXES), ("+range", CREATE_INDEXES + RANGE_INDEXES)):
+            path = os.path.join(workdir, f"{name[1:].replace(',', '_')}.db")
+            shutil.copyfile(plain, path)
+            start = time.monotonic()
+            conn = sqlite3.connect(path)
+            conn.executescript(script)
+            conn.execute("ANALYZE")
+            conn.commit()
+            conn.close()
+            print(f"sqlite{name}: {os.path.getsize(path) / 2**20:.0f}MiB, indexed in {time.monotonic() - start:.1f}s")
+            backends[f"sqlite{name}"] = SqliteListings(path)
+        backends["numpy"] = NumpyListings.from_sqlite(plain)
+        print(f"numpy: {backends['numpy'].nbytes() / 2**20:.0f}MiB of arrays and indexes")
+
+        listings = sample_listings(plain, args.queries, args.seed)
+        # Read each file into the page cache before timing
+        for backend in backends.values():
+            for shape in SHAPES:
+                for listing in listings:
+                    backend.search(criteria_for(listing, shape), max(args.limits))
+        for limit in args.limits:
+            print(f"\nlimit {limit}, p50 / p95 ms\n{'filters':<46}" + "".join(f"{name:>20}" for name in backends))
+            for shape in SHAPES:
+                latencies: Dict[str, List[float]] = {name: [] for name in backends}
+                mismatches = 0
+                for listing in listings:
+                    criteria = criteria_for(listing, shape)
+                    results = {}
+                    for name, backend in backends.items():
+                        start = time.perf_counter()
+                        results[name] = backend.search(criteria, limit)
+                        latencies[name].append(time.perf_counter() - start)
+                    mismatches += any(r != results["sqlite"] for r in results.values())
+                print(
+                    f"{shape:<46}"
+                    + "".join(
+                        f"{f'{statistics.median(v) * 1000:.2f} / {percentile(v, 0.95) * 1000:.2f}':>20}"
+                        for v in latencies.values()
+                    )
+                    + (f"  ({mismatches} differ)" if mismatches else "")
+                )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
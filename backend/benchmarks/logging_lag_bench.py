@@ -0,0 +1,110 @@
+"""
+Event-loop lag with request-path logging off, with the old print() calls,
+and with queue-backed structured logging.
+
+Simulates concurrent voice calls whose turns log what the request path
+logs: the raw request, the transcript, each streamed update and the
+response. A probe task measures how late its timer wakeups are, which is
+how long other connections would wait on the loop.
+
+Run from the backend directory:
+    python -m benchmarks.logging_lag_bench [--clients 50] [--seconds 5]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import statistics
+import tempfile
+import time
+
+from src.util import structured_logging
+
+PROBE_INTERVAL = 0.005
+
+
+def make_transcript(utterances: int):
+    return [
+        {
+            "role": "agent" if i % 2 else "user",
+            "content": f"Utterance {i}: I'm looking for a three bedroom home near downtown "
+            f"with a big yard, my number is 555-010-{i:04d}",
+        }
+        for i in range(utterances)
+    ]
+
+
+async def client(mode: str, transcript, turn_interval: float, stop_at: float):
+    logger = logging.getLogger("bench.client")
+    response_id = 0
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(turn_interval)
+        response_id += 1
+        request = {"interaction_type": "response_required", "response_id": response_id, "transcript": transcript}
+        if mode == "print":
+            print(f"Received raw data: {request}")
+            print(f"Converting transcript to OpenAI messages: {transcript}")
+            for _ in range(3):
+                print(f"Updated final content: {transcript[-1]['content']}")
+            print(f"Sending data from RetellSocketAdapter: {transcript[-1]}")
+        elif mode != "off":
+            logger.debug("Processing message", extra={"payload": request})
+            logger.debug("Converted transcript", extra={"payload": transcript})
+            for _ in range(3):
+                logger.debug("Updated final content", extra={"payload": transcript[-1]["content"]})
+            logger.info("Turn answered", extra={"response_id": response_id})
+            logger.debug("Sending response", extra={"payload": transcript[-1]})
+
+
+async def probe(stop_at: float):
+    lags = []
+    while time.monotonic() < stop_at:
+        start = time.monotonic()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.monotonic() - start - PROBE_INTERVAL)
+    return lags
+
+
+async def run(mode: str, args, transcript):
+    stop_at = time.monotonic() + args.seconds
+    clients = [
+        client(mode, transcript, args.turn_interval, stop_at) for _ in range(args.clients)
+    ]
+    lags, *_ = await asyncio.gather(probe(stop_at), *clients)
+    return lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--turn-interval", type=float, default=0.05)
+    parser.add_argument("--utterances", type=int, default=40)
+    args = parser.parse_args()
+
+    transcript = make_transcript(args.utterances)
+    modes = ("off", "print", "queue", "queue-debug")
+    print(f"{args.clients} clients, a turn every {args.turn_interval}s each, {args.utterances}-utterance transcripts")
+    for mode in modes:
+        # Output goes to a file so the terminal isn't the bottleneck
+        with tempfile.TemporaryFile("w") as output, contextlib.redirect_stdout(output):
+            if mode.startswith("queue"):
+                structured_logging.configure_logging(
+                    "DEBUG" if mode == "queue-debug" else "INFO", stream=output
+                )
+            else:
+                logging.getLogger().setLevel(logging.CRITICAL)
+            lags = asyncio.run(run(mode, args, transcript))
+            structured_logging.stop_logging()
+            written = output.tell()
+        lags.sort()
+        print(
+            f"{mode:>12}: loop lag p50 {statistics.median(lags) * 1000:.2f}ms"
+            f"  p99 {lags[int(len(lags) * 0.99)] * 1000:.2f}ms"
+            f"  max {lags[-1] * 1000:.2f}ms  output {written / 1024:.0f}KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
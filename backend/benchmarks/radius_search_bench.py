@@ -0,0 +1,108 @@
+"""
+Radius search latency: zip codes in range from the R*Tree, then listings.
+
+Generates --rows synthetic listings and their zip code centroids, loads the
+centroids with src.listings.geo, and runs "within R miles of a zip code" and
+"within R miles of a city" searches around random existing listings. Reports
+the zip code lookup against a haversine scan of every centroid (checking both
+find the same zip codes) and the end-to-end search latency per backend
+(checking both return the same listings).
+
+Run from the backend directory:
+    python -m benchmarks.radius_search_bench [--rows 2200000] [--queries 20]
+        [--radii 1 5 10 25 50]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.listing_filters_bench import sample_listings
+from benchmarks.shard_bench import percentile
+from data.generate_listings import generate_rows, write_sqlite, write_zip_centroids
+from src.listings.geo import center_of, load_zip_centroids, miles_between, resolve_radius
+from src.listings.numpy_backend import NumpyListings
+from src.listings.sqlite_backend import SqliteListings
+
+
+def zips_by_scan(conn: sqlite3.Connection, latitude: float, longitude: float, miles: float) -> List[str]:
+    """What the R*Tree answers, by checking every centroid."""
+    return [
+        zip_code
+        for zip_code, lat, lon in conn.execute("SELECT zip_code, latitude, longitude FROM zip_centroids")
+        if miles_between(latitude, longitude, lat, lon) <= miles
+    ]
+
+
+def ms(values: List[float]) -> str:
+    return f"{statistics.median(values) * 1000:.2f} / {percentile(values, 0.95) * 1000:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2200000)
+    parser.add_argument("--queries", type=int, default=20, help="searches per radius")
+    parser.add_argument("--radii", type=float, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--limit", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "listings.db")
+        write_sqlite(generate_rows(args.rows, args.seed), db_path)
+        zips_path = os.path.join(workdir, "zips.csv")
+        write_zip_centroids(zips_path, args.seed)
+        start = time.monotonic()
+        count = load_zip_centroids(zips_path, db_path)
+        print(f"{args.rows:,} listings; {count:,} zip centroids loaded in {time.monotonic() - start:.1f}s")
+
+        backends = {"sqlite": SqliteListings(db_path), "numpy": NumpyListings.from_sqlite(db_path)}
+        listings = sample_listings(db_path, args.queries, args.seed)
+        conn = sqlite3.connect(db_path)
+
+        print(
+            f"\np50 / p95 ms, limit {args.limit}\n{'search':<22}{'zips':>7}{'R*Tree':>16}{'centroid scan':>16}"
+            + "".join(f"{name:>16}" for name in backends)
+        )
+        for center in ("near_zip", "city"):
+            for radius in args.radii:
+                lookup, scan, zip_counts = [], [], []
+                latencies: Dict[str, List[float]] = {name: [] for name in backends}
+                wrong_zips = mismatches = 0
+                for listing in listings:
+                    criteria = {"radius_miles": radius}
+                    if center == "near_zip":
+                        criteria["near_zip"] = listing["zip_code"]
+                    else:
+                        criteria.update(city=listing["city"], state=listing["state"])
+
+                    start = time.perf_counter()
+                    resolved = resolve_radius(criteria, db_path)
+                    lookup.append(time.perf_counter() - start)
+                    zip_counts.append(len(resolved["zip_codes"]))
+                    start = time.perf_counter()
+                    scanned = zips_by_scan(conn, *center_of(conn, criteria), radius)
+                    scan.append(time.perf_counter() - start)
+                    wrong_zips += sorted(scanned) != sorted(resolved["zip_codes"])
+
+                    results = {}
+                    for name, backend in backends.items():
+                        start = time.perf_counter()
+                        results[name] = backend.search(resolve_radius(criteria, db_path), args.limit)
+                        latencies[name].append(time.perf_counter() - start)
+                    mismatches += results["numpy"] != results["sqlite"]
+                print(
+                    f"{f'{center} {radius:g}mi':<22}{statistics.median(zip_counts):>7.0f}{ms(lookup):>16}{ms(scan):>16}"
+                    + "".join(f"{ms(v):>16}" for v in latencies.values())
+                    + (f"  ({wrong_zips} zip sets differ)" if wrong_zips else "")
+                    + (f"  ({mismatches} searches differ)" if mismatches else "")
+                )
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+How often follow-up searches can be refined from the thread's last results,
+and the latency that saves.
+
+Generates --rows synthetic listings and simulates --sessions conversations:
+a first search around a random listing, then follow-ups that mostly tighten
+it (a lower budget, more bedrooms, bathrooms or square feet) and sometimes
+widen it (a higher budget, another city), merged with the graph's
+update_search_criteria. Each turn runs on the plain backend and through
+RefiningSearch, keeping each of --candidates matches per thread; reports
+how each refining search was answered, latency per outcome against the
+plain search of the same turns, and checks both return the same listings.
+
+Run from the backend directory:
+    python -m benchmarks.refinement_bench [--rows 2200000] [--sessions 300]
+        [--turns 5] [--backends sqlite numpy] [--candidates 2 5 10 20 50]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.listing_filters_bench import sample_listings
+from data.generate_listings import generate_rows, write_sqlite
+from src.listings import create_listing_backend
+from src.listings.refine import RefiningSearch
+from src.util.state import update_search_criteria
+
+# (follow-up, weight): roughly three narrowing follow-ups to one widening
+FOLLOW_UPS = [
+    ("lower budget", 3),
+    ("more bedrooms", 2),
+    ("more bathrooms", 1),
+    ("bigger", 1),
+    ("higher budget", 1),
+    ("other city", 1),
+]
+
+
+def first_search(listing: Dict, rng: random.Random) -> Dict:
+    criteria = {"state": listing["state"]}
+    if rng.random() < 0.7:
+        criteria["city"] = listing["city"]
+    if rng.random() < 0.5:
+        criteria["min_bedroom"] = max(1, listing["bed"] - 1)
+    return criteria
+
+
+def follow_up(criteria: Dict, listing: Dict, other: Dict, rng: random.Random) -> Dict:
+    """The criteria a follow-up adds or changes, as the search criteria agent returns them."""
+    kind = rng.choices([name for name, _ in FOLLOW_UPS], [weight for _, weight in FOLLOW_UPS])[0]
+    budget = criteria.get("max_price", round(listing["price"] * 1.5, -3))
+    if kind == "lower budget":
+        return {"max_price": round(budget * 0.8, -3)}
+    if kind == "higher budget":
+        return {"max_price": round(budget * 1.5, -3)}
+    if kind == "more bedrooms":
+        return {"min_bedroom": criteria.get("min_bedroom", 1) + 1}
+    if kind == "more bathrooms":
+        return {"min_bathroom": criteria.get("min_bathroom", 1) + 1}
+    if kind == "bigger":
+        return {"min_sqft": criteria.get("min_sqft", 1000) + 500}
+    return {"city": other["city"], "state": other["state"]}
+
+
+def conversations(listings: List[Dict], sessions: int, turns: int, seed: int) -> List[List[Dict]]:
+    rng = random.Random(seed)
+    result = []
+    for session in range(sessions):
+        listing = listings[session % len(listings)]
+        criteria = first_search(listing, rng)
+        searches = [criteria]
+        for _ in range(turns - 1):
+            criteria = update_search_criteria(criteria, follow_up(criteria, listing, rng.choice(listings), rng))
+            searches.append(criteria)
+        result.append(searches)
+    return result
+
+
+def run(
+    backend, sessions: List[List[Dict]], limit: int, candidates: int
+) -> Tuple[Dict[str, List[Tuple[float, float]]], int]:
+    """(refining seconds, plain seconds) per turn by outcome, and turns whose listings differ."""
+    refining = RefiningSearch(candidates)
+    by_outcome: Dict[str, List[Tuple[float, float]]] = defaultdict(list)
+    mismatches = 0
+    for thread, searches in enumerate(sessions):
+        for criteria in searches:
+            start = time.perf_counter()
+            expected = backend.search(criteria, limit)
+            plain = time.perf_counter() - start
+            start = time.perf_counter()
+            results, outcome = refining.search(backend, str(thread), criteria, limit)
+            by_outcome[outcome].append((time.perf_counter() - start, plain))
+            mismatches += results != expected
+    return by_outcome, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2200000)
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=5, help="searches per session")
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "numpy"])
+    parser.add_argument("--limit", type=int, default=2)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[2, 5, 10, 20, 50])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "listings.db")
+        write_sqlite(generate_rows(args.rows, args.seed), db_path)
+        sessions = conversations(sample_listings(db_path, args.sessions, args.seed), args.sessions, args.turns, args.seed)
+        turns = sum(len(searches) for searches in sessions)
+
+        for name in args.backends:
+            backend = create_listing_backend(name, db_path)
+            run(backend, sessions[:20], args.limit, max(args.candidates))  # warm the page cache
+            for candidates in args.candidates:
+                by_outcome, mismatches = run(backend, sessions, args.limit, candidates)
+                print(
+                    f"\n{name}, {candidates} candidates: {turns} searches"
+                    + (f", {mismatches} returned different listings" if mismatches else "")
+                )
+                print(f"{'outcome':<14}{'share':>8}{'refining p50 ms':>18}{'plain p50 ms':>15}{'saved ms/search':>18}")
+                for outcome, timings in sorted(by_outcome.items(), key=lambda item: -len(item[1])):
+                    refined, plain = zip(*timings)
+                    print(
+                        f"{outcome:<14}{len(timings) / turns:>8.1%}{statistics.median(refined) * 1000:>18.3f}"
+                        f"{statistics.median(plain) * 1000:>15.3f}"
+                        f"{(sum(plain) - sum(refined)) / len(timings) * 1000:>18.3f}"
+                    )
+                total_refined = sum(r for timings in by_outcome.values() for r, _ in timings)
+                total_plain = sum(p for timings in by_outcome.values() for _, p in timings)
+                print(
+                    f"{'all':<14}{1:>8.1%}{'':>18}{'':>15}{(total_plain - total_refined) / turns * 1000:>18.3f}"
+                    f"  ({total_refined:.2f}s refining vs {total_plain:.2f}s plain)"
+                )
+
+
+if __name__ == "__main__":
+    main()
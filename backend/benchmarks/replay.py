@@ -0,0 +1,223 @@
+"""
+Replays recorded conversations through the real graph, offline.
+
+Each recording (benchmarks/recordings/*.json) holds the user's turns and the
+LLM responses and tool calls that came back. The responses are scripted on
+LlmDummyMock's chat model, the calendar is StubCalendarService and listings
+come from a temporary SQLite database, so create_graph() runs end to end
+without network access.
+
+Reports per-node and end-to-end latency, peak allocations per turn and
+checkpoint sizes. With --baseline it exits non-zero when a number regresses
+by more than --max-regression, for use in CI.
+
+Run from the backend directory:
+    python -m benchmarks.replay [--repeat 20] [--output replay.json]
+        [--baseline replay-baseline.json] [--max-regression 0.25]
+"""
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from typing import Dict, List
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.stubs import StubCalendarService, create_listings_db
+
+RECORDINGS = os.path.join(os.path.dirname(__file__), "recordings")
+
+# Timing regressions smaller than this are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.002
+
+
+def load_recordings(path: str) -> List[Dict]:
+    files = sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+    recordings = []
+    for file in files:
+        with open(file) as f:
+            recordings.append(json.load(f))
+    return recordings
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Replayer:
+    def __init__(self, graph, mock, handler):
+        self.graph = graph
+        self.mock = mock
+        self.handler = handler
+
+    def checkpoint_bytes(self, config) -> int:
+        saver = self.graph.checkpointer
+        checkpoint = saver.get_tuple(config).checkpoint
+        return len(saver.serde.dumps(checkpoint))
+
+    def run_turn(self, config, user_text: str, node_times: Dict[str, List[float]]) -> float:
+        pending = self.handler.get_pending_sensitive_tool_calls(self.graph, config)
+        if pending:
+            graph_input = self.handler.approval_input(pending, user_text)
+        else:
+            graph_input = {"messages": [HumanMessage(content=user_text)]}
+
+        start = last = time.perf_counter()
+        # Nodes run one after another, so the gap between updates is the
+        # node's own time plus its checkpoint write
+        for event in self.graph.stream(graph_input, config, stream_mode="updates"):
+            now = time.perf_counter()
+            for node in event:
+                node_times[node].append(now - last)
+            last = now
+        return time.perf_counter() - start
+
+    def run(self, recording: Dict, node_times, measure_allocations: bool = False) -> Dict:
+        self.mock.responses.clear()
+        for turn in recording["turns"]:
+            self.mock.push(turn["responses"])
+        calls_before = self.mock.calls
+        expected_calls = sum(len(turn["responses"]) for turn in recording["turns"])
+
+        config = {"configurable": {"thread_id": str(uuid.uuid4()), "user_id": "replay"}}
+        turn_times, peaks = [], []
+        for turn in recording["turns"]:
+            if measure_allocations:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            turn_times.append(self.run_turn(config, turn["user"], node_times))
+            if measure_allocations:
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+
+        return {
+            "turn_times": turn_times,
+            "alloc_peaks": peaks,
+            "checkpoint_bytes": self.checkpoint_bytes(config),
+            # The graph took a different path than when it was recorded
+            "diverged": bool(self.mock.responses)
+            or self.mock.calls - calls_before != expected_calls,
+        }
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    regressions = []
+
+    def check(label, current, previous, floor=0.0):
+        if previous and current > previous * (1 + max_regression) and current - previous > floor:
+            regressions.append(f"{label}: {previous:g} -> {current:g}")
+
+    for name, conversation in results["conversations"].items():
+        old = baseline.get("conversations", {}).get(name)
+        if not old:
+            continue
+        check(f"{name} turn p50 (s)", conversation["turn_p50"], old["turn_p50"], MIN_REGRESSION_SECONDS)
+        check(f"{name} checkpoint (bytes)", conversation["checkpoint_bytes"], old["checkpoint_bytes"])
+        check(f"{name} peak alloc (KiB)", conversation["alloc_peak_kib"], old["alloc_peak_kib"])
+    for node, stats in results["nodes"].items():
+        old = baseline.get("nodes", {}).get(node)
+        if old:
+            check(f"node {node} p50 (s)", stats["p50"], old["p50"], MIN_REGRESSION_SECONDS)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recordings", default=RECORDINGS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="replay recorded LLM latencies scaled by this (0: answer at once)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against results written by --output")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    # Set before the graph is imported: the listings backend reads it at import
+    db_path = os.path.join(tempfile.mkdtemp(), "listings.db")
+    create_listings_db(db_path)
+    os.environ["LISTINGS_DB_PATH"] = db_path
+    os.environ["QUERY_LOG_PATH"] = os.path.join(os.path.dirname(db_path), "query_log.db")
+
+    from src.graph import create_graph
+    from src.util.appointment_tools import set_calendar_service
+    from src.util.llm import set_chat_model_factory
+
+    mock = importlib.import_module("app-retell.mock_llm_client").LlmDummyMock(
+        latency_scale=args.latency_scale
+    )
+    set_chat_model_factory(mock.chat_model)
+    set_calendar_service(StubCalendarService())
+    handler = importlib.import_module("app-retell.message_handler")
+
+    replayer = Replayer(create_graph(), mock, handler)
+    recordings = load_recordings(args.recordings)
+
+    # Warm up lazy imports and caches before measuring
+    for recording in recordings:
+        replayer.run(recording, defaultdict(list))
+
+    node_times: Dict[str, List[float]] = defaultdict(list)
+    results = {"conversations": {}, "nodes": {}}
+    for recording in recordings:
+        turn_times, diverged = [], False
+        for _ in range(args.repeat):
+            run = replayer.run(recording, node_times)
+            turn_times.extend(run["turn_times"])
+            diverged |= run["diverged"]
+
+        tracemalloc.start()
+        allocations = replayer.run(recording, defaultdict(list), measure_allocations=True)
+        tracemalloc.stop()
+
+        results["conversations"][recording["name"]] = {
+            "turns": len(recording["turns"]),
+            "turn_p50": statistics.median(turn_times),
+            "turn_p95": percentile(turn_times, 0.95),
+            "conversation_mean": sum(turn_times) / args.repeat,
+            "alloc_peak_kib": max(allocations["alloc_peaks"]) / 1024,
+            "checkpoint_bytes": run["checkpoint_bytes"],
+            "diverged": diverged,
+        }
+
+    for node, times in sorted(node_times.items()):
+        results["nodes"][node] = {
+            "count": len(times),
+            "p50": statistics.median(times),
+            "p95": percentile(times, 0.95),
+        }
+
+    print(f"{len(recordings)} recordings x {args.repeat} runs")
+    for name, c in results["conversations"].items():
+        print(
+            f"{name:>22}: turn p50 {c['turn_p50'] * 1000:.2f}ms  p95 {c['turn_p95'] * 1000:.2f}ms"
+            f"  peak alloc/turn {c['alloc_peak_kib']:.0f}KiB  checkpoint {c['checkpoint_bytes'] / 1024:.1f}KiB"
+            + ("  DIVERGED from recording" if c["diverged"] else "")
+        )
+    for node, n in results["nodes"].items():
+        print(f"{node:>28}: p50 {n['p50'] * 1000:.2f}ms  p95 {n['p95'] * 1000:.2f}ms  ({n['count']} runs)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = any(c["diverged"] for c in results["conversations"].values())
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed |= bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Saved-search matching throughput at ingest, reverse index vs a nested loop.
+
+Generates --listings synthetic new listings and their zip code centroids,
+and --searches saved searches around random listings: a city, a state or a
+radius around a zip code, most with a price range, some with bed, bath or
+square feet minimums. Times building SavedSearchIndex, matching every
+listing against it and queueing the alerts, and the nested loop that checks
+every search against every listing, on --check searches, extrapolated to
+all of them. Checks that, for those searches, every alert matches and each
+gets as many as the nested loop finds, up to the alert limit.
+
+Run from the backend directory:
+    python -m benchmarks.saved_search_bench [--searches 100000] [--listings 100000]
+        [--check 200]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.listing_filters_bench import sample_listings
+from data.generate_listings import generate_rows, write_sqlite, write_zip_centroids
+from src.listings import active_filters
+from src.listings.geo import load_zip_centroids, resolve_radius
+from src.listings.refine import passes
+from src.listings.saved_searches import SAVED_SEARCH_ALERT_LIMIT, SavedSearches, SavedSearchIndex, listings_since
+
+
+def saved_search(listing: Dict, rng: random.Random) -> Dict:
+    location = rng.random()
+    if location < 0.6:
+        criteria = {"state": listing["state"], "city": listing["city"]}
+    elif location < 0.9:
+        criteria = {"state": listing["state"]}
+    else:
+        criteria = {"near_zip": listing["zip_code"], "radius_miles": rng.choice([5, 10, 25])}
+    if rng.random() < 0.8:
+        criteria["max_price"] = round(listing["price"] * rng.uniform(0.8, 1.5), -3)
+    if rng.random() < 0.3:
+        criteria["min_price"] = round(listing["price"] * rng.uniform(0.3, 0.8), -3)
+    if rng.random() < 0.6:
+        criteria["min_bedroom"] = max(1, listing["bed"] - rng.randrange(2))
+    if rng.random() < 0.4:
+        criteria["min_bathroom"] = max(1, listing["bath"] - rng.randrange(2))
+    if rng.random() < 0.2:
+        criteria["min_sqft"] = round(listing["house_size"] * 0.9, -2)
+    return criteria
+
+
+def nested_loop(
+    searches: List[Tuple[str, Dict]], listings: List[Dict], db_path: str
+) -> Dict[str, List[Dict]]:
+    """Every listing each search matches, checking each pair."""
+    matches = {}
+    for thread_id, criteria in searches:
+        filters = [
+            (column, op, set(value) if op == "in" else value)
+            for column, op, value in active_filters(resolve_radius(criteria, db_path))
+        ]
+        matches[thread_id] = [listing for listing in listings if passes(listing, filters)]
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--searches", type=int, default=100000)
+    parser.add_argument("--listings", type=int, default=100000)
+    parser.add_argument("--check", type=int, default=200, help="searches run through the nested loop")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "listings.db")
+        write_sqlite(generate_rows(args.listings, args.seed), db_path)
+        zips_path = os.path.join(workdir, "zips.csv")
+        write_zip_centroids(zips_path, args.seed)
+        load_zip_centroids(zips_path, db_path)
+        listings = listings_since(db_path, 0)
+
+        rng = random.Random(args.seed)
+        store = SavedSearches(os.path.join(workdir, "saved_searches.db"))
+        start = time.perf_counter()
+        for i, listing in enumerate(sample_listings(db_path, args.searches, args.seed + 1)):
+            store.save(f"thread-{i}", saved_search(listing, rng))
+        saved = time.perf_counter() - start
+        searches = store.all()
+        print(
+            f"{len(searches):,} saved searches ({saved / len(searches) * 1e6:.0f}us each to save),"
+            f" {len(listings):,} new listings"
+        )
+
+        start = time.perf_counter()
+        index = SavedSearchIndex(searches, db_path)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        matches = index.match(listings)
+        matched = time.perf_counter() - start
+        start = time.perf_counter()
+        queued = store.enqueue_alerts(matches)
+        enqueued = time.perf_counter() - start
+        print(f"\n{'step':<22}{'seconds':>10}{'listings/s':>14}")
+        for step, seconds in [("build index", built), ("match", matched), ("queue alerts", enqueued)]:
+            print(f"{step:<22}{seconds:>10.2f}{len(listings) / seconds:>14,.0f}")
+        total = built + matched + enqueued
+        print(
+            f"{'all':<22}{total:>10.2f}{len(listings) / total:>14,.0f}"
+            f"  ({queued:,} alerts for {len({thread_id for thread_id, _ in matches}):,} searches)"
+        )
+
+        checked = rng.sample(searches, min(args.check, len(searches)))
+        start = time.perf_counter()
+        expected = nested_loop(checked, listings, db_path)
+        looped = time.perf_counter() - start
+        print(
+            f"\nnested loop: {looped:.2f}s for {len(checked)} searches,"
+            f" about {looped * len(searches) / len(checked):,.0f}s for all {len(searches):,}"
+        )
+
+        by_thread: Dict[str, List[Dict]] = defaultdict(list)
+        for thread_id, listing in matches:
+            by_thread[thread_id].append(listing)
+        wrong = 0
+        for thread_id, criteria in checked:
+            alerts = by_thread[thread_id]
+            keys = {(listing["zip_code"], listing["street"]) for listing in expected[thread_id]}
+            wrong += len(alerts) != min(SAVED_SEARCH_ALERT_LIMIT, len(expected[thread_id])) or any(
+                (listing["zip_code"], listing["street"]) not in keys for listing in alerts
+            )
+        print(f"{len(checked) - wrong} of {len(checked)} checked searches got the alerts the nested loop finds")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
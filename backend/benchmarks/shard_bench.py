@@ -0,0 +1,104 @@
+"""
+Ingest time and search latency, per-state shards vs one listings database.
+
+Generates --rows synthetic listings, then times copying them into a single
+database (the monolithic ingest) and into one database per state. Searches
+with a state go to one shard and searches without one fan out to every
+shard that can hold matches, so latency is reported separately for the two,
+per fan-out thread count, over every filter combination with values from
+random existing listings. Checks the shards return the same listings as the
+single database.
+
+Run from the backend directory:
+    python -m benchmarks.shard_bench [--rows 2200000] [--queries 10] [--limits 2 20]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.listing_filters_bench import combinations, criteria_for, sample_listings
+from data.generate_listings import generate_rows, write_sqlite
+from src.listings.sharded_backend import ShardedListings, write_shards
+from src.listings.sqlite_backend import SqliteListings
+
+
+def write_monolithic(db_path: str, path: str) -> None:
+    """The single-file equivalent of write_shards: one copy of the table."""
+    conn = sqlite3.connect(path)
+    conn.execute("ATTACH DATABASE ? AS source", (db_path,))
+    (create_table,) = conn.execute(
+        "SELECT sql FROM source.sqlite_master WHERE type = 'table' AND name = 'real_estate'"
+    ).fetchone()
+    conn.execute(create_table)
+    conn.execute("INSERT INTO real_estate SELECT * FROM source.real_estate ORDER BY rowid")
+    conn.commit()
+    conn.close()
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2200000)
+    parser.add_argument("--queries", type=int, default=10, help="queries per filter combination")
+    parser.add_argument("--limits", type=int, nargs="+", default=[2, 20])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8], help="fan-out thread counts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    source = os.path.join(workdir, "source.db")
+    write_sqlite(generate_rows(args.rows, args.seed), source)
+    print(f"{args.rows:,} listings generated")
+
+    monolithic = os.path.join(workdir, "monolithic.db")
+    start = time.monotonic()
+    write_monolithic(source, monolithic)
+    print(f"ingest: monolithic {time.monotonic() - start:.1f}s", end="")
+    start = time.monotonic()
+    shard_dir = write_shards(source, os.path.join(workdir, "shards"))
+    print(f", sharded {time.monotonic() - start:.1f}s")
+
+    listings = sample_listings(monolithic, args.queries, args.seed)
+    single = SqliteListings(monolithic)
+    backends = {"monolithic": single}
+    backends.update({f"shards x{w}": ShardedListings(shard_dir, w) for w in args.workers})
+
+    print(f"\n{'limit':<7}{'searches':<16}" + "".join(f"{name:>26}" for name in backends))
+    for limit in args.limits:
+        latencies: Dict[str, Dict[str, List[float]]] = {
+            routed: {name: [] for name in backends} for routed in ("with state", "without state")
+        }
+        mismatches = 0
+        for combination in combinations():
+            routed = "with state" if "state" in combination else "without state"
+            for listing in listings:
+                criteria = criteria_for(listing, combination)
+                results = {}
+                for name, backend in backends.items():
+                    start = time.perf_counter()
+                    results[name] = backend.search(criteria, limit)
+                    latencies[routed][name].append(time.perf_counter() - start)
+                mismatches += any(r != results["monolithic"] for r in results.values())
+        for routed, by_backend in latencies.items():
+            print(
+                f"{limit:<7}{routed:<16}"
+                + "".join(
+                    f"{f'p50 {statistics.median(v) * 1000:.2f}ms p95 {percentile(v, 0.95) * 1000:.2f}ms':>26}"
+                    for v in by_backend.values()
+                )
+            )
+        if mismatches:
+            print(f"       {mismatches} searches returned different listings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Similar-listings latency and recall, IVF index vs brute force.
+
+Generates --rows synthetic listings and their zip code centroids, builds the
+similarity index, and looks up the --k nearest neighbours of random existing
+listings: by brute force over every vector, and through the IVF index at
+each --nprobe. Recall is the share of the brute-force top k the index finds.
+Also times the whole lookup the FindSimilarListings tool makes, listings
+fetched from SQLite included.
+
+Run from the backend directory:
+    python -m benchmarks.similar_listings_bench [--rows 2200000] [--queries 200]
+        [--k 10] [--nprobe 1 2 4 8 16 32]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.listing_filters_bench import sample_listings
+from benchmarks.shard_bench import percentile
+from data.generate_listings import generate_rows, write_sqlite, write_zip_centroids
+from src.listings.geo import center_of, load_zip_centroids
+from src.listings.similar import SimilarityIndex, similar_listings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "listings.db")
+        write_sqlite(generate_rows(args.rows, args.seed), db_path)
+        zips_path = os.path.join(workdir, "zips.csv")
+        write_zip_centroids(zips_path, args.seed)
+        load_zip_centroids(zips_path, db_path)
+
+        start = time.monotonic()
+        index = SimilarityIndex.build(db_path, args.seed)
+        print(
+            f"{len(index.ids):,} listings indexed in {len(index.centroids):,} lists,"
+            f" {index.nbytes() / 2**20:.0f}MiB, in {time.monotonic() - start:.1f}s"
+        )
+
+        conn = sqlite3.connect(db_path)
+        queries = []
+        for listing in sample_listings(db_path, args.queries, args.seed):
+            latitude, longitude = center_of(conn, {"near_zip": listing["zip_code"]})
+            queries.append(
+                index.query_vector(
+                    listing["price"], listing["bed"], listing["bath"], listing["house_size"], latitude, longitude
+                )
+            )
+        conn.close()
+
+        exact, latencies = [], []
+        for vector, weights in queries:
+            start = time.perf_counter()
+            ids, _ = index.brute_force(vector, weights, args.k)
+            latencies.append(time.perf_counter() - start)
+            exact.append(set(ids.tolist()))
+        print(f"\n{'method':<16}{'p50 ms':>10}{'p95 ms':>10}{f'recall@{args.k}':>12}")
+        print(
+            f"{'brute force':<16}{statistics.median(latencies) * 1000:>10.2f}"
+            f"{percentile(latencies, 0.95) * 1000:>10.2f}{1:>12.3f}"
+        )
+
+        for nprobe in args.nprobe:
+            latencies, found = [], 0
+            for (vector, weights), truth in zip(queries, exact):
+                start = time.perf_counter()
+                ids, _ = index.search(vector, weights, args.k, nprobe)
+                latencies.append(time.perf_counter() - start)
+                found += len(truth & set(ids.tolist()))
+            print(
+                f"{f'IVF nprobe {nprobe}':<16}{statistics.median(latencies) * 1000:>10.2f}"
+                f"{percentile(latencies, 0.95) * 1000:>10.2f}{found / (len(queries) * args.k):>12.3f}"
+            )
+
+        latencies = []
+        for listing in sample_listings(db_path, args.queries, args.seed + 1):
+            start = time.perf_counter()
+            similar_listings(listing, 3, db_path, index)
+            latencies.append(time.perf_counter() - start)
+        print(
+            f"\nFindSimilarListings lookup, 3 listings: p50 {statistics.median(latencies) * 1000:.2f}ms"
+            f" p95 {percentile(latencies, 0.95) * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
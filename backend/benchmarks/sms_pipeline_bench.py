@@ -0,0 +1,123 @@
+"""
+Webhook latency and end-to-end latency of the SMS endpoint, sync vs async.
+
+Sends a burst of Twilio webhooks to `/sms` in-process. The graph is replaced
+by a stand-in that takes `--turn-latency` seconds per turn, and replies in
+async mode go to a local Twilio stand-in, so no network access is needed.
+
+- webhook: time until `/sms` returns to Twilio
+- end-to-end: time until the reply reaches the user (the TwiML response in
+  sync mode, the Twilio stand-in in async mode)
+
+Run from the backend directory:
+    python -m benchmarks.sms_pipeline_bench [--messages 50] [--turn-latency 2]
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+import httpx
+from langchain_core.messages import AIMessage
+
+from benchmarks.twilio_standin import TwilioStandIn
+
+
+class SlowGraph:
+    """Stands in for the compiled graph: one reply after a fixed delay."""
+
+    def __init__(self, turn_latency: float):
+        self.turn_latency = turn_latency
+
+    def get_state(self, config):
+        return SimpleNamespace(next=(), values={})
+
+    def stream(self, graph_input, config, stream_mode="updates"):
+        time.sleep(self.turn_latency)
+        yield {"main_agent": {"messages": AIMessage(content="Here's what I found.")}}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarise(name, values):
+    return (
+        f"{name:>12}: p50 {statistics.median(values) * 1000:8.1f} ms"
+        f"  p95 {percentile(values, 0.95) * 1000:8.1f} ms"
+        f"  max {max(values) * 1000:8.1f} ms"
+    )
+
+
+async def run(mode: str, messages: int, turn_latency: float, failure_rate: float):
+    os.environ["SMS_MODE"] = mode
+    standin = TwilioStandIn(failure_rate=failure_rate).start()
+    os.environ["TWILIO_API_BASE_URL"] = standin.base_url
+    os.environ["TWILIO_ACCOUNT_SID"] = "ACbench"
+    os.environ["SMS_QUEUE_PATH"] = os.path.join(tempfile.mkdtemp(), "sms_queue.db")
+
+    server = importlib.reload(importlib.import_module("app-retell.server"))
+    app = server.app
+    # ASGITransport doesn't run startup events, so set up app state by hand
+    app.state.graph = server.Graph()
+    app.state.graph.graph = SlowGraph(turn_latency)
+    app.state.graph.ready.set()
+    if mode == "async":
+        app.state.sms_pipeline = server.SmsPipeline.from_env(app.state.graph.get_graph)
+        app.state.sms_pipeline.start()
+
+    sent_at = {}
+    webhook = []
+    end_to_end = []
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=None
+    ) as client:
+
+        async def send(i):
+            sender = f"+1555000{i:04d}"
+            sent_at[sender] = time.monotonic()
+            response = await client.post("/sms", data={"From": sender, "Body": "hi"})
+            elapsed = time.monotonic() - sent_at[sender]
+            webhook.append(elapsed)
+            if mode == "sync" and "<Message>" in response.text:
+                end_to_end.append(elapsed)
+
+        await asyncio.gather(*(send(i) for i in range(messages)))
+
+        if mode == "async":
+            deadline = time.monotonic() + 120
+            while len(standin.received) < messages and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            end_to_end.extend(
+                m["received_at"] - sent_at[m["to"]] for m in standin.received
+            )
+            await app.state.sms_pipeline.stop()
+
+    standin.stop()
+    print(f"\nSMS_MODE={mode}, {messages} messages, {turn_latency}s per turn")
+    print(summarise("webhook", webhook))
+    if end_to_end:
+        print(summarise("end-to-end", end_to_end))
+    print(f"{'delivered':>12}: {len(end_to_end)}/{messages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--turn-latency", type=float, default=2.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    for mode in ("sync", "async"):
+        asyncio.run(run(mode, args.messages, args.turn_latency, args.failure_rate))
+
+
+if __name__ == "__main__":
+    main()
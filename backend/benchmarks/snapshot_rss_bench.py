@@ -0,0 +1,150 @@
+"""
+Memory per server worker with per-process listings vs a shared snapshot.
+
+Generates --rows synthetic listings, builds a snapshot from them, then for
+each backend starts --workers processes that load it, run every filter
+combination and touch all of its pages, as uvicorn workers would over time.
+Reports each worker's RSS, its proportional share of shared pages (PSS) and
+its private memory: the numpy backend keeps a private copy per worker, the
+snapshot backend maps one page-cache copy for all of them. The snapshot
+workers are then swapped to a newly written version without restarting.
+
+Run from the backend directory:
+    python -m benchmarks.snapshot_rss_bench [--rows 2200000] [--workers 4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from typing import Dict
+
+from benchmarks.listing_filters_bench import combinations, criteria_for, sample_listings
+from data.generate_listings import generate_rows, write_sqlite
+
+
+def memory_kib() -> Dict[str, int]:
+    """RSS, PSS and private memory of this process."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def touch(backend) -> None:
+    listings = backend.current() if hasattr(backend, "current") else backend
+    for array in listings.arrays.values():
+        array.sum()
+    for order, values in listings.indexes.values():
+        order.sum()
+        values.sum()
+
+
+def worker(name: str, db_path: str, snapshot_dir: str, queries, conn) -> None:
+    from src.listings import create_listing_backend
+    from src.listings.snapshot import SnapshotListings
+
+    stats = {"started": memory_kib()}
+    backend = SnapshotListings(snapshot_dir) if name == "snapshot" else create_listing_backend(name, db_path)
+    stats["loaded"] = memory_kib()
+    for criteria in queries:
+        backend.search(criteria, 20)
+    if name != "sqlite":
+        touch(backend)
+    stats["warm"] = memory_kib()
+    conn.send(stats)
+
+    # Stay alive so every worker is measured while the others hold their data
+    while conn.recv() == "swap":
+        start = time.monotonic()
+        backend.refresh()
+        for criteria in queries:
+            backend.search(criteria, 20)
+        touch(backend)
+        conn.send({"swap_s": time.monotonic() - start, "version": backend.version, "swapped": memory_kib()})
+
+
+def run_backend(name: str, args, db_path: str, snapshot_dir: str, queries):
+    context = multiprocessing.get_context("spawn")
+    pipes, processes = [], []
+    for _ in range(args.workers):
+        parent, child = context.Pipe()
+        process = context.Process(target=worker, args=(name, db_path, snapshot_dir, queries, child))
+        process.start()
+        pipes.append(parent)
+        processes.append(process)
+    stats = [pipe.recv() for pipe in pipes]
+
+    def report(stage: str, samples):
+        rss = statistics.mean(s["rss"] for s in samples) / 1024
+        pss = statistics.mean(s["pss"] for s in samples) / 1024
+        private = statistics.mean(s["private"] for s in samples) / 1024
+        total = sum(s["pss"] for s in samples) / 1024
+        print(
+            f"  {stage:<8} per worker: rss {rss:7.1f}MiB  pss {pss:7.1f}MiB  private {private:7.1f}MiB"
+            f"   all workers (pss): {total:7.1f}MiB"
+        )
+
+    print(f"{name} x{args.workers}")
+    for stage in ("started", "loaded", "warm"):
+        report(stage, [s[stage] for s in stats])
+
+    if name == "snapshot":
+        from src.listings.numpy_backend import NumpyListings
+        from src.listings.snapshot import write_snapshot
+
+        # A new ingest: a different dataset written as the next version
+        write_sqlite(generate_rows(args.rows, args.seed + 1), db_path + ".next")
+        write_snapshot(NumpyListings.from_sqlite(db_path + ".next"), snapshot_dir)
+        for pipe in pipes:
+            pipe.send("swap")
+        swaps = [pipe.recv() for pipe in pipes]
+        versions = {s["version"] for s in swaps}
+        print(
+            f"  swapped to {', '.join(versions)} in"
+            f" {statistics.mean(s['swap_s'] for s in swaps) * 1000:.1f}ms per worker (map, query, touch)"
+        )
+        report("swapped", [s["swapped"] for s in swaps])
+
+    for pipe in pipes:
+        pipe.send("stop")
+    for process in processes:
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2200000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "numpy", "snapshot"])
+    parser.add_argument("--queries", type=int, default=5, help="queries per filter combination")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from src.listings.snapshot import build_snapshot
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "listings.db")
+    snapshot_dir = os.path.join(workdir, "snapshots")
+    start = time.monotonic()
+    write_sqlite(generate_rows(args.rows, args.seed), db_path)
+    build_snapshot(db_path, snapshot_dir)
+    print(f"{args.rows:,} listings and snapshot written in {time.monotonic() - start:.1f}s\n")
+
+    listings = sample_listings(db_path, args.queries, args.seed)
+    queries = [criteria_for(listing, c) for c in combinations() for listing in listings]
+    for name in args.backends:
+        run_backend(name, args, db_path, snapshot_dir, queries)
+
+
+if __name__ == "__main__":
+    main()
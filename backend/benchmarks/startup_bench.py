@@ -0,0 +1,161 @@
+"""
+Cold start benchmark for the server.
+
+Measures two things and appends them to benchmarks/results/startup.jsonl so
+they can be compared across commits:
+
+1. `python -X importtime` for `app-retell.server`, summarised as the total
+   import time and the slowest top-level packages.
+2. Time-to-first-request: how long from launching uvicorn until `/ready`
+   answers 200 (graph compiled) and until `/` answers at all.
+
+Run from the backend directory:
+    python -m benchmarks.startup_bench [--runs 5] [--port 8765]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RESULTS_PATH = os.path.join(BACKEND_DIR, "benchmarks", "results", "startup.jsonl")
+SERVER_MODULE = "app-retell.server"
+
+
+def measure_import_time(top_n: int = 15) -> dict:
+    """Run `python -X importtime` on the server module and summarise it."""
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import importlib; importlib.import_module({SERVER_MODULE!r})",
+        ],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {SERVER_MODULE} failed:\n{proc.stderr[-2000:]}")
+
+    # Lines look like: "import time:   self [us] | cumulative | imported package"
+    by_package = defaultdict(int)
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _cumulative_us, name = line[len("import time:") :].split("|", 2)
+        self_us = int(self_us)
+        total_us += self_us
+        by_package[name.strip().split(".")[0]] += self_us
+
+    slowest = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top_n]
+    return {
+        "import_total_ms": round(total_us / 1000, 1),
+        "import_top_packages_ms": {name: round(us / 1000, 1) for name, us in slowest},
+    }
+
+
+def _wait_for(url: str, deadline: float, expect_status: int | None = None) -> float | None:
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if expect_status is None or resp.status == expect_status:
+                    return time.monotonic()
+        except urllib.error.HTTPError:
+            if expect_status is None:
+                return time.monotonic()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_time_to_first_request(port: int, timeout: float = 120.0) -> dict:
+    """Launch uvicorn and time until the first request and readiness succeed."""
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            f"{SERVER_MODULE}:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        first = _wait_for(f"http://127.0.0.1:{port}/", deadline)
+        ready = _wait_for(f"http://127.0.0.1:{port}/ready", deadline, expect_status=200)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    def ms(t):
+        return round((t - start) * 1000, 1) if t is not None else None
+
+    return {"first_request_ms": ms(first), "ready_ms": ms(ready)}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    imports = [measure_import_time() for _ in range(args.runs)]
+    starts = [measure_time_to_first_request(args.port) for _ in range(args.runs)]
+
+    def median(values):
+        values = [v for v in values if v is not None]
+        return round(statistics.median(values), 1) if values else None
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import_total_ms": median(r["import_total_ms"] for r in imports),
+        "import_top_packages_ms": imports[-1]["import_top_packages_ms"],
+        "first_request_ms": median(r["first_request_ms"] for r in starts),
+        "ready_ms": median(r["ready_ms"] for r in starts),
+    }
+
+    print(json.dumps(result, indent=2))
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
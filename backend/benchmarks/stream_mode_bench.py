@@ -0,0 +1,105 @@
+"""
+Per-turn streaming overhead of stream_mode="values" vs stream_mode="updates".
+
+Builds a graph with the app's `State` and checkpointer but a trivial node in
+place of the LLM, seeds a thread with N prior messages, then times one turn
+under each stream mode. What's left is the cost LangGraph pays to hand the
+state back to `message_handler` after every step.
+
+Run from the backend directory:
+    python -m benchmarks.stream_mode_bench [--turns 200]
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.graph import StateGraph
+
+from src.util.state import State
+
+HISTORY_SIZES = [10, 50, 200]
+# Roughly the number of steps in a search turn:
+# main_agent -> search_criteria_agent -> query_database -> main_agent
+STEPS_PER_TURN = 4
+
+
+def build_graph():
+    builder = StateGraph(State)
+    for i in range(STEPS_PER_TURN):
+        builder.add_node(
+            f"step_{i}",
+            lambda state, i=i: {"messages": [AIMessage(content=f"step {i} reply")]},
+        )
+        if i:
+            builder.add_edge(f"step_{i - 1}", f"step_{i}")
+    builder.set_entry_point("step_0")
+    builder.set_finish_point(f"step_{STEPS_PER_TURN - 1}")
+    return builder.compile(checkpointer=SqliteSaver.from_conn_string(":memory:"))
+
+
+def seed_thread(graph, history_size: int) -> dict:
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    history = []
+    for i in range(history_size // 2):
+        history.append(HumanMessage(content=f"question {i} " + "x" * 200))
+        history.append(AIMessage(content=f"answer {i} " + "y" * 400))
+    graph.update_state(config, {"messages": history, "search_criteria": {}})
+    return config
+
+
+def run_values(graph, config):
+    final_content = ""
+    for event in graph.stream(
+        {"messages": [HumanMessage(content="hi")]}, config, stream_mode="values"
+    ):
+        if event.get("messages") and event["messages"][-1].content:
+            final_content = event["messages"][-1].content
+    return final_content
+
+
+def run_updates(graph, config):
+    final_content = ""
+    for event in graph.stream(
+        {"messages": [HumanMessage(content="hi")]}, config, stream_mode="updates"
+    ):
+        for update in event.values():
+            if isinstance(update, dict) and update.get("messages"):
+                messages = update["messages"]
+                message = messages[-1] if isinstance(messages, list) else messages
+                if message.content:
+                    final_content = message.content
+    return final_content
+
+
+def bench(run, graph, history_size: int, turns: int) -> list[float]:
+    timings = []
+    for _ in range(turns):
+        # A fresh thread per turn keeps the history size fixed
+        config = seed_thread(graph, history_size)
+        start = time.perf_counter()
+        run(graph, config)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    graph = build_graph()
+    print(f"{'history':>8} {'mode':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for history_size in HISTORY_SIZES:
+        for name, run in (("values", run_values), ("updates", run_updates)):
+            timings = sorted(bench(run, graph, history_size, args.turns))
+            p50 = statistics.median(timings)
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{history_size:>8} {name:>8} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
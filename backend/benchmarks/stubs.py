@@ -0,0 +1,130 @@
+"""
+Offline stand-ins for the listing database and Google Calendar.
+
+`create_listings_db` writes a small `real_estate` table in the schema
+csv_to_sql.py produces; point the app at it with LISTINGS_DB_PATH.
+`StubCalendarService` answers the Calendar API calls the appointment tools
+make, from memory; install it with appointment_tools.set_calendar_service.
+"""
+
+import itertools
+import sqlite3
+import threading
+from typing import Any, Callable, Dict
+
+CITIES = [
+    ("Austin", "Texas", "78701"),
+    ("Chicago", "Illinois", "60601"),
+    ("New York", "New York", "10001"),
+    ("Seattle", "Washington", "98101"),
+]
+
+
+def create_listings_db(path: str, rows: int = 500) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS real_estate "
+        "(price REAL, bed INT, bath INT, city TEXT, state TEXT, zip_code TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO real_estate VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (350000 + i * 1000, 2 + i % 3, 1 + i % 2, *CITIES[i % len(CITIES)])
+            for i in range(rows)
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+class _Request:
+    def __init__(self, run: Callable[[], Any]):
+        self.run = run
+
+    def execute(self) -> Any:
+        return self.run()
+
+
+class _Events:
+    def __init__(self, calendar: "StubCalendarService"):
+        self.calendar = calendar
+
+    def insert(self, calendarId: str, body: Dict, **kwargs) -> _Request:
+        def run():
+            event = {**body, "id": f"evt{next(self.calendar.ids)}", "status": "confirmed"}
+            with self.calendar.lock:
+                self.calendar.events_by_id[event["id"]] = event
+            return event
+
+        return _Request(run)
+
+    def list(self, calendarId: str, timeMin: str = "", timeMax: str = "", **kwargs) -> _Request:
+        def run():
+            with self.calendar.lock:
+                events = list(self.calendar.events_by_id.values())
+            start = lambda e: e.get("start", {}).get("dateTime", "")
+            items = [e for e in events if (not timeMin or start(e) >= timeMin) and (not timeMax or start(e) < timeMax)]
+            return {"items": sorted(items, key=start)}
+
+        return _Request(run)
+
+    def get(self, calendarId: str, eventId: str, **kwargs) -> _Request:
+        return _Request(lambda: dict(self.calendar.events_by_id[eventId]))
+
+    def update(self, calendarId: str, eventId: str, body: Dict, **kwargs) -> _Request:
+        def run():
+            with self.calendar.lock:
+                self.calendar.events_by_id[eventId] = {**body, "id": eventId}
+            return self.calendar.events_by_id[eventId]
+
+        return _Request(run)
+
+    def delete(self, calendarId: str, eventId: str, **kwargs) -> _Request:
+        def run():
+            with self.calendar.lock:
+                self.calendar.events_by_id.pop(eventId, None)
+            return ""
+
+        return _Request(run)
+
+
+class StubCalendarService:
+    """In-memory calendar with the slice of the Calendar API the tools use."""
+
+    def __init__(self):
+        self.events_by_id: Dict[str, Dict] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def events(self) -> _Events:
+        return _Events(self)
+
+    def calendarList(self):
+        class _CalendarList:
+            def list(self) -> _Request:
+                return _Request(lambda: {"items": [{"id": "primary", "summary": "Stub"}]})
+
+        return _CalendarList()
+
+    def freebusy(self):
+        service = self
+
+        class _FreeBusy:
+            def query(self, body: Dict) -> _Request:
+                def run():
+                    busy = [
+                        {"start": e["start"].get("dateTime"), "end": e["end"].get("dateTime")}
+                        for e in service.events().list("primary", body["timeMin"], body["timeMax"]).execute()["items"]
+                    ]
+                    return {"calendars": {item["id"]: {"busy": busy} for item in body["items"]}}
+
+                return _Request(run)
+
+        return _FreeBusy()
+
+    def settings(self):
+        class _Settings:
+            def get(self, setting: str) -> _Request:
+                return _Request(lambda: {"value": "America/New_York"})
+
+        return _Settings()
@@ -0,0 +1,72 @@
+"""
+Local stand-in for the Twilio Messages REST API.
+
+Accepts `POST /2010-04-01/Accounts/<sid>/Messages.json` like Twilio does and
+records each message with the time it arrived. A failure rate can be set to
+exercise the outbound retry path.
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class TwilioStandIn:
+    def __init__(self, port: int = 0, failure_rate: float = 0.0):
+        self.failure_rate = failure_rate
+        self.received = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                if not self.path.endswith("/Messages.json"):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if random.random() < standin.failure_rate:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                message = {
+                    "to": form.get("To", [""])[0],
+                    "from": form.get("From", [""])[0],
+                    "body": form.get("Body", [""])[0],
+                    "received_at": time.monotonic(),
+                }
+                with standin.lock:
+                    standin.received.append(message)
+
+                body = json.dumps({"sid": f"SM{len(standin.received)}", "status": "queued"})
+                self.send_response(201)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "TwilioStandIn":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,116 @@
+"""
+Search latency for popular markets, cold backend vs warm cache.
+
+Generates --rows synthetic listings and a pool of --markets search keys, a
+city and state with or without a minimum number of bedrooms, taken from
+random listings. Searches pick keys with Zipf-like popularity: --log-searches
+of them fill a query log, the warm cache is built from it for each of --keys,
+and --searches more, from the same distribution, run on the plain backend
+(cold) and through the cache (warm, falling back to the backend on a miss).
+Reports build time and size, hit rate and latency, and checks both return
+the same listings.
+
+Run from the backend directory:
+    python -m benchmarks.warm_cache_bench [--rows 2200000] [--markets 2000]
+        [--searches 5000] [--keys 64 256 1024] [--backends sqlite numpy]
+"""
+
+import argparse
+import os
+import pickle
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.listing_filters_bench import sample_listings
+from benchmarks.shard_bench import percentile
+from data.generate_listings import generate_rows, write_sqlite
+from src.listings import create_listing_backend
+from src.listings.warm_cache import QueryLog, WarmCache, cache_key, key_criteria
+
+
+def search_stream(markets: List[Dict], count: int, skew: float, seed: int) -> List[Dict]:
+    """`count` searches over `markets`, the i-th most popular chosen in proportion to 1 / i^skew."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** skew for rank in range(len(markets))]
+    return rng.choices(markets, weights, k=count)
+
+
+def ms(values: List[float]) -> str:
+    return f"{statistics.median(values) * 1000:.3f} / {percentile(values, 0.95) * 1000:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=2200000)
+    parser.add_argument("--markets", type=int, default=2000, help="distinct search keys")
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--log-searches", type=int, default=20000, help="searches in the query log")
+    parser.add_argument("--searches", type=int, default=5000, help="searches timed")
+    parser.add_argument("--keys", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "numpy"])
+    parser.add_argument("--limit", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "listings.db")
+        write_sqlite(generate_rows(args.rows, args.seed), db_path)
+
+        rng = random.Random(args.seed)
+        keys = set()
+        for listing in sample_listings(db_path, args.markets * 2, args.seed):
+            bed = rng.choice([0, 0, 0, 2, 3, 4])
+            keys.add((listing["state"], listing["city"], bed))
+        markets = [key_criteria(key) for key in sorted(keys)]
+        rng.shuffle(markets)
+        markets = markets[: args.markets]
+
+        query_log = QueryLog(os.path.join(workdir, "query_log.db"))
+        for criteria in search_stream(markets, args.log_searches, args.skew, args.seed + 1):
+            query_log.record(cache_key(criteria))
+        query_log.flush()
+        searches = search_stream(markets, args.searches, args.skew, args.seed + 2)
+        print(f"{args.rows:,} listings, {len(markets):,} markets, {args.searches:,} searches (p50 / p95 ms)")
+
+        for name in args.backends:
+            backend = create_listing_backend(name, db_path)
+            for criteria in searches[:200]:  # warm the page cache
+                backend.search(criteria, args.limit)
+            cold = []
+            expected = []
+            for criteria in searches:
+                start = time.perf_counter()
+                expected.append(backend.search(criteria, args.limit))
+                cold.append(time.perf_counter() - start)
+            print(f"\n{name}, cold: {ms(cold)}")
+            print(f"{'keys':>6}{'build s':>9}{'size MiB':>10}{'hit rate':>10}{'warm':>18}{'hits':>18}{'misses':>18}")
+
+            for count in args.keys:
+                cache = WarmCache(lambda: backend, QueryLog(query_log.path), db_path, keys=count)
+                start = time.monotonic()
+                cache.refresh()
+                built = time.monotonic() - start
+                size = len(pickle.dumps(cache.entries)) / 2**20
+
+                hits, misses, warm = [], [], []
+                mismatches = 0
+                for criteria, want in zip(searches, expected):
+                    start = time.perf_counter()
+                    cached = cache.lookup(criteria, args.limit)
+                    results = backend.search(criteria, args.limit) if cached is None else cached[0]
+                    elapsed = time.perf_counter() - start
+                    warm.append(elapsed)
+                    (misses if cached is None else hits).append(elapsed)
+                    mismatches += results != want
+                print(
+                    f"{count:>6}{built:>9.2f}{size:>10.2f}{len(hits) / len(searches):>10.1%}{ms(warm):>18}"
+                    f"{ms(hits) if hits else '-':>18}{ms(misses) if misses else '-':>18}"
+                    + (f"  ({mismatches} searches differ)" if mismatches else "")
+                )
+
+
+if __name__ == "__main__":
+    main()
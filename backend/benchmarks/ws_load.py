@@ -0,0 +1,254 @@
+"""
+Load generator for the voice and web chat websockets.
+
+Starts the app in a uvicorn subprocess, pointed at a fake OpenAI server and
+a temporary listings database, then opens N simulated Retell calls on
+/retell-llm-websocket/{call_id} and M browser widgets on
+/ws/{website_id}/{thread_id}. Calls send call_details, then ping_pong every
+couple of seconds, update_only frames while the caller speaks, and a
+response_required frame per turn; widgets send a message per turn.
+
+Reports completed turns per second, ping_pong round trips, turn latency
+percentiles per channel and the server's memory per open connection.
+
+Run from the backend directory:
+    python -m benchmarks.ws_load [--calls 50] [--widgets 50] [--seconds 60]
+        [--llm-latency 0.3]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import aiohttp
+
+from benchmarks.fake_llm_server import FakeLlmServer
+from benchmarks.stubs import create_listings_db
+
+# Retell pings about every 2 seconds and streams transcript updates while
+# the caller talks
+PING_INTERVAL = 2.0
+UPDATE_INTERVAL = 0.5
+
+QUESTIONS = [
+    "Do you have any 3 bedroom homes in Austin?",
+    "What about something under 400 thousand?",
+    "Anything with two bathrooms?",
+    "Can you tell me more about the first one?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+
+class Stats:
+    def __init__(self):
+        self.turns: Dict[str, List[float]] = defaultdict(list)
+        self.pings: List[float] = []
+        self.errors = 0
+
+
+async def voice_call(session, base_url: str, call_id: str, stats: Stats, args, stop_at: float):
+    async with session.ws_connect(f"{base_url}/retell-llm-websocket/{call_id}") as ws:
+        pending: Dict[int, float] = {}
+        pings: Dict[int, float] = {}
+
+        async def receive():
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                data = json.loads(msg.data)
+                if data.get("response_type") == "ping_pong":
+                    sent = pings.pop(data.get("timestamp"), None)
+                    if sent is not None:
+                        stats.pings.append(time.monotonic() - sent)
+                elif data.get("content_complete") and data.get("response_id") in pending:
+                    stats.turns["voice"].append(time.monotonic() - pending.pop(data["response_id"]))
+
+        async def ping():
+            while time.monotonic() < stop_at:
+                timestamp = int(time.time() * 1000)
+                pings[timestamp] = time.monotonic()
+                await ws.send_json({"interaction_type": "ping_pong", "timestamp": timestamp})
+                await asyncio.sleep(PING_INTERVAL)
+
+        receiver = asyncio.create_task(receive())
+        pinger = asyncio.create_task(ping())
+        await ws.send_json({"interaction_type": "call_details", "call": {"call_id": call_id}})
+
+        transcript = [{"role": "agent", "content": "Hey there, how can I help you?"}]
+        response_id = 0
+        await asyncio.sleep(random.uniform(0, args.turn_interval))
+        while time.monotonic() < stop_at:
+            question = QUESTIONS[response_id % len(QUESTIONS)]
+            words = question.split()
+            # The caller speaks: partial transcripts stream in
+            for i in range(1, len(words), max(1, len(words) // 3)):
+                partial = transcript + [{"role": "user", "content": " ".join(words[:i])}]
+                await ws.send_json({"interaction_type": "update_only", "transcript": partial})
+                await asyncio.sleep(UPDATE_INTERVAL)
+            transcript.append({"role": "user", "content": question})
+            response_id += 1
+            pending[response_id] = time.monotonic()
+            await ws.send_json(
+                {
+                    "interaction_type": "response_required",
+                    "response_id": response_id,
+                    "transcript": transcript,
+                }
+            )
+            transcript.append({"role": "agent", "content": "Here's what I found."})
+            await asyncio.sleep(args.turn_interval)
+
+        pinger.cancel()
+        await ws.close()
+        receiver.cancel()
+        stats.errors += len(pending)
+
+
+async def widget(session, base_url: str, thread_id: str, stats: Stats, args, stop_at: float):
+    async with session.ws_connect(f"{base_url}/ws/bench-site/{thread_id}") as ws:
+        await asyncio.sleep(random.uniform(0, args.turn_interval))
+        turn = 0
+        while time.monotonic() < stop_at:
+            start = time.monotonic()
+            await ws.send_json({"content": QUESTIONS[turn % len(QUESTIONS)]})
+            turn += 1
+            try:
+                msg = await ws.receive(timeout=args.turn_timeout)
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    stats.turns["web"].append(time.monotonic() - start)
+                else:
+                    stats.errors += 1
+                    return
+            except asyncio.TimeoutError:
+                stats.errors += 1
+            await asyncio.sleep(args.turn_interval)
+
+
+async def run_load(base_url: str, server_pid: int, args) -> None:
+    stats = Stats()
+    baseline_rss = rss_kib(server_pid)
+    stop_at = time.monotonic() + args.seconds
+    start = time.monotonic()
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        clients = [
+            voice_call(session, base_url, f"call_{i}", stats, args, stop_at)
+            for i in range(args.calls)
+        ] + [
+            widget(session, base_url, f"thread_{i}", stats, args, stop_at)
+            for i in range(args.widgets)
+        ]
+        tasks = [asyncio.create_task(c) for c in clients]
+
+        # Sample memory once every connection is open and has had a turn
+        await asyncio.sleep(min(args.seconds / 2, args.turn_interval * 2))
+        loaded_rss = rss_kib(server_pid)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        stats.errors += sum(isinstance(r, Exception) for r in results)
+
+    elapsed = time.monotonic() - start
+    connections = args.calls + args.widgets
+    completed = sum(len(t) for t in stats.turns.values())
+    print(f"{args.calls} calls + {args.widgets} widgets for {args.seconds:.0f}s, LLM {args.llm_latency}s per call")
+    print(f"  throughput: {completed / elapsed:.1f} turns/s ({completed} turns, {stats.errors} errors)")
+    print(
+        f"  ping_pong rtt: p50 {percentile(stats.pings, 0.5) * 1000:.1f}ms"
+        f"  p99 {percentile(stats.pings, 0.99) * 1000:.1f}ms"
+    )
+    for channel, latencies in sorted(stats.turns.items()):
+        print(
+            f"  {channel} turn latency: p50 {statistics.median(latencies):.2f}s"
+            f"  p95 {percentile(latencies, 0.95):.2f}s  p99 {percentile(latencies, 0.99):.2f}s"
+        )
+    if connections:
+        print(
+            f"  server rss: {baseline_rss / 1024:.0f}MiB idle, {loaded_rss / 1024:.0f}MiB loaded,"
+            f" {(loaded_rss - baseline_rss) / connections:.0f}KiB per connection"
+        )
+
+
+async def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base_url}/ready") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--widgets", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--turn-interval", type=float, default=6.0, help="seconds between a client's turns")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    fake = FakeLlmServer({}, default_latency=args.llm_latency).start()
+    db_path = os.path.join(tempfile.mkdtemp(), "listings.db")
+    create_listings_db(db_path)
+
+    port = free_port()
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": fake.base_url,
+        "OPENAI_API_KEY": "sk-bench",
+        "LISTINGS_DB_PATH": db_path,
+        "QUERY_LOG_PATH": os.path.join(os.path.dirname(db_path), "query_log.db"),
+        # The load generator measures the app, not the OpenAI rate limits
+        "LLM_RPM": "100000",
+        "LLM_TPM": "100000000",
+        "LOG_LEVEL": "WARNING",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app-retell.server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_ready(base_url))
+        asyncio.run(run_load(base_url.replace("http", "ws"), server.pid, args))
+    finally:
+        server.terminate()
+        server.wait()
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
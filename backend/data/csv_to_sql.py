@@ -1,16 +1,44 @@
+import argparse
 import os
+import sys
+import uuid
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
 
 # Get the current directory of the script
 current_directory = os.path.dirname(os.path.abspath(__file__))
 
+# The snapshot, Parquet and shard writers live in the backend's src package
+sys.path.insert(0, os.path.dirname(current_directory))
+from src.listings import LOAD_TABLE  # noqa: E402
+from src.listings.geo import has_zip_centroids, load_zip_centroids, refresh_city_centroids  # noqa: E402
+from src.listings.saved_searches import SAVED_SEARCHES_PATH, notify_saved_searches  # noqa: E402
+from src.listings.similar import SimilarityIndex  # noqa: E402
+from src.listings.snapshot import build_snapshot  # noqa: E402
+
+parser = argparse.ArgumentParser(description="Load realtor-data.csv into the listings database.")
+parser.add_argument(
+    "--parquet",
+    action="store_true",
+    help="also write Parquet partitioned by state, for LISTINGS_BACKEND=duckdb (needs duckdb and pyarrow)",
+)
+parser.add_argument(
+    "--shards", action="store_true", help="also write one database per state, for LISTINGS_BACKEND=sharded"
+)
+parser.add_argument(
+    "--zips", help="CSV of zip_code, latitude and longitude to load for radius search (near_zip, radius_miles)"
+)
+args = parser.parse_args()
+
 # Relative path to your CSV file
 csv_file_path = os.path.join(current_directory, "realtor-data.csv")
 
 # Adjust the data types as needed
 data = pd.read_csv(csv_file_path)
-data["prev_sold_date"] = pd.to_datetime(data["prev_sold_date"], errors="coerce")
+# Dates as ISO strings, which sort and compare like the dates they are
+data["prev_sold_date"] = pd.to_datetime(data["prev_sold_date"], errors="coerce").dt.strftime("%Y-%m-%d")
+data["zip_code"] = data["zip_code"].map(lambda zip_code: f"{int(zip_code):05d}", na_action="ignore")
+data["price_per_sqft"] = (data["price"] / data["house_size"].where(data["house_size"] > 0)).round(2)
 
 # Relative path to the SQLite database file
 sqlite_db_path = os.path.join(current_directory, "real_estate_data.db")
@@ -20,21 +48,90 @@ engine = create_engine(f"sqlite:///{sqlite_db_path}", echo=False)
 
 # SQL Table Creation (excluding certain columns)
 sql_create_table = """
-CREATE TABLE IF NOT EXISTS real_estate (
+CREATE TABLE real_estate (
     price DECIMAL(15, 2),
     bed INT,
     bath INT,
     city VARCHAR(100),
     state CHAR(2),
-    zip_code VARCHAR(10)
+    zip_code VARCHAR(10),
+    house_size INT,
+    acre_lot REAL,
+    status VARCHAR(16),
+    street INT,
+    prev_sold_date DATE,
+    price_per_sqft REAL
 );
 """
-with engine.connect() as connection:
+# Indexes for the equality filters, whose matches stay in rowid order, so
+# `ORDER BY rowid LIMIT n` stops at the first n, and for the zip codes of a
+# radius search, which are few listings each. Price, size, status and
+# sale date filters match too large a share of listings for an index to beat
+# a scan that stops early (benchmarks/listing_schema_bench.py).
+sql_create_indexes = [
+    "CREATE INDEX real_estate_state ON real_estate (state)",
+    "CREATE INDEX real_estate_city ON real_estate (city)",
+    "CREATE INDEX real_estate_zip_code ON real_estate (zip_code)",
+]
+# The previous load, to alert saved searches to the listings that are new or changed
+previous = None
+if os.path.exists(SAVED_SEARCHES_PATH) and inspect(engine).has_table("real_estate"):
+    previous = pd.read_sql("SELECT * FROM real_estate", engine)
+
+# A new load id with the new table, so an index of the old rowids is refused
+with engine.begin() as connection:
+    connection.execute(text("DROP TABLE IF EXISTS real_estate"))
     connection.execute(text(sql_create_table))
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {LOAD_TABLE} (load_id TEXT)"))
+    connection.execute(text(f"DELETE FROM {LOAD_TABLE}"))
+    connection.execute(text(f"INSERT INTO {LOAD_TABLE} VALUES (:load_id)"), {"load_id": uuid.uuid4().hex})
 
 # Insert data into SQL table (only with the included columns)
-included_columns = ["price", "bed", "bath", "city", "state", "zip_code"]
+included_columns = [
+    "price", "bed", "bath", "city", "state", "zip_code",
+    "house_size", "acre_lot", "status", "street", "prev_sold_date", "price_per_sqft",
+]
 data_included = data[included_columns]
-data_included.to_sql("real_estate", engine, if_exists="replace", index=False)
+data_included.to_sql("real_estate", engine, if_exists="append", index=False, chunksize=100000)
+
+# Indexes after the bulk insert, then statistics for the query planner
+with engine.begin() as connection:
+    for statement in sql_create_indexes:
+        connection.execute(text(statement))
+    connection.execute(text("ANALYZE"))
 
 print("Data inserted successfully.")
+
+if previous is not None:
+    current = pd.read_sql("SELECT * FROM real_estate", engine)
+    # Compared on the columns both loads have, in case the schema changed
+    compared = [column for column in current.columns if column in previous.columns]
+    merged = current.merge(previous[compared].drop_duplicates(), how="left", on=compared, indicator=True)
+    changed = current[(merged["_merge"] == "left_only").to_numpy()]
+    listings = changed.astype(object).where(changed.notna(), None).to_dict("records")
+    print(f"{notify_saved_searches(listings, sqlite_db_path)} saved-search alerts queued for {len(listings)} new or changed listings")
+    del previous, current, merged, changed
+
+# Centroids from an earlier --zips outlive the listings; the city centroids
+# and the similarity index are built from the listings, so rebuild both
+if args.zips:
+    print(f"{load_zip_centroids(args.zips, sqlite_db_path)} zip centroids loaded")
+elif has_zip_centroids(sqlite_db_path):
+    print(f"{refresh_city_centroids(sqlite_db_path)} city centroids recomputed")
+if args.zips or has_zip_centroids(sqlite_db_path):
+    # Needs the centroids for each listing's location
+    print(f"Similarity index written to {SimilarityIndex.build(sqlite_db_path).save()}")
+
+# Memory-mapped copy for LISTINGS_BACKEND=snapshot; running servers swap to it
+snapshot_path = build_snapshot(sqlite_db_path)
+print(f"Snapshot written to {snapshot_path}")
+
+if args.parquet:
+    from src.listings.duckdb_backend import write_parquet
+
+    print(f"Parquet written to {write_parquet(sqlite_db_path)}")
+
+if args.shards:
+    from src.listings.sharded_backend import write_shards
+
+    print(f"Shards written to {write_shards(sqlite_db_path)}")
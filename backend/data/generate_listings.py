@@ -0,0 +1,294 @@
+"""
+Generate synthetic listings for load testing the listing search.
+
+Produces rows shaped like the Kaggle realtor dataset: a few dozen metros
+take most of the listings (Zipf-distributed popularity) and the rest spread
+over small towns in every state. House size drives bedrooms and bathrooms,
+and price follows size and the metro's price level, so range filters on
+price, bed and bath select realistic, correlated slices.
+
+Writes a SQLite `real_estate` table in the schema csv_to_sql.py creates,
+and optionally a CSV in the realtor-data.csv layout and a centroid for each
+zip code, for radius search (load it with `python -m src.listings.geo`).
+
+Usage (from the backend directory):
+    python data/generate_listings.py --rows 1000000 --db data/synthetic.db
+        [--csv data/synthetic-realtor-data.csv] [--zips data/synthetic-zips.csv] [--seed 0]
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Iterator, List, Tuple
+
+# (city, state, first zip code, median price, latitude, longitude)
+METROS = [
+    ("New York", "New York", 10001, 780000, 40.7506, -73.9972),
+    ("Los Angeles", "California", 90001, 950000, 34.0522, -118.2437),
+    ("Chicago", "Illinois", 60601, 340000, 41.8858, -87.6181),
+    ("Houston", "Texas", 77001, 310000, 29.7604, -95.3698),
+    ("Phoenix", "Arizona", 85001, 430000, 33.4484, -112.0740),
+    ("Philadelphia", "Pennsylvania", 19102, 280000, 39.9526, -75.1652),
+    ("San Antonio", "Texas", 78201, 290000, 29.4241, -98.4936),
+    ("San Diego", "California", 92101, 890000, 32.7157, -117.1611),
+    ("Dallas", "Texas", 75201, 390000, 32.7767, -96.7970),
+    ("Austin", "Texas", 78701, 550000, 30.2672, -97.7431),
+    ("Jacksonville", "Florida", 32202, 320000, 30.3322, -81.6557),
+    ("Columbus", "Ohio", 43215, 260000, 39.9612, -82.9988),
+    ("Charlotte", "North Carolina", 28202, 400000, 35.2271, -80.8431),
+    ("Indianapolis", "Indiana", 46204, 240000, 39.7684, -86.1581),
+    ("Seattle", "Washington", 98101, 860000, 47.6062, -122.3321),
+    ("Denver", "Colorado", 80202, 590000, 39.7392, -104.9903),
+    ("Boston", "Massachusetts", 2108, 820000, 42.3601, -71.0589),
+    ("Nashville", "Tennessee", 37201, 450000, 36.1627, -86.7816),
+    ("Portland", "Oregon", 97201, 530000, 45.5152, -122.6784),
+    ("Las Vegas", "Nevada", 89101, 420000, 36.1699, -115.1398),
+    ("Detroit", "Michigan", 48201, 90000, 42.3314, -83.0458),
+    ("Atlanta", "Georgia", 30303, 410000, 33.7490, -84.3880),
+    ("Miami", "Florida", 33101, 620000, 25.7617, -80.1918),
+    ("Minneapolis", "Minnesota", 55401, 320000, 44.9778, -93.2650),
+    ("Tampa", "Florida", 33602, 420000, 27.9506, -82.4572),
+    ("Orlando", "Florida", 32801, 390000, 28.5383, -81.3792),
+    ("Raleigh", "North Carolina", 27601, 440000, 35.7796, -78.6382),
+    ("Salt Lake City", "Utah", 84101, 540000, 40.7608, -111.8910),
+    ("Kansas City", "Missouri", 64105, 230000, 39.0997, -94.5786),
+    ("Baltimore", "Maryland", 21201, 210000, 39.2904, -76.6122),
+    ("Milwaukee", "Wisconsin", 53202, 200000, 43.0389, -87.9065),
+    ("Albuquerque", "New Mexico", 87102, 320000, 35.0844, -106.6504),
+    ("New Orleans", "Louisiana", 70112, 260000, 29.9511, -90.0715),
+    ("Louisville", "Kentucky", 40202, 240000, 38.2527, -85.7585),
+    ("Oklahoma City", "Oklahoma", 73102, 220000, 35.4676, -97.5164),
+    ("Birmingham", "Alabama", 35203, 160000, 33.5186, -86.8104),
+    ("Omaha", "Nebraska", 68102, 260000, 41.2565, -95.9345),
+    ("Boise", "Idaho", 83702, 500000, 43.6150, -116.2023),
+    ("Honolulu", "Hawaii", 96813, 1050000, 21.3069, -157.8583),
+    ("Anchorage", "Alaska", 99501, 370000, 61.2181, -149.9003),
+]
+
+# (state, first zip code, median price, latitude, longitude) for small towns
+STATES = [
+    ("Alabama", 35004, 190000, 32.8, -86.8), ("Alaska", 99501, 330000, 61.4, -152.3),
+    ("Arizona", 85001, 380000, 34.2, -111.7), ("Arkansas", 71601, 170000, 34.9, -92.4),
+    ("California", 90001, 720000, 36.8, -119.4), ("Colorado", 80001, 520000, 39.0, -105.5),
+    ("Connecticut", 6001, 360000, 41.6, -72.7), ("Delaware", 19701, 340000, 39.0, -75.5),
+    ("Florida", 32003, 380000, 27.8, -81.7), ("Georgia", 30002, 300000, 32.7, -83.4),
+    ("Hawaii", 96701, 820000, 20.8, -156.3), ("Idaho", 83201, 420000, 44.1, -114.7),
+    ("Illinois", 60001, 240000, 40.0, -89.2), ("Indiana", 46001, 210000, 39.9, -86.3),
+    ("Iowa", 50001, 200000, 42.0, -93.5), ("Kansas", 66002, 200000, 38.5, -98.4),
+    ("Kentucky", 40003, 190000, 37.5, -85.3), ("Louisiana", 70001, 200000, 31.0, -92.0),
+    ("Maine", 3901, 340000, 45.4, -69.2), ("Maryland", 20601, 380000, 39.0, -76.8),
+    ("Massachusetts", 1001, 540000, 42.3, -71.8), ("Michigan", 48001, 220000, 44.3, -85.4),
+    ("Minnesota", 55001, 300000, 46.3, -94.3), ("Mississippi", 38601, 160000, 32.7, -89.7),
+    ("Missouri", 63001, 220000, 38.4, -92.5), ("Montana", 59001, 420000, 47.0, -109.6),
+    ("Nebraska", 68001, 230000, 41.5, -99.8), ("Nevada", 88901, 410000, 39.3, -116.6),
+    ("New Hampshire", 3031, 420000, 43.7, -71.6), ("New Jersey", 7001, 460000, 40.2, -74.7),
+    ("New Mexico", 87001, 280000, 34.4, -106.1), ("New York", 10501, 380000, 42.9, -75.5),
+    ("North Carolina", 27006, 320000, 35.6, -79.4), ("North Dakota", 58001, 240000, 47.5, -100.5),
+    ("Ohio", 43001, 210000, 40.3, -82.8), ("Oklahoma", 73001, 190000, 35.6, -97.5),
+    ("Oregon", 97001, 470000, 43.9, -120.6), ("Pennsylvania", 15001, 250000, 40.9, -77.8),
+    ("Rhode Island", 2801, 420000, 41.7, -71.5), ("South Carolina", 29001, 290000, 33.9, -80.9),
+    ("South Dakota", 57001, 280000, 44.4, -100.2), ("Tennessee", 37010, 300000, 35.9, -86.4),
+    ("Texas", 75001, 300000, 31.5, -99.3), ("Utah", 84001, 480000, 39.3, -111.7),
+    ("Vermont", 5001, 340000, 44.1, -72.7), ("Virginia", 20101, 370000, 37.5, -78.9),
+    ("Washington", 98001, 560000, 47.4, -120.5), ("West Virginia", 24701, 150000, 38.6, -80.6),
+    ("Wisconsin", 53001, 260000, 44.6, -89.9), ("Wyoming", 82001, 320000, 43.0, -107.6),
+]
+
+TOWN_PREFIXES = ["Oak", "Maple", "Cedar", "Pine", "River", "Lake", "Spring", "Fair", "Green", "Ash",
+                 "Elm", "Stone", "Clear", "Brook", "Mill", "Red", "White", "North", "South", "West"]
+TOWN_SUFFIXES = ["field", "ville", "wood", "dale", "ton", "port", "view", "haven", "ridge", "burg"]
+TOWNS_PER_STATE = 60
+ZIPS_PER_METRO = 40
+
+# Share of listings in the metros above; the rest go to small towns
+METRO_SHARE = 0.6
+STATUSES = [("for_sale", 0.60), ("sold", 0.38), ("ready_to_build", 0.02)]
+COLUMNS = ["brokered_by", "status", "price", "bed", "bath", "acre_lot", "street",
+           "city", "state", "zip_code", "house_size", "prev_sold_date"]
+
+# Same table and indexes csv_to_sql.py creates
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS real_estate (
+    price DECIMAL(15, 2),
+    bed INT,
+    bath INT,
+    city VARCHAR(100),
+    state CHAR(2),
+    zip_code VARCHAR(10),
+    house_size INT,
+    acre_lot REAL,
+    status VARCHAR(16),
+    street INT,
+    prev_sold_date DATE,
+    price_per_sqft REAL
+);
+"""
+CREATE_INDEXES = """
+CREATE INDEX IF NOT EXISTS real_estate_state ON real_estate (state);
+CREATE INDEX IF NOT EXISTS real_estate_city ON real_estate (city);
+CREATE INDEX IF NOT EXISTS real_estate_zip_code ON real_estate (zip_code);
+"""
+
+TABLE_COLUMNS = ["price", "bed", "bath", "city", "state", "zip_code", "house_size", "acre_lot",
+                 "status", "street", "prev_sold_date", "price_per_sqft"]
+
+# (city, state, first zip, zip count, median price, latitude, longitude)
+Place = Tuple[str, str, int, int, float, float, float]
+
+
+def build_places(rng: random.Random) -> Tuple[List[Place], List[float]]:
+    """Every place listings can be in, with its share of the listings."""
+    places: List[Place] = [
+        (city, state, zip0, ZIPS_PER_METRO, price, lat, lon)
+        for city, state, zip0, price, lat, lon in METROS
+    ]
+    # Zipf popularity: the busiest metro gets twice the listings of the second
+    metro_weights = [1 / (rank + 1) for rank in range(len(METROS))]
+    metro_scale = METRO_SHARE / sum(metro_weights)
+    weights = [w * metro_scale for w in metro_weights]
+
+    towns = []
+    for state, zip0, price, lat, lon in STATES:
+        names = rng.sample([p + s for p in TOWN_PREFIXES for s in TOWN_SUFFIXES], TOWNS_PER_STATE)
+        for i, name in enumerate(names):
+            towns.append(
+                (name, state, zip0 + 100 + i * 7, 3, price * rng.lognormvariate(0, 0.25),
+                 lat + rng.uniform(-1.5, 1.5), lon + rng.uniform(-1.5, 1.5))
+            )
+    # Long-tailed, but no town outgrows a mid-sized metro
+    town_weights = [min(rng.paretovariate(1.2), 25.0) for _ in towns]
+    town_scale = (1 - METRO_SHARE) / sum(town_weights)
+    return places + towns, weights + [w * town_scale for w in town_weights]
+
+
+def generate_rows(rows: int, seed: int = 0) -> Iterator[dict]:
+    rng = random.Random(seed)
+    places, weights = build_places(rng)
+    statuses, status_weights = zip(*STATUSES)
+    today = date(2024, 6, 1)
+
+    batch = 10000
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        for place, status in zip(
+            rng.choices(places, weights, k=count), rng.choices(statuses, status_weights, k=count)
+        ):
+            city, state, zip0, zips, median_price, _, _ = place
+            house_size = round(min(12000, max(400, rng.lognormvariate(math.log(1800), 0.4))))
+            bed = min(9, max(1, round(house_size / 650 + rng.gauss(0, 0.7))))
+            bath = min(8, max(1, round(bed * 0.7 + rng.gauss(0, 0.6))))
+            price = median_price * (house_size / 1800) ** 0.9 * rng.lognormvariate(0, 0.3)
+            sold = status == "sold" or rng.random() < 0.5
+            yield {
+                "brokered_by": rng.randrange(1, 110000),
+                "status": status,
+                "price": round(price, -2),
+                "bed": bed,
+                "bath": bath,
+                "acre_lot": round(rng.lognormvariate(math.log(0.2), 1.0), 2),
+                "street": rng.randrange(1, 2000000),
+                "city": city,
+                "state": state,
+                "zip_code": f"{zip0 + rng.randrange(zips):05d}",
+                "house_size": house_size,
+                "prev_sold_date": (today - timedelta(days=rng.randrange(1, 35 * 365))).isoformat()
+                if sold
+                else "",
+            }
+
+
+def zip_centroids(seed: int = 0) -> Iterator[Tuple[str, float, float]]:
+    """(zip code, latitude, longitude) for the zip codes generate_rows uses with `seed`."""
+    places, _ = build_places(random.Random(seed))
+    rng = random.Random(seed + 1)
+    seen = set()
+    for _, _, zip0, zips, _, lat, lon in places:
+        # A metro's zip codes spread over some 15 miles, a town's over one or two
+        spread = 0.2 if zips == ZIPS_PER_METRO else 0.02
+        for zip_code in range(zip0, zip0 + zips):
+            # Town and metro zip codes can collide; the first place keeps it
+            if zip_code not in seen:
+                seen.add(zip_code)
+                yield f"{zip_code:05d}", lat + rng.uniform(-spread, spread), lon + rng.uniform(-spread, spread)
+
+
+def write_zip_centroids(csv_path: str, seed: int = 0) -> int:
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["zip_code", "latitude", "longitude"])
+        count = 0
+        for zip_code, lat, lon in zip_centroids(seed):
+            writer.writerow([zip_code, f"{lat:.5f}", f"{lon:.5f}"])
+            count += 1
+    return count
+
+
+def table_row(row: dict) -> tuple:
+    """A generated listing as a real_estate row, the way csv_to_sql.py stores it."""
+    house_size = row["house_size"] or None
+    return (
+        *(row[column] for column in TABLE_COLUMNS[:-2]),
+        row["prev_sold_date"] or None,
+        round(row["price"] / house_size, 2) if house_size else None,
+    )
+
+
+def write_sqlite(rows: Iterator[dict], db_path: str, indexes: bool = True) -> int:
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE IF EXISTS real_estate")
+    conn.execute(CREATE_TABLE)
+    insert = f"INSERT INTO real_estate VALUES ({', '.join('?' * len(TABLE_COLUMNS))})"
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(table_row(row))
+        if len(batch) == 50000:
+            conn.executemany(insert, batch)
+            count += len(batch)
+            batch = []
+    conn.executemany(insert, batch)
+    count += len(batch)
+    if indexes:
+        conn.executescript(CREATE_INDEXES)
+        conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return count
+
+
+def write_csv(rows: Iterator[dict], csv_path: str) -> Iterator[dict]:
+    """Write rows to `csv_path` as they pass through."""
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--db", required=True, help="SQLite file to write the real_estate table to")
+    parser.add_argument("--csv", help="also write the rows as a realtor-data.csv style file")
+    parser.add_argument("--zips", help="also write each zip code's centroid to this CSV, for radius search")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.monotonic()
+    rows = generate_rows(args.rows, args.seed)
+    if args.csv:
+        rows = write_csv(rows, args.csv)
+    count = write_sqlite(rows, os.path.abspath(args.db))
+    print(f"Wrote {count} listings to {args.db} in {time.monotonic() - start:.1f}s")
+    if args.zips:
+        print(f"Wrote {write_zip_centroids(args.zips, args.seed)} zip centroids to {args.zips}")
+
+
+if __name__ == "__main__":
+    main()
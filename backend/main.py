@@ -1,7 +1,6 @@
 import uuid
 import os
 from dotenv import load_dotenv
-from IPython.display import Image, display
 from langchain_core.messages import ToolMessage, HumanMessage
 
 
@@ -1,6 +1,5 @@
 from datetime import datetime
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.prebuilt import tools_condition
 from typing import Literal
@@ -8,12 +7,9 @@ from typing import Literal
 from src.util.state import State
 from src.util.appointment_tools import safe_tools, sensitive_tools, sensitive_tool_names
 from src.util.general_tools import CompleteOrEscalate
+from src.util.llm import DEFAULT_MODEL, get_chat_model
 
 
-load_dotenv()
-
-llm = ChatOpenAI(model="gpt-4o-mini")
-
 appointment_agent_prompt = ChatPromptTemplate.from_messages(
     [
         (
@@ -31,9 +27,11 @@ appointment_agent_prompt = ChatPromptTemplate.from_messages(
 ).partial(time=datetime.now())
 
 
-appointment_agent_runnable = appointment_agent_prompt | llm.bind_tools(
-    safe_tools + sensitive_tools + [CompleteOrEscalate]
-)
+@lru_cache(maxsize=None)
+def get_appointment_agent_runnable(model: str = DEFAULT_MODEL):
+    return appointment_agent_prompt | get_chat_model(model).bind_tools(
+        safe_tools + sensitive_tools + [CompleteOrEscalate]
+    )
 
 
 
@@ -1,8 +1,19 @@
-import sqlite3
-import os
+import logging
+import time
+from typing import Literal, Optional
 from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableConfig
 
 from src.util.state import State
+from src.util.latency_budget import NODE_MODELS, fits_budget
+from src.listings import DB_PATH, get_listing_backend
+from src.listings.geo import resolve_radius
+from src.listings.refine import RefiningSearch
+from src.listings.sqlite_backend import SqliteListings
+from src.listings.warm_cache import get_warm_cache
+from src.util.metrics import LISTING_SEARCH_SECONDS
+
+logger = logging.getLogger(__name__)
 
 
 def process_criteria(criteria_key, criteria_value, query, params):
@@ -10,54 +21,87 @@ def process_criteria(criteria_key, criteria_value, query, params):
     params.append(criteria_value)
     return (query, params)
 
-def query_database(state: State):
-    search_criteria = state["search_criteria"]
-    # print("search criteria from state", search_criteria)
-
-    db_path = os.path.join(os.path.dirname(__file__), "..", "..", "data", "real_estate_data.db")
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    query = "SELECT * FROM real_estate WHERE 1 = 1"
-    params = []
-
-    # Define valid criteria keys and their corresponding SQL column names
-    valid_criteria = {
-        "city": "city",
-        "state": "state",
-        "min_bedroom": "bed",
-        "min_bathroom": "bath",
-        "max_price": "price",
-        "min_price": "price",
-    }
-
-    for key, value in search_criteria.items():
-        if value is not None:
-            sql_column = valid_criteria.get(key)
-            if sql_column:
-                if key in ["min_bedroom", "min_bathroom"]:
-                    query += f" AND {sql_column} >= ?"
-                elif key in ["max_price", "min_price"]:
-                    operator = "<=" if "max" in key else ">="
-                    query += f" AND {sql_column} {operator} ?"
-                else:
-                    query += f" AND {sql_column} = ?"
-                params.append(value)
-            else:
-                # Handle unexpected criteria keys
-                print(f"Unexpected criteria key: {key}")
-
-    query += " LIMIT 2"
-    
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    column_names = [column[0] for column in cursor.description]
-    results = [dict(zip(column_names, row)) for row in rows]
-
-    cursor.close()
-    conn.close()
-
-    return {"messages": [AIMessage(content=f"Here are the search results: {results}")]}
-
-    return {}
\ No newline at end of file
+def describe_listing(listing: dict) -> str:
+    features = [
+        f"{listing[key]:g} {label}"
+        for key, label in (("bed", "bedroom"), ("bath", "bathroom"))
+        if listing.get(key) is not None
+    ]
+    if listing.get("house_size") is not None:
+        features.append(f"{listing['house_size']:,} square foot")
+    description = f"a {', '.join(features)} home" if features else "a home"
+    description += f" in {listing['city']}, {listing['state']}"
+    if listing.get("price") is not None:
+        verb = "sold for" if listing.get("status") == "sold" else "listed at"
+        description += f" {verb} ${listing['price']:,.0f}"
+    return description
+
+
+def describe_results(results: list) -> str:
+    """Plain-language summary of search results, used instead of an LLM call."""
+    if not results:
+        return "I couldn't find any homes matching that. Want me to widen the search?"
+    descriptions = " and ".join(describe_listing(r) for r in results)
+    return f"I found {descriptions}. Would you like to hear more or book a viewing?"
+
+
+# Each thread's last results, to answer follow-ups that only narrow them
+refining_search = RefiningSearch()
+
+
+def search_listings(
+    search_criteria: dict, limit: int = 2, db_path: Optional[str] = None, thread_id: Optional[str] = None
+) -> list:
+    """
+    Listings matching `search_criteria` (SearchCriteriaObject fields), as
+    dicts. Searches of the most searched markets come from the warm cache;
+    with a `thread_id`, narrower follow-ups filter that thread's previous
+    results.
+    """
+    backend = SqliteListings(db_path) if db_path else get_listing_backend()
+    source = backend.name
+    start = time.monotonic()
+    try:
+        criteria = resolve_radius(search_criteria, db_path or DB_PATH)
+        if not db_path:
+            cached = get_warm_cache().lookup(criteria, limit)
+            if cached is not None:
+                source = "warm_cache"
+                return cached[0]
+        if thread_id is None:
+            return backend.search(criteria, limit)
+        results, outcome = refining_search.search(backend, thread_id, criteria, limit)
+        if outcome == "refined":
+            source = "refined"
+        return results
+    finally:
+        LISTING_SEARCH_SECONDS.observe(time.monotonic() - start, backend=source)
+
+
+def query_database(state: State, config: RunnableConfig):
+    thread_id = config.get("configurable", {}).get("thread_id")
+    results = search_listings(state["search_criteria"], thread_id=thread_id)
+
+    # When even the fast model wouldn't answer in time, skip the main agent's
+    # post-query call and describe the results directly
+    if not fits_budget(config, NODE_MODELS["main_agent"][1]):
+        return {
+            "messages": [
+                AIMessage(
+                    content=describe_results(results),
+                    additional_kwargs={"final_answer": True},
+                )
+            ]
+        }
+
+    content = f"Here are the search results: {results}"
+    summary = get_warm_cache().summary(state["search_criteria"])
+    if summary:
+        content += f" Market summary: {summary}"
+    return {"messages": [AIMessage(content=content)]}
+
+
+def route_after_query(state: State) -> Literal["__end__", "main_agent"]:
+    if state["messages"][-1].additional_kwargs.get("final_answer"):
+        return "__end__"
+    return "main_agent"
\ No newline at end of file
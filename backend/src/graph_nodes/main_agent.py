@@ -1,17 +1,14 @@
 from datetime import datetime
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
-from dotenv import load_dotenv
 from langgraph.prebuilt import tools_condition
 from typing import Literal
 
 from src.util.state import State
 from src.util.prompts import system_prompt, agent_prompt
-from src.util.general_tools import ToSearchAgent, ToAppointmentAgent
+from src.util.general_tools import FindSimilarListings, SaveSearch, ToSearchAgent, ToAppointmentAgent
+from src.util.llm import DEFAULT_MODEL, get_chat_model
 
-load_dotenv()
-
-llm = ChatOpenAI(model="gpt-4o-mini")
 
 main_agent_prompt = ChatPromptTemplate.from_messages(
     [
@@ -20,15 +17,20 @@ main_agent_prompt = ChatPromptTemplate.from_messages(
     ]
 ).partial(time=datetime.now())
 
-main_tools = [ToSearchAgent, ToAppointmentAgent]
+main_tools = [ToSearchAgent, ToAppointmentAgent, FindSimilarListings, SaveSearch]
+
 
-main_agent_runnable = main_agent_prompt | llm.bind_tools(main_tools)
+@lru_cache(maxsize=None)
+def get_main_agent_runnable(model: str = DEFAULT_MODEL):
+    return main_agent_prompt | get_chat_model(model).bind_tools(main_tools)
 
 
 def route_main_agent(state: State) -> Literal[
     "__end__",
     "search_criteria_agent",
-    "appointment_agent"
+    "appointment_agent",
+    "similar_listings",
+    "save_search",
 ]:
     route = tools_condition(state)
     if route == "__end__":
@@ -39,4 +41,8 @@ def route_main_agent(state: State) -> Literal[
             return "search_criteria_agent"
         if tool_calls[0]["name"] == ToAppointmentAgent.__name__:
             return "appointment_agent"
+        if tool_calls[0]["name"] == FindSimilarListings.__name__:
+            return "similar_listings"
+        if tool_calls[0]["name"] == SaveSearch.__name__:
+            return "save_search"
     raise ValueError("Invalid route")
\ No newline at end of file
@@ -0,0 +1,34 @@
+import logging
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from src.listings.saved_searches import get_saved_searches
+from src.util.state import State
+
+logger = logging.getLogger(__name__)
+
+
+def save_search(state: State, config: RunnableConfig):
+    """Answers a SaveSearch call by saving, or deleting, the thread's search criteria."""
+    tool_call = state["messages"][-1].tool_calls[0]
+    thread_id = config.get("configurable", {}).get("thread_id")
+    channel = config.get("configurable", {}).get("channel", "web")
+    criteria = {key: value for key, value in (state.get("search_criteria") or {}).items() if value is not None}
+
+    if thread_id is None:
+        content = "Saved searches aren't available in this conversation."
+    elif tool_call["args"].get("stop"):
+        stopped = get_saved_searches().delete(thread_id)
+        content = "Alerts for the saved search are stopped." if stopped else "There was no saved search to stop."
+    elif channel != "sms":
+        # Alerts go out as texts; web chat and voice have no number to text
+        content = "Alerts for saved searches are only sent by text message; the user can text us to save one."
+    elif not criteria:
+        content = "There's no search to save yet; ask what the user is looking for first."
+    else:
+        get_saved_searches().save(thread_id, criteria)
+        logger.info(f"Saved search {criteria}")
+        content = f"Search saved; the user will be told about new listings matching {criteria}."
+
+    return {"messages": [ToolMessage(content=content, tool_call_id=tool_call["id"])]}
@@ -1,15 +1,14 @@
+from functools import lru_cache
 from typing import Dict, Any
 from langchain_core.messages import AIMessage, ToolMessage
-from langchain_openai import ChatOpenAI
-from dotenv import load_dotenv
 import json
 from langchain_core.pydantic_v1 import BaseModel
 from src.util.state import State
+from langchain_core.runnables import RunnableConfig
+from src.util.llm import DEFAULT_MODEL, get_chat_model
+from src.util.latency_budget import choose_model
+from src.util.llm_scheduler import LlmOverloaded
 
-load_dotenv()
-
-# Create a ChatOpenAI instance
-model = ChatOpenAI(model="gpt-4o-mini")
 
 class SearchCriteriaObject(BaseModel):
     city: str | None = None
@@ -18,9 +17,19 @@ class SearchCriteriaObject(BaseModel):
     min_bathroom: int | None = None
     max_price: float | None = None
     min_price: float | None = None
+    min_sqft: int | None = None
+    max_price_per_sqft: float | None = None
+    status: str | None = None
+    sold_after: str | None = None
+    near_zip: str | None = None
+    radius_miles: float | None = None
 
 # Use JSON mode for structured output
-structured_llm = model.with_structured_output(SearchCriteriaObject, method="json_mode")
+@lru_cache(maxsize=None)
+def get_structured_llm(model: str = DEFAULT_MODEL):
+    return get_chat_model(model).with_structured_output(
+        SearchCriteriaObject, method="json_mode"
+    )
 
 SYSTEM_MESSAGE = """
 You are an AI assistant for a real estate search application. Your task is to interpret user queries about property searches and generate a JSON object representing the search criteria. The criteria should follow this structure:
@@ -31,7 +40,13 @@ You are an AI assistant for a real estate search application. Your task is to in
     "min_bedroom": Optional[int],
     "min_bathroom": Optional[int],
     "max_price": Optional[float],
-    "min_price": Optional[float]
+    "min_price": Optional[float],
+    "min_sqft": Optional[int],
+    "max_price_per_sqft": Optional[float],
+    "status": Optional[str],
+    "sold_after": Optional[str],
+    "near_zip": Optional[str],
+    "radius_miles": Optional[float]
 }
 
 Guidelines:
@@ -41,13 +56,18 @@ Guidelines:
 4. For bedroom and bathroom counts, use the 'min_' prefix to indicate "at least" this many.
 5. Infer the state if a well-known city is mentioned (e.g., "New York" implies "New York" state).
 6. If a price range is mentioned, use 'min_price' and 'max_price' accordingly.
-7. Only include fields in the JSON that are explicitly mentioned or can be reasonably inferred from the user's query.
-8. The entire response should be a valid JSON object matching the SearchCriteriaObject structure.
+7. Use 'min_sqft' for a minimum size in square feet and 'max_price_per_sqft' for a maximum price per square foot.
+8. Set 'status' to "for_sale" for homes on the market, "sold" for sold homes, or "ready_to_build" for new construction.
+9. Use 'sold_after' as a YYYY-MM-DD date for homes last sold after that date (e.g., "sold since 2020" means "2019-12-31").
+10. For homes near a zip code, set 'near_zip' to the 5-digit zip code, and 'radius_miles' if a distance is given (e.g., "within 5 miles of 10001").
+11. For homes within a distance of a city (e.g., "within 10 miles of downtown Austin"), set 'city', 'state' and 'radius_miles'.
+12. Only include fields in the JSON that are explicitly mentioned or can be reasonably inferred from the user's query.
+13. The entire response should be a valid JSON object matching the SearchCriteriaObject structure.
 
 Respond with only the JSON object, no additional text.
 """
 
-def search_criteria_agent(state: State) -> Dict[str, Any]:
+def search_criteria_agent(state: State, config: RunnableConfig) -> Dict[str, Any]:
     last_tool_call = state["messages"][-1].tool_calls[0]
     tool_call_id = last_tool_call["id"]
     user_query = last_tool_call["args"]["request"]
@@ -60,8 +80,13 @@ def search_criteria_agent(state: State) -> Dict[str, Any]:
     ]
 
     try:
-        response = structured_llm.invoke(messages)
+        # main_agent still has to answer after the query
+        model = choose_model("search_criteria_agent", config, calls_after=1)
+        response = get_structured_llm(model).invoke(messages)
         new_search_criteria = response.dict(exclude_none=True)
+    except LlmOverloaded:
+        # Shed turns get the busy message, not a parse error
+        raise
     except Exception as e:
         return {
             "search_criteria": current_criteria,
@@ -0,0 +1,29 @@
+import logging
+import sqlite3
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+from src.listings import StaleLoad
+from src.util.state import State
+
+logger = logging.getLogger(__name__)
+
+
+def find_similar_listings(state: State, config: RunnableConfig):
+    """Answers a FindSimilarListings call with the nearest listings from the similarity index."""
+    tool_call = state["messages"][-1].tool_calls[0]
+    args = dict(tool_call["args"])
+    count = int(args.pop("count", None) or 3)
+
+    try:
+        # numpy is only needed once the tool is used
+        from src.listings.similar import similar_listings
+
+        results = similar_listings({key: value for key, value in args.items() if value is not None}, count)
+        content = f"Similar listings: {results}" if results else "I couldn't find any similar listings."
+    except (ImportError, OSError, sqlite3.Error, StaleLoad) as e:
+        logger.warning(f"Similar listings unavailable: {e}")
+        content = "Similar listings aren't available right now."
+
+    return {"messages": [ToolMessage(content=content, tool_call_id=tool_call["id"])]}
@@ -0,0 +1,131 @@
+import logging
+import os
+import shutil
+import sqlite3
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv(
+    "LISTINGS_DB_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "real_estate_data.db"),
+)
+
+# "sqlite" queries the database file per search; "numpy" loads it into
+# columnar arrays once per worker; "snapshot" maps the arrays csv_to_sql.py
+# wrote, shared by all workers (both need numpy installed); "duckdb" queries
+# the Parquet files `csv_to_sql.py --parquet` wrote (needs duckdb and pyarrow);
+# "sharded" routes to the per-state files `csv_to_sql.py --shards` wrote
+LISTINGS_BACKEND = os.getenv("LISTINGS_BACKEND", "sqlite")
+
+# SearchCriteriaObject field -> (real_estate column, comparison)
+FILTERS: Dict[str, Tuple[str, str]] = {
+    "city": ("city", "="),
+    "state": ("state", "="),
+    "min_bedroom": ("bed", ">="),
+    "min_bathroom": ("bath", ">="),
+    "max_price": ("price", "<="),
+    "min_price": ("price", ">="),
+    "min_sqft": ("house_size", ">="),
+    "max_price_per_sqft": ("price_per_sqft", "<="),
+    "status": ("status", "="),
+    "sold_after": ("prev_sold_date", ">"),
+    # Set by src.listings.geo.resolve_radius from near_zip and radius_miles
+    "zip_codes": ("zip_code", "in"),
+}
+
+
+# csv_to_sql.py gives every load of `real_estate` a new id in this table, so
+# files built from its rowids (the similarity index) can tell which load they match
+LOAD_TABLE = "listings_load"
+
+
+def current_load(conn: sqlite3.Connection) -> str:
+    """Id of the load now in `real_estate`; "" for a database csv_to_sql.py didn't write."""
+    try:
+        row = conn.execute(f"SELECT load_id FROM {LOAD_TABLE}").fetchone()
+    except sqlite3.OperationalError:
+        return ""
+    return row[0] if row else ""
+
+
+class StaleLoad(Exception):
+    """A file built from `real_estate` is from another load than the one in the database."""
+
+
+class ListingBackend:
+    """Base interface for the stores listings can be searched in."""
+
+    name = "base"
+
+    def search(self, criteria: Dict, limit: int = 2) -> List[Dict]:
+        """Listings matching `criteria` (SearchCriteriaObject fields), as dicts."""
+        raise NotImplementedError
+
+
+def active_filters(criteria: Dict) -> List[Tuple[str, str, object]]:
+    """(column, comparison, value) for each known, non-empty criterion."""
+    filters = []
+    for key, value in criteria.items():
+        if value is None:
+            continue
+        if key not in FILTERS:
+            logger.warning(f"Unexpected criteria key: {key}")
+            continue
+        column, op = FILTERS[key]
+        filters.append((column, op, value))
+    return filters
+
+
+@contextmanager
+def replacing_directory(directory: str) -> Iterator[str]:
+    """
+    Yields an empty staging directory to write `directory`'s new contents to,
+    and swaps it in with renames once the block completes, rather than
+    rewriting files under running readers.
+    """
+    staging = directory.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    yield staging
+
+    if os.path.exists(directory):
+        old = directory.rstrip(os.sep) + ".old"
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(directory, old)
+        os.replace(staging, directory)
+        shutil.rmtree(old)
+    else:
+        os.replace(staging, directory)
+
+
+def create_listing_backend(name: str = LISTINGS_BACKEND, db_path: str = DB_PATH) -> ListingBackend:
+    if name == "sqlite":
+        from src.listings.sqlite_backend import SqliteListings
+
+        return SqliteListings(db_path)
+    if name == "numpy":
+        from src.listings.numpy_backend import NumpyListings
+
+        return NumpyListings.from_sqlite(db_path)
+    if name == "snapshot":
+        from src.listings.snapshot import SnapshotListings
+
+        return SnapshotListings()
+    if name == "duckdb":
+        from src.listings.duckdb_backend import DuckDBListings
+
+        return DuckDBListings()
+    if name == "sharded":
+        from src.listings.sharded_backend import ShardedListings
+
+        return ShardedListings()
+    raise ValueError(f"Unknown listings backend: {name}")
+
+
+@lru_cache(maxsize=None)
+def get_listing_backend() -> ListingBackend:
+    """The worker's listing backend, chosen by LISTINGS_BACKEND."""
+    return create_listing_backend()
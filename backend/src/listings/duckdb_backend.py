@@ -0,0 +1,102 @@
+"""
+Listings as Parquet partitioned by state, searched through DuckDB.
+
+`write_parquet` copies the `real_estate` table of a SQLite file into
+`<directory>/state=<state>/*.parquet`, keeping each row's SQLite rowid as
+`row_id` and the column order in `_schema.json`. DuckDB reads the directory
+as one table: a state filter only opens that state's files, and the other
+filters are pushed down to Parquet row groups, skipping those whose min/max
+statistics can't match. Searches order by `row_id`, so they return the same
+listings as the SQLite backend.
+
+Needs `pip install duckdb pyarrow`. Write the Parquet files from a listings
+database, from the backend directory:
+    python -m src.listings.duckdb_backend [--db data/real_estate_data.db] [--dir data/parquet]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+import duckdb
+import pyarrow as pa
+
+from src.listings import DB_PATH, ListingBackend, replacing_directory
+from src.listings.sqlite_backend import where_clause
+
+PARQUET_DIR = os.getenv(
+    "LISTINGS_PARQUET_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "parquet"),
+)
+SCHEMA_FILE = "_schema.json"
+
+
+def write_parquet(db_path: str = DB_PATH, directory: str = PARQUET_DIR) -> str:
+    """Replaces `directory` with the listings of `db_path` as hive-partitioned Parquet."""
+    conn = sqlite3.connect(db_path)
+    names = [column[0] for column in conn.execute("SELECT * FROM real_estate LIMIT 0").description]
+    columns = {}
+    for name, select in [("row_id", "rowid")] + [(name, f'"{name}"') for name in names]:
+        rows = conn.execute(f"SELECT {select} FROM real_estate ORDER BY rowid")
+        columns[name] = pa.array([row[0] for row in rows])
+    conn.close()
+
+    listings = pa.table(columns)
+    with replacing_directory(directory) as staging:
+        duckdb_conn = duckdb.connect()
+        duckdb_conn.register("listings", listings)
+        duckdb_conn.execute(
+            f"COPY (SELECT * FROM listings ORDER BY row_id) TO '{staging}'"
+            " (FORMAT PARQUET, PARTITION_BY (state), OVERWRITE_OR_IGNORE)"
+        )
+        duckdb_conn.close()
+        with open(os.path.join(staging, SCHEMA_FILE), "w") as f:
+            json.dump({"columns": names}, f)
+    return directory
+
+
+class DuckDBListings(ListingBackend):
+    """Searches a directory written by `write_parquet` with an embedded DuckDB."""
+
+    name = "duckdb"
+
+    def __init__(self, directory: str = PARQUET_DIR):
+        with open(os.path.join(directory, SCHEMA_FILE)) as f:
+            self.columns = json.load(f)["columns"]
+        self.conn = duckdb.connect()
+        pattern = os.path.join(directory, "*", "*.parquet")
+        self.conn.execute(
+            f"CREATE VIEW real_estate AS SELECT * FROM read_parquet('{pattern}', hive_partitioning = true,"
+            " hive_types = {'state': VARCHAR})"
+        )
+        # A DuckDB connection isn't safe to share; each thread gets a cursor
+        self.local = threading.local()
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        if not hasattr(self.local, "cursor"):
+            self.local.cursor = self.conn.cursor()
+        return self.local.cursor
+
+    def search(self, criteria: Dict, limit: int = 2) -> List[Dict]:
+        select = ", ".join(f'"{name}"' for name in self.columns)
+        where, params = where_clause(criteria)
+        query = f"SELECT {select} FROM real_estate WHERE {where} ORDER BY row_id LIMIT {int(limit)}"
+
+        cursor = self.cursor()
+        rows = cursor.execute(query, params).fetchall()
+        return [dict(zip(self.columns, row)) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write listings as Parquet partitioned by state.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=PARQUET_DIR)
+    args = parser.parse_args()
+    print(f"Parquet written to {write_parquet(args.db, args.dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Radius search over zip code centroids.
+
+`load_zip_centroids` reads a CSV with `zip_code`, `latitude` and `longitude`
+columns (other columns are ignored) into the listings database:
+
+- `zip_centroids`, one row per zip code;
+- `zip_centroids_rtree`, an R*Tree over those points, so the zip codes near a
+  point are a bounding-box lookup rather than a scan;
+- `city_centroids`, the mean centroid of each city's zip codes, from the
+  listings already in `real_estate`; `refresh_city_centroids` recomputes it
+  after the listings are reloaded.
+
+`resolve_radius` turns the `near_zip`/`radius_miles` criteria into the
+`zip_codes` filter every backend understands. The centre is `near_zip`'s
+centroid, or the city's when only `radius_miles` and a city are given, and a
+listing is in range when its zip code's centroid is.
+
+Load centroids into a listings database, from the backend directory:
+    python -m src.listings.geo --zips data/zip_centroids.csv [--db data/real_estate_data.db]
+"""
+
+import argparse
+import csv
+import logging
+import math
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from src.listings import DB_PATH
+from src.util.metrics import SQLITE_SECONDS, span
+
+logger = logging.getLogger(__name__)
+
+# Radius for "near <zip>" when the caller gives none
+DEFAULT_RADIUS_MILES = 10.0
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LATITUDE = 69.0
+
+CREATE_TABLES = """
+DROP TABLE IF EXISTS zip_centroids;
+DROP TABLE IF EXISTS zip_centroids_rtree;
+DROP TABLE IF EXISTS city_centroids;
+CREATE TABLE zip_centroids (zip_code VARCHAR(10) PRIMARY KEY, latitude REAL, longitude REAL);
+CREATE VIRTUAL TABLE zip_centroids_rtree USING rtree(id, min_latitude, max_latitude, min_longitude, max_longitude);
+CREATE TABLE city_centroids (
+    city VARCHAR(100),
+    state CHAR(2),
+    latitude REAL,
+    longitude REAL,
+    listings INT,
+    PRIMARY KEY (city, state)
+);
+"""
+
+
+def load_zip_centroids(csv_path: str, db_path: str = DB_PATH) -> int:
+    """Replaces the centroid tables of `db_path` with `csv_path`'s; returns the zip count."""
+    with open(csv_path, newline="") as f:
+        centroids = {
+            row["zip_code"].strip().zfill(5): (float(row["latitude"]), float(row["longitude"]))
+            for row in csv.DictReader(f)
+        }
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(CREATE_TABLES)
+    conn.executemany(
+        "INSERT INTO zip_centroids VALUES (?, ?, ?)",
+        ((zip_code, lat, lon) for zip_code, (lat, lon) in centroids.items()),
+    )
+    conn.execute(
+        "INSERT INTO zip_centroids_rtree"
+        " SELECT rowid, latitude, latitude, longitude, longitude FROM zip_centroids"
+    )
+    _fill_city_centroids(conn)
+    conn.commit()
+    conn.close()
+    return len(centroids)
+
+
+def _fill_city_centroids(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM city_centroids")
+    conn.execute(
+        """
+        INSERT INTO city_centroids
+        SELECT city, state, AVG(latitude), AVG(longitude), SUM(listings)
+        FROM (
+            SELECT city, state, zip_code, COUNT(*) AS listings
+            FROM real_estate WHERE city IS NOT NULL GROUP BY city, state, zip_code
+        ) JOIN zip_centroids USING (zip_code)
+        GROUP BY city, state
+        """
+    )
+
+
+def has_zip_centroids(db_path: str = DB_PATH) -> bool:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'zip_centroids'"
+        ).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def refresh_city_centroids(db_path: str = DB_PATH) -> int:
+    """
+    Recomputes `city_centroids` from the listings now in `real_estate` and
+    the zip centroids already loaded; returns the city count. Run after
+    reloading the listings, which keeps the zip centroids.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            _fill_city_centroids(conn)
+        return conn.execute("SELECT COUNT(*) FROM city_centroids").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def miles_between(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance, by the haversine formula."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+def zips_within(conn: sqlite3.Connection, latitude: float, longitude: float, miles: float) -> List[str]:
+    """Zip codes whose centroid is within `miles` of the point, nearest first."""
+    lat_delta = miles / MILES_PER_DEGREE_LATITUDE
+    lon_delta = miles / (MILES_PER_DEGREE_LATITUDE * max(math.cos(math.radians(latitude)), 0.01))
+    candidates = conn.execute(
+        "SELECT zip_code, latitude, longitude FROM zip_centroids_rtree"
+        " JOIN zip_centroids ON zip_centroids.rowid = zip_centroids_rtree.id"
+        " WHERE max_latitude >= ? AND min_latitude <= ? AND max_longitude >= ? AND min_longitude <= ?",
+        (latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta),
+    ).fetchall()
+    # The box's corners are further than `miles`
+    in_range = [
+        (distance, zip_code)
+        for zip_code, lat, lon in candidates
+        if (distance := miles_between(latitude, longitude, lat, lon)) <= miles
+    ]
+    return [zip_code for _, zip_code in sorted(in_range)]
+
+
+def center_of(conn: sqlite3.Connection, criteria: Dict) -> Optional[Tuple[float, float]]:
+    """The point a radius search is around: `near_zip`'s centroid, else the city's."""
+    if criteria.get("near_zip") is not None:
+        return conn.execute(
+            "SELECT latitude, longitude FROM zip_centroids WHERE zip_code = ?",
+            (str(criteria["near_zip"]).strip().zfill(5),),
+        ).fetchone()
+    if criteria.get("state") is not None:
+        return conn.execute(
+            "SELECT latitude, longitude FROM city_centroids WHERE city = ? AND state = ?",
+            (criteria["city"], criteria["state"]),
+        ).fetchone()
+    # Without a state, the city of that name with the most listings
+    return conn.execute(
+        "SELECT latitude, longitude FROM city_centroids WHERE city = ? ORDER BY listings DESC LIMIT 1",
+        (criteria["city"],),
+    ).fetchone()
+
+
+def resolve_radius(criteria: Dict, db_path: str = DB_PATH) -> Dict:
+    """
+    `criteria` with `near_zip` and `radius_miles` replaced by the zip codes in range.
+
+    A radius around a city replaces the city and state filters. Without
+    centroids for the zip or city, a `near_zip` search falls back to that zip
+    code alone and a city search to the city itself.
+    """
+    near_zip, radius = criteria.get("near_zip"), criteria.get("radius_miles")
+    if near_zip is None and radius is None:
+        return criteria
+    resolved = {key: value for key, value in criteria.items() if key not in ("near_zip", "radius_miles")}
+    if near_zip is None and criteria.get("city") is None:
+        logger.warning("radius_miles without near_zip or city; ignoring it")
+        return resolved
+
+    conn = sqlite3.connect(db_path)
+    try:
+        with span(SQLITE_SECONDS, query="zips_within"):
+            center = center_of(conn, criteria)
+            zip_codes = None if center is None else zips_within(conn, *center, radius or DEFAULT_RADIUS_MILES)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Radius search unavailable, load zip centroids with src.listings.geo: {e}")
+        zip_codes = None
+    finally:
+        conn.close()
+
+    if zip_codes is None:
+        if near_zip is not None:
+            resolved["zip_codes"] = [str(near_zip).strip().zfill(5)]
+        return resolved
+    if near_zip is None:
+        resolved.pop("city", None)
+        resolved.pop("state", None)
+    resolved["zip_codes"] = zip_codes
+    return resolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load zip code centroids for radius search.")
+    parser.add_argument("--zips", required=True, help="CSV with zip_code, latitude and longitude columns")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+    print(f"{load_zip_centroids(args.zips, args.db)} zip centroids loaded into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
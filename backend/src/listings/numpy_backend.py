@@ -0,0 +1,339 @@
+"""
+Columnar, in-memory listing search over NumPy arrays.
+
+The `real_estate` table is loaded once per worker:
+
+- bed and bath become int8, house_size int16 and street int32 (wider, or
+  float32, if the data doesn't fit); price, acre_lot and price_per_sqft
+  float32. NULLs are the dtype's minimum or NaN, which no filter matches,
+  as in SQL.
+- city, state, status, prev_sold_date and every other text column are
+  dictionary encoded: the distinct values in SQLite's sort order and the
+  smallest unsigned code array that indexes them, so codes compare like the
+  values and a range of dates is a range of codes.
+- each filterable column gets a sort permutation, so a range or equality
+  filter is two binary searches giving the matching row ids, and a set of
+  zip codes is two per code.
+
+A search picks the most selective filter from its index and applies the rest
+as vectorized masks over those rows only; when the best filter is an equality
+or no filter is selective, it checks rows in row-order chunks and stops at
+`limit`. Results come back
+in row order, like SQLite's table scan.
+
+Prices above 2**24 dollars lose precision in float32, so a listing within a
+few dollars of a price bound can land on the other side of it than in SQLite;
+so can a price per square foot within a cent of a bound that isn't a whole
+number of dollars.
+"""
+
+import bisect
+import logging
+import math
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.listings import FILTERS, ListingBackend, active_filters
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = {
+    "price": np.float32,
+    "bed": np.int8,
+    "bath": np.int8,
+    "house_size": np.int16,
+    "acre_lot": np.float32,
+    "street": np.int32,
+    "price_per_sqft": np.float32,
+}
+
+# Below this share of the table, gathering the best filter's rows beats a scan
+SELECTIVE_FRACTION = 0.125
+# Early-exit scans check this many rows first, then four times more each round
+FIRST_CHUNK = 1024
+MAX_CHUNK = 262144
+
+
+def _fitting_int(values: List, preferred) -> Optional[type]:
+    """`preferred` or a wider int dtype holding every value, None for fractions."""
+    present = [v for v in values if v is not None]
+    if any(float(v) != int(v) for v in present):
+        return None
+    low, high = (min(present), max(present)) if present else (0, 0)
+    for dtype in (preferred, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min < low and high <= info.max:
+            return dtype
+    return None
+
+
+def _code_dtype(size: int) -> type:
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if size <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+def _encode_numeric(values: List, preferred) -> Tuple[np.ndarray, type]:
+    """The column as `preferred` (or the nearest dtype that fits) and its Python type."""
+    integral = all(isinstance(v, int) for v in values if v is not None)
+    dtype = np.float32 if preferred is np.float32 else _fitting_int(values, preferred)
+    if dtype is None:
+        dtype = np.float32
+    null = np.nan if dtype is np.float32 else np.iinfo(dtype).min
+    array = np.array([null if v is None else v for v in values], dtype=dtype)
+    return array, int if integral else float
+
+
+def _sql_order(value) -> Tuple:
+    """Sort key matching SQLite's: numbers, then text, then blobs."""
+    return (isinstance(value, str) + 2 * isinstance(value, bytes), value)
+
+
+def _encode_dictionary(values: List) -> Tuple[np.ndarray, List]:
+    """Codes into the column's distinct values, and those values, sorted with NULL last."""
+    distinct = set(values)
+    ordered = sorted(distinct - {None}, key=_sql_order) + [None] * (None in distinct)
+    lookup = {value: code for code, value in enumerate(ordered)}
+    codes = [lookup[v] for v in values]
+    return np.array(codes, dtype=_code_dtype(len(lookup))), ordered
+
+
+def _matches(values: np.ndarray, bounds) -> np.ndarray:
+    """Mask of `values` within (low, high), or whose code is set in a table of allowed codes."""
+    if isinstance(bounds, np.ndarray):
+        return bounds[values]
+    low, high = bounds
+    return (values >= low) & (values <= high)
+
+
+def _intersect(a, b):
+    """Bounds matching both `a` and `b`, None if nothing can."""
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        table, other = (a, b) if isinstance(a, np.ndarray) else (b, a)
+        table = table & _matches(np.arange(len(table)), other)
+        return table if table.any() else None
+    low, high = max(a[0], b[0]), min(a[1], b[1])
+    return (low, high) if low <= high else None
+
+
+def build_indexes(arrays: Dict[str, np.ndarray]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """(sort permutation, sorted values) for every filterable column."""
+    indexes = {}
+    size = len(next(iter(arrays.values()), []))
+    row_dtype = np.int32 if size < 2**31 else np.int64
+    for column in {column for column, _ in FILTERS.values()} & set(arrays):
+        order = np.argsort(arrays[column], kind="stable").astype(row_dtype)
+        indexes[column] = (order, arrays[column][order])
+    return indexes
+
+
+class NumpyListings(ListingBackend):
+    name = "numpy"
+
+    def __init__(
+        self,
+        arrays: Dict[str, np.ndarray],
+        dictionaries: Dict[str, List],
+        python_types: Dict[str, type],
+        indexes: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+    ):
+        """Searches encoded columns, in table order; builds the indexes unless given."""
+        self.arrays = arrays
+        self.names = list(arrays)
+        self.size = len(next(iter(arrays.values()), []))
+        self.dictionaries = dictionaries
+        self.lookups = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in dictionaries.items()
+        }
+        self.python_types = python_types
+        self.indexes = build_indexes(arrays) if indexes is None else indexes
+
+    @classmethod
+    def encode(cls, columns: Iterable[Tuple[str, List]]) -> "NumpyListings":
+        """Encodes (name, values) pairs, one column in memory at a time."""
+        arrays, dictionaries, python_types = {}, {}, {}
+        for name, values in columns:
+            if name in NUMERIC_COLUMNS:
+                arrays[name], python_types[name] = _encode_numeric(values, NUMERIC_COLUMNS[name])
+            else:
+                arrays[name], dictionaries[name] = _encode_dictionary(values)
+        return cls(arrays, dictionaries, python_types)
+
+    @classmethod
+    def from_sqlite(cls, path: str) -> "NumpyListings":
+        start = time.monotonic()
+        conn = sqlite3.connect(path)
+        names = [column[0] for column in conn.execute("SELECT * FROM real_estate LIMIT 0").description]
+        listings = cls.encode(
+            (name, [row[0] for row in conn.execute(f'SELECT "{name}" FROM real_estate ORDER BY rowid')])
+            for name in names
+        )
+        conn.close()
+        logger.info(
+            f"Loaded {listings.size} listings into {listings.nbytes() / 2**20:.0f}MiB"
+            f" of arrays in {time.monotonic() - start:.1f}s"
+        )
+        return listings
+
+    def nbytes(self) -> int:
+        """Memory held by the column and index arrays."""
+        return sum(a.nbytes for a in self.arrays.values()) + sum(
+            order.nbytes + values.nbytes for order, values in self.indexes.values()
+        )
+
+    def _bounds(self, column: str, op: str, value):
+        """
+        Inclusive (low, high) in the column's dtype, or None if nothing matches.
+        An "in" filter on a dictionary column gives a table of allowed codes.
+        """
+        array = self.arrays[column]
+        if column in self.lookups:
+            if op == "in":
+                lookup = self.lookups[column]
+                codes = [lookup[v] for v in value if v in lookup]
+                allowed = np.zeros(len(lookup), dtype=bool)
+                allowed[codes] = True
+                return allowed if codes else None
+            if op == "=":
+                code = self.lookups[column].get(value)
+                return None if code is None else (array.dtype.type(code),) * 2
+            # Sorted values, so the bounds are a run of codes that stops short of NULL
+            values = self.dictionaries[column]
+            end = len(values) - (values[-1:] == [None])
+            key = _sql_order(value)
+            low, high = 0, end - 1
+            if op in (">=", ">"):
+                side = bisect.bisect_left if op == ">=" else bisect.bisect_right
+                low = side(values, key, 0, end, key=_sql_order)
+            if op in ("<=", "<"):
+                side = bisect.bisect_right if op == "<=" else bisect.bisect_left
+                high = side(values, key, 0, end, key=_sql_order) - 1
+            return (array.dtype.type(low), array.dtype.type(high)) if low <= high else None
+
+        if np.issubdtype(array.dtype, np.floating):
+            # Round the bounds inwards so float32 rounding never widens them
+            ftype = array.dtype.type
+            low, high = ftype(-np.inf), ftype(np.inf)
+            if op in ("=", ">=", ">"):
+                low = ftype(value)
+                if float(low) < value or (op == ">" and float(low) == value):
+                    low = np.nextafter(low, ftype(np.inf))
+            if op in ("=", "<=", "<"):
+                high = ftype(value)
+                if float(high) > value or (op == "<" and float(high) == value):
+                    high = np.nextafter(high, ftype(-np.inf))
+            return (low, high) if low <= high else None
+
+        # Integer columns: the dtype's minimum is NULL
+        info = np.iinfo(array.dtype)
+        low, high = info.min + 1, info.max
+        if op in ("=", ">="):
+            low = max(low, math.ceil(value))
+        elif op == ">":
+            low = max(low, math.floor(value) + 1)
+        if op in ("=", "<="):
+            high = min(high, math.floor(value))
+        elif op == "<":
+            high = min(high, math.ceil(value) - 1)
+        return (array.dtype.type(low), array.dtype.type(high)) if low <= high else None
+
+    def _ranges(self, criteria: Dict) -> Optional[Dict]:
+        """Per-column bounds of the criteria, None if they can't match."""
+        ranges: Dict = {}
+        for column, op, value in active_filters(criteria):
+            bounds = self._bounds(column, op, value)
+            if bounds is not None and column in ranges:
+                bounds = _intersect(ranges[column], bounds)
+            if bounds is None:
+                return None
+            ranges[column] = bounds
+        return ranges
+
+    def matching_ids(self, criteria: Dict, limit: Optional[int] = None) -> np.ndarray:
+        """Row ids matching `criteria` in row order, the first `limit` if given."""
+        ranges = self._ranges(criteria)
+        if ranges is None or limit == 0:
+            return np.empty(0, dtype=np.int64)
+        if not ranges:
+            return np.arange(self.size if limit is None else min(limit, self.size))
+
+        # The index slices of each filtered column, one per allowed code for a
+        # table; the narrowest column seeds the search. Bounds are in the
+        # column's dtype, else searchsorted casts the column
+        slices = {}
+        for column, bounds in ranges.items():
+            _, values = self.indexes[column]
+            if isinstance(bounds, np.ndarray):
+                codes = np.flatnonzero(bounds).astype(values.dtype)
+                starts = np.searchsorted(values, codes, side="left").tolist()
+                slices[column] = list(zip(starts, np.searchsorted(values, codes, side="right").tolist()))
+            else:
+                low, high = bounds
+                slices[column] = [
+                    (int(np.searchsorted(values, low, side="left")), int(np.searchsorted(values, high, side="right")))
+                ]
+        counts = {column: sum(end - start for start, end in pairs) for column, pairs in slices.items()}
+        best = min(counts, key=counts.get)
+        order = self.indexes[best][0]
+
+        if limit is not None:
+            bounds = ranges[best]
+            if isinstance(bounds, tuple) and bounds[0] == bounds[1]:
+                # The stable sort keeps rows sharing a value in row order
+                start, end = slices[best][0]
+                return self._first(ranges, limit, order[start:end], skip=best)
+            if counts[best] > self.size * SELECTIVE_FRACTION:
+                return self._first(ranges, limit)
+
+        ids = np.concatenate([order[start:end] for start, end in slices[best]])
+        mask = np.ones(len(ids), dtype=bool)
+        for column, bounds in ranges.items():
+            if column != best:
+                mask &= _matches(self.arrays[column][ids], bounds)
+        ids = ids[mask]
+        if limit is not None and len(ids) > limit:
+            ids = np.partition(ids, limit - 1)[:limit]
+        return np.sort(ids)
+
+    def _first(
+        self, ranges: Dict, limit: int, ids: Optional[np.ndarray] = None, skip: str = None
+    ) -> np.ndarray:
+        """The first `limit` of `ids` (default: all rows) matching `ranges`, in growing chunks."""
+        total = self.size if ids is None else len(ids)
+        found = []
+        remaining, start, chunk = limit, 0, FIRST_CHUNK
+        while remaining and start < total:
+            end = min(start + chunk, total)
+            rows = np.arange(start, end) if ids is None else ids[start:end]
+            mask = np.ones(end - start, dtype=bool)
+            for column, bounds in ranges.items():
+                if column != skip:
+                    values = self.arrays[column][start:end] if ids is None else self.arrays[column][rows]
+                    mask &= _matches(values, bounds)
+            found.append(rows[mask][:remaining])
+            remaining -= len(found[-1])
+            start, chunk = end, min(chunk * 4, MAX_CHUNK)
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def row(self, i: int) -> Dict:
+        listing = {}
+        for name in self.names:
+            value = self.arrays[name][i]
+            if name in self.dictionaries:
+                listing[name] = self.dictionaries[name][value]
+            elif np.issubdtype(value.dtype, np.floating):
+                # The shortest decimal that rounds to the float32, which is the
+                # value SQLite holds when it has seven significant digits or fewer
+                listing[name] = None if np.isnan(value) else self.python_types[name](float(str(value)))
+            else:
+                is_null = value == np.iinfo(value.dtype).min
+                listing[name] = None if is_null else self.python_types[name](value)
+        return listing
+
+    def search(self, criteria: Dict, limit: int = 2) -> List[Dict]:
+        return [self.row(i) for i in self.matching_ids(criteria, int(limit))]
@@ -0,0 +1,145 @@
+"""
+Refining a thread's last search from its results instead of searching again.
+
+Follow-ups mostly tighten a search: "under $400k", "at least 3 bedrooms".
+`RefiningSearch` keeps, per thread, the filters of its last full search and
+that search's first REFINE_CANDIDATES matches in listing order. When the new
+filters only narrow the old ones (each old filter kept and at least as
+tight, new ones added), every new match is an old match, so the first
+`limit` candidates passing the new filters are the answer, provided `limit`
+of them pass or the candidates were all the old matches. Otherwise, and
+whenever a filter is dropped or loosened, it searches the backend again and
+caches that search instead.
+
+Candidates beyond `limit` make every full search scan further, so there are
+few of them: benchmarks/refinement_bench.py measures what a follow-up saves
+against what the extra rows cost.
+
+The cache is bounded: REFINE_THREADS threads, least recently searched
+dropped first, and entries older than REFINE_MAX_AGE_SECONDS are not used,
+so a new ingest shows up within that time.
+"""
+
+import operator
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from src.listings import ListingBackend, active_filters
+from src.util.metrics import LISTING_REFINEMENTS
+
+# Matches fetched by a full search, to refine later searches from
+REFINE_CANDIDATES = int(os.getenv("REFINE_CANDIDATES", "5"))
+REFINE_THREADS = int(os.getenv("REFINE_THREADS", "256"))
+REFINE_MAX_AGE_SECONDS = float(os.getenv("REFINE_MAX_AGE_SECONDS", "300"))
+
+COMPARISONS = {
+    "=": operator.eq,
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "in": lambda value, allowed: value in allowed,
+}
+
+Filter = Tuple[str, str, object]
+
+
+class Candidates(NamedTuple):
+    filters: List[Filter]
+    rows: List[Dict]
+    # Every match of `filters`, not just the first REFINE_CANDIDATES
+    complete: bool
+    fetched_at: float
+
+
+def _at_least_as_tight(op: str, new, old) -> bool:
+    if op == "=":
+        return new == old
+    if op in (">=", ">"):
+        return new >= old
+    if op in ("<=", "<"):
+        return new <= old
+    if op == "in":
+        return set(new) <= set(old)
+    return False
+
+
+def narrows(new: List[Filter], old: List[Filter]) -> bool:
+    """True if every listing matching `new` also matches `old`."""
+    by_comparison = {(column, op): value for column, op, value in new}
+    try:
+        return all(
+            (column, op) in by_comparison and _at_least_as_tight(op, by_comparison[(column, op)], value)
+            for column, op, value in old
+        )
+    except TypeError:
+        # A value of another type than before; search again
+        return False
+
+
+def passes(row: Dict, filters: List[Filter]) -> bool:
+    """`row` matches every filter; as in SQL, NULL matches none."""
+    for column, op, value in filters:
+        if row.get(column) is None or not COMPARISONS[op](row[column], value):
+            return False
+    return True
+
+
+class RefiningSearch:
+    """A backend's searches, answered from each thread's previous results when they can be."""
+
+    def __init__(
+        self,
+        candidates: int = REFINE_CANDIDATES,
+        threads: int = REFINE_THREADS,
+        max_age: float = REFINE_MAX_AGE_SECONDS,
+    ):
+        self.candidates = candidates
+        self.threads = threads
+        self.max_age = max_age
+        self.cache: "OrderedDict[str, Candidates]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def search(self, backend: ListingBackend, thread_id: str, criteria: Dict, limit: int = 2) -> Tuple[List[Dict], str]:
+        """The listings and how they were found: "refined", or why the backend was searched."""
+        filters = [
+            (column, op, set(value) if op == "in" else value) for column, op, value in active_filters(criteria)
+        ]
+        with self.lock:
+            cached: Optional[Candidates] = self.cache.get(thread_id)
+            if cached is not None:
+                self.cache.move_to_end(thread_id)
+
+        if cached is None:
+            outcome = "new_thread"
+        elif time.monotonic() - cached.fetched_at > self.max_age:
+            outcome = "expired"
+        elif not narrows(filters, cached.filters):
+            outcome = "widened"
+        else:
+            matches = []
+            for row in cached.rows:
+                if passes(row, filters):
+                    matches.append(row)
+                    if len(matches) == limit:
+                        break
+            if len(matches) == limit or cached.complete:
+                LISTING_REFINEMENTS.inc(outcome="refined")
+                return matches, "refined"
+            # The candidates ran out before `limit` matches; later ones may match
+            outcome = "exhausted"
+
+        # A narrower search than the cached one matches sparsely, so fetching
+        # candidates beyond `limit` would scan much further
+        fetch = limit if outcome == "exhausted" else max(limit, self.candidates)
+        rows = backend.search(criteria, fetch)
+        with self.lock:
+            self.cache[thread_id] = Candidates(filters, rows, len(rows) < fetch, time.monotonic())
+            self.cache.move_to_end(thread_id)
+            while len(self.cache) > self.threads:
+                self.cache.popitem(last=False)
+        LISTING_REFINEMENTS.inc(outcome=outcome)
+        return rows[:limit], outcome
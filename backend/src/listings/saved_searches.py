@@ -0,0 +1,331 @@
+"""
+Saved searches, and alerts when an ingest brings listings that match them.
+
+A thread saves its current search criteria with the agent's SaveSearch tool;
+there's one saved search per thread. After an ingest, `notify_saved_searches`
+matches the new and changed listings against every saved search and queues
+an alert per match in `search_alerts`. The async SMS pipeline claims them
+and texts each SMS thread its alerts; web chat and voice threads have no
+number to reach them on, so they can't save searches, and any alerts for
+them are dropped.
+
+Matching doesn't compare every search with every listing. `SavedSearchIndex`
+groups the searches by location: (state, city), state only, city only or
+neither, and a radius search by each of its zip codes. A listing only meets
+the searches of the groups its own location falls in. Within a group the
+listings are sorted by price, which makes each search's price interval a
+contiguous range of them, found for all the group's searches at once by
+binary search. Bed and bath minimums are checked over that range, cheapest
+first, a chunk at a time, and any other criteria (square feet, status...) on
+the listings that get that far. A search gets at most
+SAVED_SEARCH_ALERT_LIMIT alerts per ingest.
+
+csv_to_sql.py queues alerts for the rows that differ from the previous load.
+After appending listings to an existing database, from the backend directory:
+    python -m src.listings.saved_searches --since-rowid <last rowid before the append>
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from src.listings import DB_PATH, active_filters
+from src.listings.geo import resolve_radius
+from src.listings.refine import passes
+
+logger = logging.getLogger(__name__)
+
+SAVED_SEARCHES_PATH = os.getenv(
+    "SAVED_SEARCHES_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "saved_searches.db"),
+)
+# Alerts queued per saved search per ingest, cheapest listings first
+SAVED_SEARCH_ALERT_LIMIT = int(os.getenv("SAVED_SEARCH_ALERT_LIMIT", "3"))
+# Seconds claimed alerts may go unsent before another worker claims them, as
+# it would after the claiming worker died
+SAVED_SEARCH_CLAIM_LEASE_SECONDS = float(os.getenv("SAVED_SEARCH_CLAIM_LEASE_SECONDS", "300"))
+
+# Criteria the index matches itself; the rest are checked per listing
+INDEXED = {"city", "state", "min_price", "max_price", "min_bedroom", "min_bathroom"}
+# Listings checked at a time for the bed and bath minimums
+SCAN_CHUNK = 256
+
+
+class SavedSearches:
+    """
+    Saved searches and their queued alerts, in a local SQLite file every
+    worker process may share.
+    """
+
+    def __init__(self, path: str = SAVED_SEARCHES_PATH):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS saved_searches (
+                thread_id TEXT PRIMARY KEY,
+                criteria TEXT NOT NULL,
+                saved_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS search_alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                thread_id TEXT NOT NULL,
+                listing TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                queued_at REAL NOT NULL,
+                claimed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_search_alerts_status
+                ON search_alerts (status, id);
+            """
+        )
+        # Files written before claims had a time; their claimed alerts have
+        # none, so they count as abandoned
+        if "claimed_at" not in [row[1] for row in self.conn.execute("PRAGMA table_info(search_alerts)")]:
+            self.conn.execute("ALTER TABLE search_alerts ADD COLUMN claimed_at REAL")
+        self.conn.commit()
+
+    @contextmanager
+    def _claiming(self) -> Iterator[None]:
+        """A transaction holding SQLite's write lock from the start, so claims by other workers wait."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+
+    def save(self, thread_id: str, criteria: Dict) -> None:
+        """Saves `criteria` (SearchCriteriaObject fields) as the thread's search, replacing any earlier one."""
+        criteria = {key: value for key, value in criteria.items() if value is not None}
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO saved_searches (thread_id, criteria, saved_at) VALUES (?, ?, ?)",
+                (thread_id, json.dumps(criteria), time.time()),
+            )
+            self.conn.commit()
+
+    def delete(self, thread_id: str) -> bool:
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM saved_searches WHERE thread_id = ?", (thread_id,))
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+    def all(self) -> List[Tuple[str, Dict]]:
+        with self.lock:
+            rows = self.conn.execute("SELECT thread_id, criteria FROM saved_searches").fetchall()
+        return [(thread_id, json.loads(criteria)) for thread_id, criteria in rows]
+
+    def enqueue_alerts(self, matches: Iterable[Tuple[str, Dict]]) -> int:
+        now = time.time()
+        with self.lock:
+            cursor = self.conn.executemany(
+                "INSERT INTO search_alerts (thread_id, listing, queued_at) VALUES (?, ?, ?)",
+                ((thread_id, json.dumps(listing), now) for thread_id, listing in matches),
+            )
+            self.conn.commit()
+            return cursor.rowcount
+
+    def claim_alerts(self, limit: int = 100) -> List[Dict]:
+        """
+        The oldest pending alerts, and those whose claim has outlived its
+        lease, marked as being sent.
+        """
+        now = time.time()
+        with self._claiming():
+            rows = self.conn.execute(
+                """
+                SELECT id, thread_id, listing FROM search_alerts
+                WHERE status = 'pending' OR (status = 'sending' AND (claimed_at IS NULL OR claimed_at < ?))
+                ORDER BY id LIMIT ?
+                """,
+                (now - SAVED_SEARCH_CLAIM_LEASE_SECONDS, limit),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE search_alerts SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row[0]) for row in rows],
+            )
+        return [{"id": i, "thread_id": thread_id, "listing": json.loads(listing)} for i, thread_id, listing in rows]
+
+    def complete_alerts(self, ids: List[int]) -> None:
+        with self.lock:
+            self.conn.executemany("DELETE FROM search_alerts WHERE id = ?", [(i,) for i in ids])
+            self.conn.commit()
+
+    def depth(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM search_alerts GROUP BY status").fetchall())
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+@lru_cache(maxsize=None)
+def get_saved_searches() -> SavedSearches:
+    """The worker's saved searches, at SAVED_SEARCHES_PATH."""
+    return SavedSearches()
+
+
+class SavedSearchIndex:
+    """Saved searches grouped by location, with their price intervals and bed and bath minimums."""
+
+    def __init__(self, searches: List[Tuple[str, Dict]], db_path: str = DB_PATH):
+        # numpy is only needed at ingest, not to save a search
+        import numpy as np
+
+        self.thread_ids: List[str] = []
+        # Per search: the filters the groups and bounds don't cover
+        self.others: List[List[Tuple[str, str, object]]] = []
+        bounds = []
+        by_location: Dict[Tuple, List[int]] = defaultdict(list)
+        # Radius searches around the same place share one lookup
+        resolved: Dict[Tuple, Dict] = {}
+        for thread_id, criteria in searches:
+            location = {key: criteria.get(key) for key in ("near_zip", "radius_miles", "city", "state")}
+            place = tuple(location.values())
+            if place not in resolved:
+                resolved[place] = resolve_radius(location, db_path)
+            criteria = {
+                **{key: value for key, value in criteria.items() if key not in location},
+                **{key: value for key, value in resolved[place].items() if value is not None},
+            }
+
+            search = len(self.thread_ids)
+            if criteria.get("zip_codes") is not None:
+                # A radius search meets the listings in each of its zip codes;
+                # its city and state, if any, are checked per listing
+                for zip_code in criteria["zip_codes"]:
+                    by_location[("zip_code", zip_code)].append(search)
+                indexed = INDEXED - {"city", "state"} | {"zip_codes"}
+            else:
+                by_location[(criteria.get("state"), criteria.get("city"))].append(search)
+                indexed = INDEXED
+            self.thread_ids.append(thread_id)
+            self.others.append(active_filters({key: value for key, value in criteria.items() if key not in indexed}))
+            bounds.append([criteria.get(key) for key in ("min_price", "max_price", "min_bedroom", "min_bathroom")])
+
+        # Missing bounds (None, so NaN) let every listing through
+        bounds = np.array(bounds, dtype=np.float64).reshape(-1, 4)
+        bounds = np.where(np.isnan(bounds), [-math.inf, math.inf, -math.inf, -math.inf], bounds)
+        self.min_price, self.max_price, self.min_bed, self.min_bath = (column.copy() for column in bounds.T)
+        # location -> indexes of its searches
+        self.groups = {location: np.array(members) for location, members in by_location.items()}
+
+    def __len__(self) -> int:
+        return len(self.thread_ids)
+
+    def match(self, listings: List[Dict], limit: int = SAVED_SEARCH_ALERT_LIMIT) -> List[Tuple[str, Dict]]:
+        """
+        (thread id, listing) for up to `limit` of `listings` per saved search,
+        cheapest first (within each zip code, for a radius search).
+        """
+        import numpy as np
+
+        # Listings by each location a search can have, for the groups that exist
+        by_location: Dict[Tuple, List[int]] = defaultdict(list)
+        for i, listing in enumerate(listings):
+            state, city = listing.get("state"), listing.get("city")
+            locations = [(state, city), (state, None), (None, city), (None, None), ("zip_code", listing.get("zip_code"))]
+            # Without a city or state some coincide, and a listing meets a group once
+            for location in dict.fromkeys(locations):
+                if location in self.groups:
+                    by_location[location].append(i)
+
+        def column(rows: List[int], key: str) -> np.ndarray:
+            return np.array([listings[i].get(key) for i in rows], dtype=np.float64)
+
+        matches = []
+        # A radius search meets listings in several groups, but gets `limit` alerts in all
+        found: Dict[str, int] = defaultdict(int)
+        for location, rows in by_location.items():
+            members = self.groups[location]
+            prices = column(rows, "price")
+            # NaN prices sort last, past every price interval
+            order = np.argsort(prices, kind="stable")
+            rows = [rows[i] for i in order]
+            prices = prices[order]
+            # As in SQL, a listing missing bed or bath only matches searches without that minimum
+            beds = np.nan_to_num(column(rows, "bed"), nan=-math.inf)
+            baths = np.nan_to_num(column(rows, "bath"), nan=-math.inf)
+
+            min_price, max_price = self.min_price[members], self.max_price[members]
+            starts = np.searchsorted(prices, min_price, side="left")
+            ends = np.searchsorted(prices, max_price, side="right")
+            # Without a price filter, listings without a price match too
+            ends[np.isneginf(min_price) & np.isposinf(max_price)] = len(prices)
+
+            for m in np.flatnonzero(starts < ends).tolist():
+                search = int(members[m])
+                thread_id, others = self.thread_ids[search], self.others[search]
+                min_bed, min_bath = self.min_bed[search], self.min_bath[search]
+                start, end = int(starts[m]), int(ends[m])
+                while start < end and found[thread_id] < limit:
+                    stop = min(end, start + SCAN_CHUNK)
+                    hits = np.flatnonzero((beds[start:stop] >= min_bed) & (baths[start:stop] >= min_bath))
+                    for hit in hits.tolist():
+                        listing = listings[rows[start + hit]]
+                        if others and not passes(listing, others):
+                            continue
+                        matches.append((thread_id, listing))
+                        found[thread_id] += 1
+                        if found[thread_id] == limit:
+                            break
+                    start = stop
+        return matches
+
+
+def listings_since(db_path: str = DB_PATH, rowid: int = 0) -> List[Dict]:
+    """Listings appended after `rowid`, as dicts."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute("SELECT * FROM real_estate WHERE rowid > ?", (rowid,))]
+    finally:
+        conn.close()
+
+
+def notify_saved_searches(
+    listings: List[Dict], db_path: str = DB_PATH, path: str = SAVED_SEARCHES_PATH
+) -> int:
+    """Queues an alert for every saved search the new or changed `listings` match; returns how many."""
+    store = SavedSearches(path)
+    try:
+        searches = store.all()
+        if not searches or not listings:
+            return 0
+        start = time.monotonic()
+        matches = SavedSearchIndex(searches, db_path).match(listings)
+        queued = store.enqueue_alerts(matches)
+        logger.info(
+            f"Matched {len(listings)} listings against {len(searches)} saved searches,"
+            f" {queued} alerts queued, in {time.monotonic() - start:.1f}s"
+        )
+        return queued
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue saved-search alerts for listings appended to the database.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--since-rowid", type=int, required=True, help="the last rowid before the new listings")
+    parser.add_argument("--saved-searches", default=SAVED_SEARCHES_PATH)
+    args = parser.parse_args()
+    queued = notify_saved_searches(listings_since(args.db, args.since_rowid), args.db, args.saved_searches)
+    print(f"{queued} saved-search alerts queued")
+
+
+if __name__ == "__main__":
+    main()
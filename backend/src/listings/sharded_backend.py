@@ -0,0 +1,192 @@
+"""
+Listings split into one SQLite file per state.
+
+`write_shards` copies the `real_estate` table of a listings database into
+`<directory>/<state>.db`, one file per state, keeping every row's rowid from
+the source, and lists the files in `shards.json`. Rows without a state go to
+a shard of their own.
+
+`shards.json` also records each shard's cities and the min and max of each
+column with a range filter. `ShardedListings` routes a search with a state to that
+state's file alone, and one with a city to the states that have it, skipping
+shards whose ranges can't match. It queries the remaining shards in a thread
+pool and merges their first rows by rowid, which gives the same listings in
+the same order as a search of the single database.
+
+Write shards from a listings database, from the backend directory:
+    python -m src.listings.sharded_backend [--db data/real_estate_data.db] [--dir data/shards]
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from src.listings import DB_PATH, FILTERS, ListingBackend, active_filters, replacing_directory
+from src.listings.sqlite_backend import where_clause
+from src.util.metrics import SQLITE_SECONDS, span
+
+SHARD_DIR = os.getenv(
+    "LISTINGS_SHARD_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "shards"),
+)
+# Threads querying shards at once when a search has no state
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "8"))
+
+# Columns whose per-shard min and max let searches skip shards
+RANGE_COLUMNS = sorted({column for column, op in FILTERS.values() if op != "="})
+
+MANIFEST = "shards.json"
+NO_STATE = "_no_state"
+
+
+def _shard_file(state: Optional[str]) -> str:
+    if state is None:
+        return f"{NO_STATE}.db"
+    return re.sub(r"[^A-Za-z0-9]+", "_", state) + ".db"
+
+
+def _shard_stats(conn: sqlite3.Connection) -> Dict:
+    """Row count, cities and value ranges of the attached shard, for routing."""
+    stats = {"count": conn.execute("SELECT COUNT(*) FROM shard.real_estate").fetchone()[0]}
+    stats["cities"] = [city for (city,) in conn.execute("SELECT DISTINCT city FROM shard.real_estate")]
+    stats["ranges"] = {
+        column: list(conn.execute(f"SELECT MIN({column}), MAX({column}) FROM shard.real_estate").fetchone())
+        for column in RANGE_COLUMNS
+    }
+    return stats
+
+
+def write_shards(db_path: str = DB_PATH, directory: str = SHARD_DIR) -> str:
+    """Replaces `directory` with one database per state of `db_path`."""
+    with replacing_directory(directory) as staging:
+        # A temporary database, so the source is read once and indexed by state
+        # rather than scanned once per state
+        conn = sqlite3.connect("")
+        conn.execute("ATTACH DATABASE ? AS source", (db_path,))
+        columns = ", ".join(f'"{row[1]}"' for row in conn.execute("PRAGMA source.table_info(real_estate)"))
+        conn.execute(f"CREATE TABLE listings AS SELECT rowid AS source_rowid, {columns} FROM source.real_estate")
+        conn.execute("CREATE INDEX listings_state ON listings (state, source_rowid)")
+
+        indexes = conn.execute(
+            "SELECT sql FROM source.sqlite_master WHERE type = 'index' AND tbl_name = 'real_estate' AND sql IS NOT NULL"
+        ).fetchall()
+        shards = {}
+        states = [state for (state,) in conn.execute("SELECT DISTINCT state FROM listings")]
+        for state in states:
+            shard = _shard_file(state)
+            conn.execute("ATTACH DATABASE ? AS shard", (os.path.join(staging, shard),))
+            # Same column affinities as the source
+            conn.execute(f"CREATE TABLE shard.real_estate AS SELECT {columns} FROM source.real_estate WHERE 0")
+            conn.execute(
+                f"INSERT INTO shard.real_estate (rowid, {columns})"
+                f" SELECT source_rowid, {columns} FROM listings WHERE state IS ? ORDER BY source_rowid",
+                (state,),
+            )
+            # The source's indexes, so a shard plans a search as the whole table would
+            for (create_index,) in indexes:
+                conn.execute(create_index.replace("CREATE INDEX ", "CREATE INDEX shard.", 1))
+            if indexes:
+                conn.execute("ANALYZE shard")
+            conn.commit()
+            shards[shard] = {"state": state, **_shard_stats(conn)}
+            conn.execute("DETACH DATABASE shard")
+        conn.close()
+        with open(os.path.join(staging, MANIFEST), "w") as f:
+            json.dump({"shards": shards}, f)
+    return directory
+
+
+class ShardedListings(ListingBackend):
+    """Searches a directory written by `write_shards`, with a connection per shard and thread."""
+
+    name = "sharded"
+
+    def __init__(self, directory: str = SHARD_DIR, workers: int = SHARD_WORKERS):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.shards: Dict[str, Dict] = json.load(f)["shards"]
+        self.directory = directory
+        self.by_state = {stats["state"]: shard for shard, stats in self.shards.items()}
+        self.by_city: Dict[str, List[str]] = {}
+        for shard, stats in self.shards.items():
+            for city in stats["cities"]:
+                self.by_city.setdefault(city, []).append(shard)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+        self.local = threading.local()
+
+    def shards_for(self, criteria: Dict) -> List[str]:
+        """Shards that can hold matches: the state's, else the city's, minus any out of range."""
+        if criteria.get("state") is not None:
+            shard = self.by_state.get(criteria["state"])
+            candidates = [shard] if shard else []
+        elif criteria.get("city") is not None:
+            candidates = self.by_city.get(criteria["city"], [])
+        else:
+            candidates = list(self.shards)
+
+        def in_range(shard: str) -> bool:
+            for column, op, value in active_filters(criteria):
+                if column not in RANGE_COLUMNS:
+                    continue
+                if column not in self.shards[shard]["ranges"]:
+                    continue
+                low, high = self.shards[shard]["ranges"][column]
+                if (
+                    low is None
+                    or (op == "in" and not any(low <= v <= high for v in value))
+                    or (op == ">=" and high < value)
+                    or (op == ">" and high <= value)
+                    or (op == "<=" and low > value)
+                    or (op == "<" and low >= value)
+                ):
+                    return False
+            return True
+
+        return [shard for shard in candidates if in_range(shard)]
+
+    def _connection(self, shard: str) -> sqlite3.Connection:
+        connections = self.local.__dict__.setdefault("connections", {})
+        if shard not in connections:
+            connections[shard] = sqlite3.connect(os.path.join(self.directory, shard))
+        return connections[shard]
+
+    def _search_shard(self, shard: str, where: str, params: List, limit: int) -> List[Tuple[int, Dict]]:
+        """The shard's first `limit` matches, as (rowid, listing)."""
+        cursor = self._connection(shard).cursor()
+        with span(SQLITE_SECONDS, query="search_shard"):
+            cursor.execute(
+                f"SELECT rowid, * FROM real_estate WHERE {where} ORDER BY rowid LIMIT {int(limit)}",
+                params,
+            )
+            rows = cursor.fetchall()
+        column_names = [column[0] for column in cursor.description][1:]
+        cursor.close()
+        return [(row[0], dict(zip(column_names, row[1:]))) for row in rows]
+
+    def search(self, criteria: Dict, limit: int = 2) -> List[Dict]:
+        where, params = where_clause(criteria)
+        shards = self.shards_for(criteria)
+        if len(shards) == 1:
+            return [listing for _, listing in self._search_shard(shards[0], where, params, limit)]
+
+        per_shard = self.pool.map(lambda shard: self._search_shard(shard, where, params, limit), shards)
+        merged = heapq.merge(*per_shard, key=lambda match: match[0])
+        return [listing for _, listing in itertools.islice(merged, limit)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split listings into one SQLite file per state.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=SHARD_DIR)
+    args = parser.parse_args()
+    print(f"Shards written to {write_shards(args.db, args.dir)}")
+
+
+if __name__ == "__main__":
+    main()
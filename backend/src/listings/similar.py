@@ -0,0 +1,304 @@
+"""
+Similar listings: nearest neighbours in a normalised feature space.
+
+`SimilarityIndex.build` gives every listing with a price, bed, bath, house
+size and a zip code centroid (see src.listings.geo) one float32 vector:
+
+- log price, bed, bath and log house size, each standardised to mean 0 and
+  standard deviation 1;
+- its position north-south and east-west in units of LOCATION_MILES, so
+  homes that far apart differ as much as by one standard deviation of price.
+
+Listings missing any of these are left out. The vectors are stored as an
+inverted file (IVF): k-means splits them into about sqrt(n) lists, and a
+query only scores the vectors of the `nprobe` lists whose centroids are
+nearest rather than all of them. Features the query doesn't know are left
+out of its distances.
+
+The index holds rowids, so it records the load of `real_estate` it was built
+from (src.listings.current_load) and `similar_listings` refuses it once the
+table has been reloaded. csv_to_sql.py rebuilds it on every load while the
+database has zip centroids; to write it from
+a listings database with centroids, from the backend directory:
+    python -m src.listings.similar [--db data/real_estate_data.db] [--output data/similar.npz]
+"""
+
+import argparse
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.listings import DB_PATH, StaleLoad, current_load
+from src.listings.geo import MILES_PER_DEGREE_LATITUDE, center_of
+from src.util.metrics import SQLITE_SECONDS, span
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_INDEX_PATH = os.getenv(
+    "LISTINGS_SIMILAR_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "similar.npz"),
+)
+# Lists scored per query; more finds more of the true nearest, more slowly
+SIMILAR_NPROBE = int(os.getenv("SIMILAR_NPROBE", "8"))
+
+# Miles apart that count as much as one standard deviation of a feature
+LOCATION_MILES = 25.0
+FEATURES = ["price", "bed", "bath", "house_size", "north", "east"]
+# Standardised features; the position is already in comparable units
+STANDARDISED = 4
+
+KMEANS_ITERATIONS = 10
+# k-means trains on this many vectors per list, not the whole table
+TRAINING_PER_LIST = 64
+# Rows per distance matrix while assigning vectors to lists
+ASSIGN_CHUNK = 8192
+
+
+def _raw_features(price, bed, bath, house_size, latitude, longitude) -> np.ndarray:
+    """Feature columns before standardising; arguments are arrays or NaN for unknown."""
+    latitude, longitude = np.asarray(latitude, dtype=np.float64), np.asarray(longitude, dtype=np.float64)
+    miles_east = longitude * MILES_PER_DEGREE_LATITUDE * np.cos(np.radians(latitude))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.stack(
+            [
+                np.log(np.asarray(price, dtype=np.float64)),
+                np.asarray(bed, dtype=np.float64),
+                np.asarray(bath, dtype=np.float64),
+                np.log(np.asarray(house_size, dtype=np.float64)),
+                latitude * MILES_PER_DEGREE_LATITUDE / LOCATION_MILES,
+                miles_east / LOCATION_MILES,
+            ],
+            axis=-1,
+        )
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of each vector's nearest centroid, a chunk of vectors at a time."""
+    centroid_norms = (centroids**2).sum(axis=1)
+    nearest = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        chunk = vectors[start : start + ASSIGN_CHUNK]
+        # |v - c|^2 without the |v|^2 term, which is the same for every centroid
+        nearest[start : start + len(chunk)] = np.argmin(centroid_norms - 2 * chunk @ centroids.T, axis=1)
+    return nearest
+
+
+def _kmeans(vectors: np.ndarray, lists: int, rng: np.random.Generator) -> np.ndarray:
+    """Centroids of `lists` clusters of `vectors`, by Lloyd's algorithm on a sample."""
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), lists * TRAINING_PER_LIST), replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        nearest = _nearest(sample, centroids)
+        counts = np.bincount(nearest, minlength=lists)
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, nearest, sample)
+        # An empty list keeps its centroid
+        filled = counts > 0
+        centroids[filled] = (sums[filled] / counts[filled, None]).astype(centroids.dtype)
+    return centroids
+
+
+class SimilarityIndex:
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        vectors: np.ndarray,
+        ids: np.ndarray,
+        means: np.ndarray,
+        stds: np.ndarray,
+        load_id: str = "",
+    ):
+        """
+        IVF lists: list i holds vectors[offsets[i]:offsets[i + 1]], listing
+        rowids `ids` in the load of `real_estate` named `load_id`.
+        """
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.ids = ids
+        self.means = means
+        self.stds = stds
+        self.load_id = str(load_id)
+
+    @classmethod
+    def build(cls, db_path: str = DB_PATH, seed: int = 0) -> "SimilarityIndex":
+        start = time.monotonic()
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(
+            "SELECT real_estate.rowid, price, bed, bath, house_size, latitude, longitude"
+            " FROM real_estate JOIN zip_centroids USING (zip_code)"
+            " WHERE price > 0 AND bed IS NOT NULL AND bath IS NOT NULL AND house_size > 0"
+            " ORDER BY real_estate.rowid"
+        ).fetchall()
+        load_id = current_load(conn)
+        conn.close()
+        table = np.array(rows, dtype=np.float64).reshape(-1, 7)
+        ids = table[:, 0].astype(np.int64)
+        raw = _raw_features(*table[:, 1:].T)
+        del rows, table
+
+        means, stds = np.zeros(len(FEATURES)), np.ones(len(FEATURES))
+        if len(raw):
+            means[:STANDARDISED] = raw[:, :STANDARDISED].mean(axis=0)
+            stds[:STANDARDISED] = raw[:, :STANDARDISED].std(axis=0)
+            stds[stds == 0] = 1
+        vectors = ((raw - means) / stds).astype(np.float32)
+        del raw
+
+        lists = max(1, math.isqrt(len(vectors)))
+        centroids = _kmeans(vectors, lists, np.random.default_rng(seed)) if len(vectors) else vectors[:0]
+        nearest = _nearest(vectors, centroids)
+        order = np.argsort(nearest, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(nearest, minlength=lists))]).astype(np.int64)
+        index = cls(centroids, offsets, vectors[order], ids[order], means, stds, load_id)
+        logger.info(
+            f"Indexed {len(ids)} listings in {lists} lists, {index.nbytes() / 2**20:.0f}MiB,"
+            f" in {time.monotonic() - start:.1f}s"
+        )
+        return index
+
+    def save(self, path: str = SIMILAR_INDEX_PATH) -> str:
+        """Writes the index to `path`, replacing any older one in a single rename."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                offsets=self.offsets,
+                vectors=self.vectors,
+                ids=self.ids,
+                means=self.means,
+                stds=self.stds,
+                load_id=np.array(self.load_id),
+            )
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str = SIMILAR_INDEX_PATH) -> "SimilarityIndex":
+        with np.load(path) as arrays:
+            # An index saved before loads had ids matches no load that has one
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    def nbytes(self) -> int:
+        return self.centroids.nbytes + self.offsets.nbytes + self.vectors.nbytes + self.ids.nbytes
+
+    def query_vector(
+        self,
+        price: Optional[float] = None,
+        bed: Optional[float] = None,
+        bath: Optional[float] = None,
+        house_size: Optional[float] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """The listing's vector and weights that drop the features it doesn't have."""
+        known = [np.nan if v is None else v for v in (price, bed, bath, house_size, latitude, longitude)]
+        vector = (_raw_features(*known) - self.means) / self.stds
+        weights = np.isfinite(vector).astype(np.float32)
+        return np.nan_to_num(vector).astype(np.float32), weights
+
+    def search(
+        self, vector: np.ndarray, weights: np.ndarray, k: int, nprobe: int = SIMILAR_NPROBE
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Rowids of about the `k` nearest listings and their squared distances, nearest first."""
+        probe_distances = ((self.centroids - vector) ** 2) @ weights
+        nprobe = min(nprobe, len(self.centroids))
+        probes = np.argpartition(probe_distances, nprobe - 1)[:nprobe] if nprobe else []
+        rows = np.concatenate([np.arange(self.offsets[p], self.offsets[p + 1]) for p in probes] or [[]])
+        return self._top(rows.astype(np.int64), vector, weights, k)
+
+    def brute_force(self, vector: np.ndarray, weights: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The exact `k` nearest, scoring every vector."""
+        return self._top(np.arange(len(self.vectors)), vector, weights, k)
+
+    def _top(self, rows: np.ndarray, vector: np.ndarray, weights: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances = ((self.vectors[rows] - vector) ** 2) @ weights
+        if len(rows) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            rows, distances = rows[nearest], distances[nearest]
+        order = np.argsort(distances, kind="stable")
+        return self.ids[rows[order]], distances[order]
+
+
+_loaded: Dict[str, Tuple[float, SimilarityIndex]] = {}
+_load_lock = threading.Lock()
+
+
+def get_similarity_index(path: str = SIMILAR_INDEX_PATH) -> SimilarityIndex:
+    """The index saved at `path`, reloaded when ingest replaces the file."""
+    mtime = os.stat(path).st_mtime
+    with _load_lock:
+        if path not in _loaded or _loaded[path][0] != mtime:
+            _loaded[path] = (mtime, SimilarityIndex.load(path))
+        return _loaded[path][1]
+
+
+def similar_listings(
+    listing: Dict, k: int = 3, db_path: str = DB_PATH, index: Optional[SimilarityIndex] = None
+) -> List[Dict]:
+    """
+    Up to `k` listings like `listing` (real_estate columns, any of them
+    missing), nearest first. The listing itself is skipped when its zip code
+    and street are given. Raises StaleLoad when the index was
+    built from another load of the table.
+    """
+    index = get_similarity_index() if index is None else index
+    conn = sqlite3.connect(db_path)
+    try:
+        load_id = current_load(conn)
+        if index.load_id != load_id:
+            raise StaleLoad(
+                f"Similarity index is from load {index.load_id or 'unknown'}, the listings"
+                f" from {load_id or 'unknown'}; rebuild it with python -m src.listings.similar"
+            )
+        center = None
+        if listing.get("zip_code") is not None:
+            center = center_of(conn, {"near_zip": listing["zip_code"]})
+        if center is None and listing.get("city") is not None:
+            center = center_of(conn, {"city": listing["city"], "state": listing.get("state")})
+        latitude, longitude = center if center else (None, None)
+        vector, weights = index.query_vector(
+            listing.get("price"), listing.get("bed"), listing.get("bath"), listing.get("house_size"),
+            latitude, longitude,
+        )
+        if not weights.any():
+            return []
+        # One extra in case the listing itself is among them
+        ids, _ = index.search(vector, weights, k + 1)
+        with span(SQLITE_SECONDS, query="similar_listings"):
+            cursor = conn.execute(
+                f"SELECT rowid, * FROM real_estate WHERE rowid IN ({', '.join('?' * len(ids))})",
+                [int(i) for i in ids],
+            )
+            column_names = [column[0] for column in cursor.description][1:]
+            by_id = {row[0]: dict(zip(column_names, row[1:])) for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+    same = (str(listing.get("zip_code") or "").zfill(5), listing.get("street"))
+    results = [
+        by_id[i]
+        for i in ids.tolist()
+        if i in by_id and (listing.get("street") is None or (by_id[i]["zip_code"], by_id[i]["street"]) != same)
+    ]
+    return results[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the similar-listings index.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--output", default=SIMILAR_INDEX_PATH)
+    args = parser.parse_args()
+    print(f"Similarity index written to {SimilarityIndex.build(args.db).save(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
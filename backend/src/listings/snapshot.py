@@ -0,0 +1,223 @@
+"""
+Immutable, memory-mapped listing snapshots shared by every worker.
+
+A snapshot is one file holding the numpy backend's encoded columns and sort
+indexes as fixed-width arrays, behind a JSON header with their dtypes and
+offsets and the string dictionaries:
+
+    b"LSNAP1\\n" | header length (8 bytes, little endian) | JSON header | arrays
+
+Workers map the file read-only and wrap the arrays in place, so any number of
+them share one page-cache copy. Files are never modified: each ingest writes
+`listings-<version>.snap` next to the others, then atomically replaces the
+`CURRENT` file naming the active version. Running workers notice the new
+version within SNAPSHOT_CHECK_SECONDS and swap to it between searches.
+
+Build a snapshot from a listings database, from the backend directory:
+    python -m src.listings.snapshot [--db data/real_estate_data.db] [--dir data/snapshots]
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.listings import DB_PATH, ListingBackend
+from src.listings.numpy_backend import NumpyListings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv(
+    "LISTINGS_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "snapshots"),
+)
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "5"))
+# Older versions are deleted once this many newer ones exist; workers still
+# mapping one keep its pages until they swap
+SNAPSHOT_KEEP = 3
+
+MAGIC = b"LSNAP1\n"
+ALIGNMENT = 64
+CURRENT = "CURRENT"
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_snapshot(
+    listings: NumpyListings, directory: str = SNAPSHOT_DIR, version: Optional[str] = None
+) -> str:
+    """Writes `listings` as a new snapshot version and makes it current."""
+    os.makedirs(directory, exist_ok=True)
+    version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+    blobs = {f"column:{name}": array for name, array in listings.arrays.items()}
+    for column, (order, values) in listings.indexes.items():
+        blobs[f"order:{column}"] = order
+        blobs[f"sorted:{column}"] = values
+
+    # Offsets are relative to the end of the header, so they can be laid out
+    # before the header's own length is known
+    layout, offset = {}, 0
+    for key, array in blobs.items():
+        layout[key] = {"dtype": array.dtype.str, "offset": offset, "length": len(array)}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps(
+        {
+            "version": version,
+            "size": listings.size,
+            "names": listings.names,
+            "python_types": {name: t.__name__ for name, t in listings.python_types.items()},
+            "dictionaries": listings.dictionaries,
+            "arrays": layout,
+        }
+    ).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    path = os.path.join(directory, f"listings-{version}.snap")
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(MAGIC + len(header).to_bytes(8, "little") + header)
+        for key, array in blobs.items():
+            f.seek(data_start + layout[key]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+        # Extends the file over every array's region, even when the trailing
+        # ones are empty, e.g. for an empty table
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _set_current(directory, version)
+    _prune(directory, version)
+    return path
+
+
+def _set_current(directory: str, version: str) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(directory, CURRENT))
+
+
+def _prune(directory: str, current: str) -> None:
+    versions = sorted(
+        name[len("listings-"):-len(".snap")]
+        for name in os.listdir(directory)
+        if name.startswith("listings-") and name.endswith(".snap")
+    )
+    for version in versions[:-SNAPSHOT_KEEP]:
+        if version != current:
+            os.remove(os.path.join(directory, f"listings-{version}.snap"))
+
+
+def current_version(directory: str = SNAPSHOT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, CURRENT)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def open_snapshot(path: str) -> NumpyListings:
+    """Maps a snapshot file; the arrays read straight from the shared mapping."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"Not a listings snapshot: {path}")
+    header_length = int.from_bytes(buffer[len(MAGIC) : len(MAGIC) + 8], "little")
+    header_start = len(MAGIC) + 8
+    header = json.loads(buffer[header_start : header_start + header_length])
+    data_start = _aligned(header_start + header_length)
+
+    def array(key: str) -> np.ndarray:
+        spec = header["arrays"][key]
+        if spec["length"] == 0:
+            # Snapshots written before the file was padded end before it
+            return np.empty(0, dtype=spec["dtype"])
+        return np.frombuffer(
+            buffer, dtype=spec["dtype"], count=spec["length"], offset=data_start + spec["offset"]
+        )
+
+    indexes = {}
+    for key in header["arrays"]:
+        kind, column = key.split(":", 1)
+        if kind == "order":
+            indexes[column] = (array(key), array(f"sorted:{column}"))
+    types = {"int": int, "float": float}
+    return NumpyListings(
+        {name: array(f"column:{name}") for name in header["names"]},
+        header["dictionaries"],
+        {name: types[t] for name, t in header["python_types"].items()},
+        indexes,
+    )
+
+
+class SnapshotListings(ListingBackend):
+    """The current snapshot of a directory, swapped for newer versions as they appear."""
+
+    name = "snapshot"
+
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+        self.listings: Optional[NumpyListings] = None
+        self.version: Optional[str] = None
+        self.checked_at = 0.0
+        self.swaps = 0
+        self.lock = threading.Lock()
+        self.refresh()
+        if self.listings is None:
+            raise FileNotFoundError(f"No listings snapshot in {directory}; run data/csv_to_sql.py")
+
+    def refresh(self) -> bool:
+        """Maps the current version if it changed; True if it did."""
+        with self.lock:
+            self.checked_at = time.monotonic()
+            version = current_version(self.directory)
+            if version is None or version == self.version:
+                return False
+            path = os.path.join(self.directory, f"listings-{version}.snap")
+            # Searches already running keep the old mapping until they finish
+            self.listings = open_snapshot(path)
+            self.version = version
+            self.swaps += 1
+            logger.info(f"Mapped listings snapshot {version} ({self.listings.size} listings)")
+            return True
+
+    def current(self) -> NumpyListings:
+        if time.monotonic() - self.checked_at > SNAPSHOT_CHECK_SECONDS:
+            self.refresh()
+        return self.listings
+
+    def search(self, criteria: Dict, limit: int = 2) -> List[Dict]:
+        return self.current().search(criteria, limit)
+
+    def nbytes(self) -> int:
+        return self.current().nbytes()
+
+
+def build_snapshot(db_path: str = DB_PATH, directory: str = SNAPSHOT_DIR) -> str:
+    """Encodes the `real_estate` table of `db_path` into a new current snapshot."""
+    return write_snapshot(NumpyListings.from_sqlite(db_path), directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a listings snapshot from a SQLite database.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+    print(f"Snapshot written to {build_snapshot(args.db, args.dir)}")
+
+
+if __name__ == "__main__":
+    main()
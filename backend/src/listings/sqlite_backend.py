@@ -0,0 +1,45 @@
+import sqlite3
+from typing import Dict, List, Tuple
+
+from src.listings import ListingBackend, active_filters
+from src.util.metrics import SQLITE_SECONDS, span
+
+
+def where_clause(criteria: Dict) -> Tuple[str, List]:
+    """SQL condition and parameters for the criteria's filters."""
+    conditions, params = ["1 = 1"], []
+    for column, op, value in active_filters(criteria):
+        if op == "in":
+            conditions.append(f"{column} IN ({', '.join('?' * len(value))})" if value else "0 = 1")
+            params.extend(value)
+        else:
+            conditions.append(f"{column} {op} ?")
+            params.append(value)
+    return " AND ".join(conditions), params
+
+
+class SqliteListings(ListingBackend):
+    """Searches the `real_estate` table of a SQLite file, one connection per query."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def search(self, criteria: Dict, limit: int = 2) -> List[Dict]:
+        conn = sqlite3.connect(self.path)
+        cursor = conn.cursor()
+
+        where, params = where_clause(criteria)
+        # In listing order whichever index answers the filters
+        query = f"SELECT * FROM real_estate WHERE {where} ORDER BY rowid LIMIT {int(limit)}"
+
+        with span(SQLITE_SECONDS, query="search_listings"):
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        column_names = [column[0] for column in cursor.description]
+        results = [dict(zip(column_names, row)) for row in rows]
+
+        cursor.close()
+        conn.close()
+        return results
@@ -0,0 +1,263 @@
+"""
+Precomputed answers for the most searched markets.
+
+Most searches name a city and state, sometimes a minimum number of bedrooms,
+and little else. `QueryLog` counts those searches per (state, city) and
+(state, city, bedrooms) in a SQLite file shared by the workers. `WarmCache`
+takes the WARM_CACHE_KEYS most searched of those keys and keeps, for each,
+the first WARM_CACHE_LISTINGS listings the worker's backend returns and a
+summary of the market (listings, price range, average price and price per
+square foot). A search with exactly such criteria is then a dict lookup.
+
+The cache is built when the worker starts and rebuilt in the background
+when the listings database file changes, or the snapshot the backend maps
+does, i.e. after an ingest; until then those searches go to the backend.
+Memory is bounded by WARM_CACHE_KEYS x WARM_CACHE_LISTINGS listings.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.listings import DB_PATH, ListingBackend, get_listing_backend
+from src.util.metrics import LISTING_WARM_CACHE
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_PATH = os.getenv(
+    "QUERY_LOG_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "query_log.db"),
+)
+# Searches are counted in memory and added to the file at most this often
+QUERY_LOG_FLUSH_SECONDS = float(os.getenv("QUERY_LOG_FLUSH_SECONDS", "60"))
+WARM_CACHE_KEYS = int(os.getenv("WARM_CACHE_KEYS", "256"))
+WARM_CACHE_LISTINGS = int(os.getenv("WARM_CACHE_LISTINGS", "10"))
+WARM_CACHE_CHECK_SECONDS = float(os.getenv("WARM_CACHE_CHECK_SECONDS", "5"))
+
+# (state, city, minimum bedrooms or 0 for any)
+Key = Tuple[str, str, int]
+
+
+def cache_key(criteria: Dict) -> Optional[Key]:
+    """The warm cache key of a search by city and state, and optionally bedrooms, alone."""
+    given = {key: value for key, value in criteria.items() if value is not None}
+    if not given.keys() <= {"state", "city", "min_bedroom"} or not {"state", "city"} <= given.keys():
+        return None
+    bed = given.get("min_bedroom", 0)
+    # As a filter, 0 bedrooms would still exclude listings without a bed count
+    if "min_bedroom" in given and (isinstance(bed, bool) or not float(bed).is_integer() or bed < 1):
+        return None
+    return (given["state"], given["city"], int(bed))
+
+
+def key_criteria(key: Key) -> Dict:
+    state, city, bed = key
+    return {"state": state, "city": city, **({"min_bedroom": bed} if bed else {})}
+
+
+class QueryLog:
+    """Searches per warm cache key, accumulated across workers in a SQLite file."""
+
+    def __init__(self, path: str = QUERY_LOG_PATH, flush_seconds: float = QUERY_LOG_FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.pending: Counter = Counter()
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS query_counts (
+                state TEXT NOT NULL,
+                city TEXT NOT NULL,
+                bed INTEGER NOT NULL,
+                searches INTEGER NOT NULL,
+                PRIMARY KEY (state, city, bed)
+            )
+            """
+        )
+        return conn
+
+    def record(self, key: Key) -> None:
+        with self.lock:
+            self.pending[key] += 1
+            due = time.monotonic() - self.flushed_at > self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO query_counts VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT DO UPDATE SET searches = searches + excluded.searches",
+                    [(*key, count) for key, count in pending.items()],
+                )
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Query log not written: {e}")
+
+    def top(self, count: int) -> List[Tuple[Key, int]]:
+        """The `count` most searched keys and their searches, most first."""
+        self.flush()
+        try:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT state, city, bed, searches FROM query_counts ORDER BY searches DESC LIMIT ?", (count,)
+            ).fetchall()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Query log not read: {e}")
+            return []
+        return [((state, city, bed), searches) for state, city, bed, searches in rows]
+
+
+def market_summaries(conn: sqlite3.Connection, keys: List[Key]) -> Dict[Key, Dict]:
+    """
+    Listings, price range and averages of the listings matching each key,
+    from one pass over each city's listings by bedrooms.
+    """
+    by_city: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+    for state, city, bed in keys:
+        by_city[(state, city)].append(bed)
+    summaries = {}
+    for (state, city), beds in by_city.items():
+        groups = conn.execute(
+            "SELECT bed, COUNT(*), MIN(price), MAX(price), SUM(price), COUNT(price),"
+            " SUM(price_per_sqft), COUNT(price_per_sqft)"
+            " FROM real_estate WHERE state = ? AND city = ? GROUP BY bed",
+            (state, city),
+        ).fetchall()
+        for min_bed in beds:
+            # As in a search, a minimum excludes listings without a bed count
+            rows = [row for row in groups if not min_bed or (row[0] is not None and row[0] >= min_bed)]
+            priced = sum(row[5] for row in rows)
+            measured = sum(row[7] for row in rows)
+            summaries[(state, city, min_bed)] = {
+                "listings": sum(row[1] for row in rows),
+                "min_price": min((row[2] for row in rows if row[2] is not None), default=None),
+                "max_price": max((row[3] for row in rows if row[3] is not None), default=None),
+                "average_price": round(sum(row[4] or 0 for row in rows) / priced, -3) if priced else None,
+                "average_price_per_sqft": round(sum(row[6] or 0 for row in rows) / measured) if measured else None,
+            }
+    return summaries
+
+
+class WarmCache:
+    """Listings and market summaries of the most searched keys, for the worker's backend."""
+
+    def __init__(
+        self,
+        backend: Callable[[], ListingBackend] = get_listing_backend,
+        query_log: Optional[QueryLog] = None,
+        db_path: str = DB_PATH,
+        keys: int = WARM_CACHE_KEYS,
+        listings: int = WARM_CACHE_LISTINGS,
+    ):
+        self.backend = backend
+        self.query_log = query_log or QueryLog()
+        self.db_path = db_path
+        self.keys = keys
+        self.listings = listings
+        # key -> (first listings, every match is among them, market summary)
+        self.entries: Dict[Key, Tuple[List[Dict], bool, Dict]] = {}
+        self.version = None
+        self.checked_at = 0.0
+        self.refreshing = threading.Lock()
+
+    def current_version(self):
+        """What the entries depend on: the database file and, if any, the backend's snapshot."""
+        try:
+            mtime = os.stat(self.db_path).st_mtime
+        except OSError:
+            mtime = None
+        return (mtime, getattr(self.backend(), "version", None))
+
+    def refresh(self) -> int:
+        """
+        Rebuilds the entries from the query log and the backend; returns how
+        many keys are warm. If the backend fails, the cache stays cold until
+        the listings change again, and searches go to the backend.
+        """
+        with self.refreshing:
+            start = time.monotonic()
+            version = self.current_version()
+            try:
+                entries = self._build()
+            except Exception as e:
+                logger.exception(f"Warm cache not built, starting cold: {e}")
+                entries = {}
+            # Searches read either the old entries or the new ones, never a mix
+            self.entries = entries
+            self.version = version
+            self.checked_at = time.monotonic()
+            if entries:
+                logger.info(f"Warm cache built for {len(entries)} keys in {time.monotonic() - start:.2f}s")
+            return len(entries)
+
+    def _build(self) -> Dict[Key, Tuple[List[Dict], bool, Dict]]:
+        backend = self.backend()
+        keys = [key for key, _ in self.query_log.top(self.keys)]
+        conn = sqlite3.connect(self.db_path)
+        try:
+            summaries = market_summaries(conn, keys)
+        except sqlite3.Error as e:
+            logger.warning(f"No market summaries: {e}")
+            summaries = {}
+        finally:
+            conn.close()
+        entries = {}
+        for key in keys:
+            rows = backend.search(key_criteria(key), self.listings)
+            entries[key] = (rows, len(rows) < self.listings, summaries.get(key, {}))
+        return entries
+
+    def _check(self) -> None:
+        """Starts a rebuild once the listings change, dropping entries that no longer hold."""
+        if time.monotonic() - self.checked_at < WARM_CACHE_CHECK_SECONDS:
+            return
+        self.checked_at = time.monotonic()
+        if self.current_version() == self.version or self.refreshing.locked():
+            return
+        self.entries = {}
+        threading.Thread(target=self.refresh, name="warm-cache-refresh", daemon=True).start()
+
+    def lookup(self, criteria: Dict, limit: int = 2) -> Optional[Tuple[List[Dict], Dict]]:
+        """The first `limit` listings and the market summary, if `criteria` is a warm key."""
+        key = cache_key(criteria)
+        if key is None:
+            LISTING_WARM_CACHE.inc(outcome="uncacheable")
+            return None
+        self.query_log.record(key)
+        self._check()
+        entry = self.entries.get(key)
+        if entry is None or (limit > len(entry[0]) and not entry[1]):
+            LISTING_WARM_CACHE.inc(outcome="miss")
+            return None
+        LISTING_WARM_CACHE.inc(outcome="hit")
+        return entry[0][:limit], entry[2]
+
+    def summary(self, criteria: Dict) -> Optional[Dict]:
+        key = cache_key(criteria)
+        entry = self.entries.get(key) if key is not None else None
+        return entry[2] if entry else None
+
+
+@lru_cache(maxsize=None)
+def get_warm_cache() -> WarmCache:
+    """The worker's warm cache, for its listing backend."""
+    return WarmCache()
@@ -1,16 +1,16 @@
 from datetime import datetime
 import os
 import logging
-from typing import List, Dict, Optional, Any
-from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
+from typing import TYPE_CHECKING, List, Dict, Optional, Any
 from langchain_core.tools import tool
-from twilio.rest import Client
 
 from src.util.state import State
+from src.util.metrics import CALENDAR_SECONDS, span
+
+# The Google client libraries are slow to import, so they are only loaded
+# when a calendar tool actually runs.
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 # from src.util.g_cal_functions import get_calendar_service
 
@@ -27,8 +27,17 @@ calendar_id = "saminkhann1@gmail.com"
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 TIMEZONE = None
 
+# Used instead of Google Calendar when set, e.g. a stub for offline replay
+_calendar_service: Any = None
+
+
+def set_calendar_service(service: Any) -> None:
+    """Serve calendar tools from `service` instead of Google, or restore Google with None."""
+    global _calendar_service
+    _calendar_service = service
 
-def get_calendar_service(credentials: Optional[Credentials] = None) -> Any:
+
+def get_calendar_service(credentials: Optional["Credentials"] = None) -> Any:
     """
     Create and return a Google Calendar service object.
 
@@ -43,6 +52,15 @@ def get_calendar_service(credentials: Optional[Credentials] = None) -> Any:
         HttpError: If there's an error in the API request.
         RuntimeError: For other unexpected errors.
     """
+    if _calendar_service is not None and not credentials:
+        return _calendar_service
+
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+
     try:
         if not credentials:
             if os.path.exists("token.json"):
@@ -82,13 +100,19 @@ def get_calendar_service(credentials: Optional[Credentials] = None) -> Any:
         raise RuntimeError(f"Unexpected error creating Calendar service: {str(e)}")
 
 
+def execute(request: Any, operation: str) -> Any:
+    """Execute a Calendar API request, timing it into /metrics."""
+    with span(CALENDAR_SECONDS, operation=operation):
+        return request.execute()
+
+
 def get_user_timezone(service):
     try:
-        timezone_setting = service.settings().get(setting="timezone").execute()
-        print(f"user's timezone: {timezone_setting.get('value')}")
+        timezone_setting = execute(service.settings().get(setting="timezone"), "settings.get")
+        logger.info(f"User's timezone: {timezone_setting.get('value')}")
         return timezone_setting.get("value")
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error(f"An error occurred while reading the timezone: {e}")
         return None
 
 
@@ -128,6 +152,8 @@ def create_event(
     if "attendees" not in event_body or not event_body["attendees"]:
         raise ValueError("At least one attendee with an email is required")
 
+    from googleapiclient.errors import HttpError
+
     try:
         service = get_calendar_service()
 
@@ -149,7 +175,7 @@ def create_event(
             request_params["supportsAttachments"] = supports_attachments
 
         
-        event = service.events().insert(**request_params).execute()
+        event = execute(service.events().insert(**request_params), "events.insert")
         return f"Appointment created: {event}."
     except HttpError as error:
         logger.error(f"An error occurred while creating event: {error}")
@@ -176,19 +202,20 @@ def list_events(
     """
     global TIMEZONE
 
+    from googleapiclient.errors import HttpError
+
     try:
         service = get_calendar_service()
-        events = (
-            service.events()
-            .list(
+        events = execute(
+            service.events().list(
                 calendarId=calendar_id,
                 timeMin=time_min,
                 timeMax=time_max,
                 timeZone=TIMEZONE,
                 singleEvents=True,
                 orderBy="startTime",
-            )
-            .execute()
+            ),
+            "events.list",
         )
         return events.get("items", [])
     except HttpError as error:
@@ -208,13 +235,18 @@ def delete_event(event_id: str, send_updates: str = "all") -> None:
     Raises:
         HttpError: If there's an error in the API request.
     """
+    from googleapiclient.errors import HttpError
+
     try:
         service = get_calendar_service()
-        service.events().delete(
-            calendarId=calendar_id,
-            eventId=event_id,
-            sendUpdates=send_updates,
-        ).execute()
+        execute(
+            service.events().delete(
+                calendarId=calendar_id,
+                eventId=event_id,
+                sendUpdates=send_updates,
+            ),
+            "events.delete",
+        )
         return "Appointment deleted."
     except HttpError as error:
         logger.error(f"An error occurred while deleting event: {error}")
@@ -236,6 +268,8 @@ def get_event(
     Raises:
         HttpError: If there's an error in the API request.
     """
+    from googleapiclient.errors import HttpError
+
     try:
         service = get_calendar_service()
         request_params = {
@@ -243,7 +277,7 @@ def get_event(
             "eventId": event_id,
         }
 
-        return service.events().get(**request_params).execute()
+        return execute(service.events().get(**request_params), "events.get")
     except HttpError as error:
         logger.error(f"An error occurred while retrieving event: {error}")
         raise
@@ -271,15 +305,16 @@ def update_event(
     if not updated_event_data:
         raise ValueError("updated_event_data is required")
 
+    from googleapiclient.errors import HttpError
+
     try:
         service = get_calendar_service()
         event = get_event(event_id)
 
         event.update(updated_event_data)
-        updated_event = (
-            service.events()
-            .update(calendarId=calendar_id, eventId=event_id, body=event)
-            .execute()
+        updated_event = execute(
+            service.events().update(calendarId=calendar_id, eventId=event_id, body=event),
+            "events.update",
         )
 
         return f"Appointment updated: {updated_event}"
@@ -302,13 +337,18 @@ def send_confirmation(confirmation: str) -> str:
     Raises:
         HttpError: If there's an error in the API request.
     """
+    from googleapiclient.errors import HttpError
+
     try:
         # twilio_client.messages.create(
         #     body=confirmation,
         #     from_=phone_number_from,
         #     to=phone_number_to,
         # )
-        print(confirmation)
+        # The text has the user's name, contact details and appointment, so
+        # INFO only records that it was sent; the turn's trace id identifies it
+        logger.info("Confirmation text sent", extra={"chars": len(confirmation)})
+        logger.debug("Confirmation text", extra={"payload": confirmation})
     except HttpError as error:
         logger.error(f"An error occurred while sending confirmation text: {error}")
         raise
@@ -325,9 +365,11 @@ def get_calendar_list() -> List[Dict[str, Any]]:
     Raises:
         HttpError: If there's an error in the API request.
     """
+    from googleapiclient.errors import HttpError
+
     try:
         service = get_calendar_service()
-        calendar_list = service.calendarList().list().execute()
+        calendar_list = execute(service.calendarList().list(), "calendarList.list")
         return calendar_list.get("items", [])
     except HttpError as error:
         logger.error(f"An error occurred while retrieving calendar list: {error}")
@@ -363,6 +405,8 @@ def get_freebusy_info(
     if not start_time or not end_time:
         raise ValueError("start_time and end_time are required")
 
+    from googleapiclient.errors import HttpError
+
     try:
         service = get_calendar_service()
         body = {
@@ -372,7 +416,7 @@ def get_freebusy_info(
             "items": [{"id": calendar_id} for calendar_id in calendar_ids],
         }
 
-        freebusy_result = service.freebusy().query(body=body).execute()
+        freebusy_result = execute(service.freebusy().query(body=body), "freebusy.query")
         return freebusy_result["calendars"]
     except HttpError as error:
         logger.error(f"An error occurred while checking availability: {error}")
@@ -1,12 +1,25 @@
+from typing import Callable
 from langgraph.prebuilt import ToolNode
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import HumanMessage, ToolMessage
 from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 
 from src.util.state import State
+from src.util.latency_budget import choose_model
+from src.util.llm_scheduler import LlmOverloaded
+from src.util.metrics import NODE_SECONDS, span
 
 class Assistant:
-    def __init__(self, runnable: Runnable, append_tool_message: bool = False):
-        self.runnable = runnable
+    def __init__(
+        self,
+        node: str,
+        get_runnable: Callable[[str], Runnable],
+        append_tool_message: bool = False,
+    ):
+        # The runnable is built on first use, for whichever model the turn's
+        # latency budget allows, so importing the graph doesn't construct any
+        # LLM clients.
+        self.node = node
+        self.get_runnable = get_runnable
         self.append_tool_message = append_tool_message
 
     def __call__(self, state: State, config: RunnableConfig):
@@ -22,7 +35,11 @@ class Assistant:
                 )
                 state["messages"].append(tool_message)
                 
-            result = self.runnable.invoke(state)
+            # Answering the user directly usually ends the turn; routing on a
+            # fresh user message means at least one more LLM call follows.
+            calls_after = 1 if isinstance(last_message, HumanMessage) else 0
+            model = choose_model(self.node, config, calls_after)
+            result = self.get_runnable(model).invoke(state)
 
             if not result.tool_calls and (
                 not result.content
@@ -50,6 +67,9 @@ def back_to_main(state: State) -> dict:
 
 def handle_tool_error(state) -> dict:
     error = state.get("error")
+    if isinstance(error, LlmOverloaded):
+        # A shed turn gets the busy message, not a retry prompt
+        raise error
     tool_calls = state["messages"][-1].tool_calls
     return {
         "messages": [
@@ -61,6 +81,17 @@ def handle_tool_error(state) -> dict:
         ]
     }
 
+def timed_node(name: str, node) -> Runnable:
+    """Wrap a graph node so each run is timed into graph_node_duration_seconds."""
+    runnable = node if isinstance(node, Runnable) else RunnableLambda(node)
+
+    def run(state: State, config: RunnableConfig):
+        channel = config.get("configurable", {}).get("channel", "")
+        with span(NODE_SECONDS, node=name, channel=channel):
+            return runnable.invoke(state, config)
+
+    return RunnableLambda(run, name=name)
+
 def create_tool_node(tools: list) -> dict:
     return ToolNode(tools).with_fallbacks(
         [RunnableLambda(handle_tool_error)], exception_key="error"
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from langchain_core.pydantic_v1 import BaseModel, Field
 
 class ToSearchAgent(BaseModel):
@@ -7,6 +9,29 @@ class ToSearchAgent(BaseModel):
         description="Any additional information or requests from the user regarding their search criteria."
     )
 
+class FindSimilarListings(BaseModel):
+    """Finds homes similar to a listing the user liked, by price, size, bedrooms, bathrooms and location.
+    Fill in the details of that listing from the search results."""
+
+    price: Optional[float] = Field(description="The liked listing's price.")
+    bed: Optional[int] = Field(description="The liked listing's number of bedrooms.")
+    bath: Optional[int] = Field(description="The liked listing's number of bathrooms.")
+    house_size: Optional[int] = Field(description="The liked listing's size in square feet.")
+    zip_code: Optional[str] = Field(description="The liked listing's zip code.")
+    city: Optional[str] = Field(description="The liked listing's city, used when there's no zip code.")
+    state: Optional[str] = Field(description="The liked listing's state.")
+    street: Optional[int] = Field(description="The liked listing's street number, so it isn't suggested again.")
+    count: int = Field(default=3, description="How many similar homes to find.")
+
+class SaveSearch(BaseModel):
+    """Saves the user's current home search, so they're told when new listings match it.
+    Call it when the user asks to hear about new homes; set stop when they no longer want to,
+    such as when they say "cancel alerts", which every alert tells them to reply."""
+
+    stop: bool = Field(
+        default=False, description='Stop alerts for the saved search instead, as when the user says "cancel alerts".'
+    )
+
 class ToAppointmentAgent(BaseModel):
     """Transfers work to a specialized agent to manage appointments: book, edit, cancel, show appointments etc."""
 
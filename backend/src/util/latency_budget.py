@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from langchain_core.runnables import RunnableConfig
+
+from src.util.llm import DEFAULT_MODEL
+
+# Seconds a whole turn may take, per channel. Callers on the phone notice
+# anything over a couple of seconds; chat and SMS users are more patient.
+TURN_BUDGETS = {
+    "voice": float(os.getenv("TURN_BUDGET_VOICE", "2.5")),
+    "web": float(os.getenv("TURN_BUDGET_WEB", "20")),
+    "sms": float(os.getenv("TURN_BUDGET_SMS", "30")),
+}
+
+# (primary, fast) model per LLM node. Override with NODE_MODELS, e.g.
+# NODE_MODELS='{"main_agent": ["gpt-4o", "gpt-4o-mini"]}'
+NODE_MODELS: Dict[str, Tuple[str, str]] = {
+    "main_agent": (DEFAULT_MODEL, "gpt-4.1-nano"),
+    "search_criteria_agent": (DEFAULT_MODEL, "gpt-4.1-nano"),
+    "appointment_agent": (DEFAULT_MODEL, DEFAULT_MODEL),
+}
+NODE_MODELS.update(
+    {node: tuple(models) for node, models in json.loads(os.getenv("NODE_MODELS", "{}")).items()}
+)
+
+# Expected call latency before any calls have been observed, and how much
+# the observed average moves with each new call
+INITIAL_LATENCY = 1.0
+LATENCY_SMOOTHING = 0.2
+
+_latencies: Dict[str, float] = {}
+_latencies_lock = threading.Lock()
+
+
+def start_turn(config: RunnableConfig, channel: str) -> RunnableConfig:
+    """Return a copy of `config` carrying the deadline for this turn."""
+    deadline = time.monotonic() + TURN_BUDGETS.get(channel, TURN_BUDGETS["web"])
+    return {**config, "configurable": {**config["configurable"], "deadline": deadline}}
+
+
+def remaining_budget(config: Optional[RunnableConfig]) -> Optional[float]:
+    """Seconds left in the turn, or None if the turn has no deadline."""
+    deadline = ((config or {}).get("configurable") or {}).get("deadline")
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def record_latency(model: str, seconds: float) -> None:
+    with _latencies_lock:
+        previous = _latencies.get(model, seconds)
+        _latencies[model] = previous + LATENCY_SMOOTHING * (seconds - previous)
+
+
+def expected_latency(model: str) -> float:
+    with _latencies_lock:
+        return _latencies.get(model, INITIAL_LATENCY)
+
+
+def fits_budget(config: Optional[RunnableConfig], model: str, calls: int = 1) -> bool:
+    """Whether `calls` more calls to `model` are expected to fit in the turn."""
+    remaining = remaining_budget(config)
+    return remaining is None or remaining >= calls * expected_latency(model)
+
+
+def choose_model(
+    node: str, config: Optional[RunnableConfig], calls_after: int = 0
+) -> str:
+    """
+    Pick the model for an LLM node given the time left in the turn, leaving
+    room for `calls_after` more LLM calls later in the turn.
+    """
+    primary, fast = NODE_MODELS.get(node, (DEFAULT_MODEL, DEFAULT_MODEL))
+    return primary if fits_budget(config, primary, 1 + calls_after) else fast
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_openai import ChatOpenAI
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# One connection pool per process, shared by every agent and every call.
+# Keep-alive connections are held long enough to span the gap between
+# turns of a conversation, so only the very first request pays for TLS.
+HTTP_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=120,
+)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# Skip pre-warming if the pool was warmed more recently than this
+PREWARM_INTERVAL = 60.0
+
+_last_prewarm = 0.0
+_prewarm_lock = threading.Lock()
+
+# Builds chat models in place of OpenAI when set, e.g. a scripted model for
+# offline replay (see set_chat_model_factory)
+_chat_model_factory: Optional[Callable[[str], "BaseChatModel"]] = None
+
+
+def _base_url() -> str:
+    return os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    """Process-wide pooled HTTP/2 client used by the synchronous graph nodes."""
+    return httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+
+@lru_cache(maxsize=None)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Process-wide pooled HTTP/2 client used by async callers."""
+    return httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+
+
+@lru_cache(maxsize=None)
+def get_async_openai_client() -> "AsyncOpenAI":
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(http_client=get_async_http_client())
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model: str = DEFAULT_MODEL) -> "ChatOpenAI":
+    """
+    Return the shared ChatOpenAI instance for `model`, built on first use.
+
+    All agents asking for the same model get the same instance, and every
+    instance talks to OpenAI through the shared connection pool and waits its
+    turn with the process-wide LLM scheduler.
+    """
+    if _chat_model_factory is not None:
+        return _chat_model_factory(model)
+
+    from src.util.scheduled_chat_model import ScheduledChatOpenAI
+
+    return ScheduledChatOpenAI(
+        model=model,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+    )
+
+
+def set_chat_model_factory(
+    factory: Optional[Callable[[str], "BaseChatModel"]],
+) -> None:
+    """
+    Build chat models with `factory(model)` instead of OpenAI, or restore
+    OpenAI with None. Agents cache their runnables, so this has to be called
+    before the graph's first run.
+    """
+    global _chat_model_factory
+    _chat_model_factory = factory
+    get_chat_model.cache_clear()
+
+
+def _should_prewarm(force: bool) -> bool:
+    global _last_prewarm
+    with _prewarm_lock:
+        now = time.monotonic()
+        if not force and now - _last_prewarm < PREWARM_INTERVAL:
+            return False
+        _last_prewarm = now
+        return True
+
+
+def _prewarm_headers() -> dict[str, str]:
+    api_key = os.getenv("OPENAI_API_KEY", "")
+    return {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+
+def prewarm(force: bool = False) -> None:
+    """
+    Open a keep-alive connection to the OpenAI API on the shared sync pool.
+
+    The request itself is cheap and its response is ignored; what matters is
+    that the TCP/TLS/HTTP2 setup is paid here instead of on the first answer.
+    """
+    if not _should_prewarm(force):
+        return
+    try:
+        get_http_client().get(f"{_base_url()}/models", headers=_prewarm_headers())
+    except httpx.HTTPError as e:
+        logger.warning(f"LLM connection pre-warm failed: {e}")
+
+
+async def aprewarm(force: bool = False) -> None:
+    """Async counterpart of `prewarm`, warming both the async and sync pools."""
+    if not _should_prewarm(force):
+        return
+    try:
+        await asyncio.gather(
+            get_async_http_client().get(
+                f"{_base_url()}/models", headers=_prewarm_headers()
+            ),
+            asyncio.to_thread(prewarm, True),
+        )
+    except httpx.HTTPError as e:
+        logger.warning(f"LLM connection pre-warm failed: {e}")
+
+
+async def aclose_http_clients() -> None:
+    """Close the shared pools on shutdown."""
+    get_http_client().close()
+    await get_async_http_client().aclose()
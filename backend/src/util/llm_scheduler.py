@@ -0,0 +1,146 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict
+
+# Priority classes, most important first. Voice callers hear every delay, web
+# chat users see a typing indicator, and SMS users expect to wait a little.
+PRIORITIES = {"voice": 0, "web": 1, "sms": 2}
+
+# How long a call may queue before it's shed, per class (seconds)
+MAX_WAIT = {"voice": 2.0, "web": 15.0, "sms": 60.0}
+
+# How many calls may queue per class before new ones are shed immediately
+MAX_QUEUED = {"voice": 50, "web": 200, "sms": 500}
+
+# The channel of the conversation being handled. Set once per turn by the
+# message handler; it's copied into the graph's worker threads along with the
+# rest of the context.
+current_channel: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_channel", default="web"
+)
+
+
+class LlmOverloaded(Exception):
+    """Raised when an LLM call is shed because the scheduler is saturated."""
+
+
+class TokenBucket:
+    """A per-minute rate limit that refills continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+
+class LlmScheduler:
+    """
+    Process-wide admission control for outbound LLM calls.
+
+    Every call takes one request from the RPM bucket and its estimated tokens
+    from the TPM bucket. Waiting calls are served strictly by priority class
+    and then in arrival order, so a burst of web chats queues behind voice
+    turns instead of pushing them into OpenAI rate-limit backoff. A call that
+    can't be admitted within its class's MAX_WAIT, or arrives when its class
+    already has MAX_QUEUED calls waiting, is shed with LlmOverloaded.
+
+    Thread-safe, since the graph runs LLM calls from worker threads.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.condition = threading.Condition()
+        self.waiting: list = []
+        self.sequence = itertools.count()
+        self.queued: Dict[str, int] = {channel: 0 for channel in PRIORITIES}
+        self.admitted: Dict[str, int] = {channel: 0 for channel in PRIORITIES}
+        self.shed: Dict[str, int] = {channel: 0 for channel in PRIORITIES}
+        self.wait_seconds: Dict[str, float] = {channel: 0.0 for channel in PRIORITIES}
+
+    def acquire(self, channel: str, tokens: int) -> float:
+        """Block until the call may go out; returns the time spent waiting."""
+        channel = channel if channel in PRIORITIES else "web"
+        start = time.monotonic()
+        deadline = start + MAX_WAIT[channel]
+        ticket = (PRIORITIES[channel], next(self.sequence))
+
+        with self.condition:
+            if self.queued[channel] >= MAX_QUEUED[channel]:
+                self.shed[channel] += 1
+                raise LlmOverloaded(f"Too many queued {channel} LLM calls")
+            heapq.heappush(self.waiting, ticket)
+            self.queued[channel] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    delay = max(
+                        self.requests.time_until(1), self.tokens.time_until(tokens)
+                    )
+                    if self.waiting[0] == ticket and delay == 0:
+                        heapq.heappop(self.waiting)
+                        self.requests.level -= 1
+                        self.tokens.level -= tokens
+                        break
+                    if now >= deadline:
+                        self.waiting.remove(ticket)
+                        heapq.heapify(self.waiting)
+                        self.shed[channel] += 1
+                        raise LlmOverloaded(
+                            f"{channel} LLM call waited over {MAX_WAIT[channel]}s"
+                        )
+                    # Woken early when another call is admitted or settled
+                    timeout = deadline - now
+                    if delay:
+                        timeout = min(timeout, delay)
+                    self.condition.wait(timeout)
+            finally:
+                self.queued[channel] -= 1
+                self.condition.notify_all()
+
+            waited = time.monotonic() - start
+            self.admitted[channel] += 1
+            self.wait_seconds[channel] += waited
+            return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the TPM bucket once the real token usage is known."""
+        with self.condition:
+            self.tokens.level += estimated_tokens - actual_tokens
+            self.condition.notify_all()
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                channel: {
+                    "queue_depth": self.queued[channel],
+                    "admitted": self.admitted[channel],
+                    "shed": self.shed[channel],
+                    "wait_seconds_total": round(self.wait_seconds[channel], 3),
+                }
+                for channel in PRIORITIES
+            }
+
+
+@lru_cache(maxsize=None)
+def get_llm_scheduler() -> LlmScheduler:
+    # Defaults match the gpt-4o-mini limits of a tier 1 OpenAI account
+    return LlmScheduler(
+        rpm=float(os.getenv("LLM_RPM", "500")),
+        tpm=float(os.getenv("LLM_TPM", "200000")),
+    )
@@ -0,0 +1,214 @@
+import bisect
+import contextvars
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Trace id of the turn being processed, so logs and spans from the adapters,
+# the graph nodes and the LLM calls of one turn can be tied together
+current_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_trace_id", default=None
+)
+
+LabelValues = Tuple[str, ...]
+# (name, type, description, [(labels, value)]) as produced by collectors
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values: Dict[LabelValues, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # Per label set: per-bucket counts (plus +Inf), sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _format_labels(self.labels, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {total[0]:g}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Process-wide metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics: List = []
+        # Called at scrape time for state that lives elsewhere, e.g. the
+        # LLM scheduler's queue depths
+        self.collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, kind, description, samples in collector():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(
+                        f"{name}{_format_labels(labels.keys(), labels.values())} {value:g}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+NODE_SECONDS = registry.register(
+    Histogram(
+        "graph_node_duration_seconds",
+        "Time spent in each graph node",
+        ("node", "channel", "status"),
+    )
+)
+TURN_SECONDS = registry.register(
+    Histogram(
+        "turn_duration_seconds",
+        "Time from receiving a message to the end of the graph run",
+        ("channel",),
+    )
+)
+LLM_SECONDS = registry.register(
+    Histogram("llm_call_duration_seconds", "Time spent in each LLM call", ("model", "channel"))
+)
+LLM_TOKENS = registry.register(
+    Counter(
+        "llm_tokens_total",
+        "Tokens used by LLM calls, by kind (prompt, completion, cached)",
+        ("model", "kind"),
+    )
+)
+SQLITE_SECONDS = registry.register(
+    Histogram("sqlite_query_duration_seconds", "Time spent in listing queries", ("query",))
+)
+LISTING_SEARCH_SECONDS = registry.register(
+    Histogram("listing_search_duration_seconds", "Listing searches by backend", ("backend",))
+)
+LISTING_REFINEMENTS = registry.register(
+    Counter(
+        "listing_refinements_total",
+        "Thread searches answered from the previous results (refined), or why the backend was searched",
+        ("outcome",),
+    )
+)
+LISTING_WARM_CACHE = registry.register(
+    Counter(
+        "listing_warm_cache_lookups_total",
+        "Searches answered by the warm cache (hit), by city and state but not warm (miss), or of another shape",
+        ("outcome",),
+    )
+)
+CALENDAR_SECONDS = registry.register(
+    Histogram(
+        "calendar_call_duration_seconds",
+        "Time spent in Google Calendar API calls",
+        ("operation", "status"),
+    )
+)
+
+
+def record_token_usage(model: str, usage: Optional[dict]) -> None:
+    """Count the tokens reported in an OpenAI `usage` block."""
+    if not usage:
+        return
+    LLM_TOKENS.inc(usage.get("prompt_tokens") or 0, model=model, kind="prompt")
+    LLM_TOKENS.inc(usage.get("completion_tokens") or 0, model=model, kind="completion")
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached:
+        LLM_TOKENS.inc(cached, model=model, kind="cached")
+
+
+@contextmanager
+def span(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """
+    Time a block into `histogram`, labelling it with `status` "ok" or
+    "error" if the histogram has a status label.
+    """
+    start = time.monotonic()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        if "status" in histogram.labels:
+            labels["status"] = status
+        histogram.observe(time.monotonic() - start, **labels)
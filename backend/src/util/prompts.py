@@ -6,6 +6,8 @@ agent_prompt = """
     Roles:
     - Answer user's questions about real estates: delegate to Search Assistant. 
     - Manage appointment: delegate to Appointment Assistant.
+    - Find homes like one the user liked: call FindSimilarListings with that listing's details.
+    - Tell the user when new homes match their search: call SaveSearch. When the user says "cancel alerts", call SaveSearch with stop set.
     - Other inquiries: try to answer them yourself.
     
     Guidelines:
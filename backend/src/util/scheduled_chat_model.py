@@ -0,0 +1,80 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Iterator, List
+
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+from src.util.llm_scheduler import current_channel, get_llm_scheduler
+from src.util.latency_budget import record_latency
+from src.util.metrics import LLM_SECONDS, record_token_usage
+
+# Tokens reserved for the completion when estimating a call's TPM cost
+COMPLETION_TOKEN_ESTIMATE = 256
+
+
+def estimate_tokens(messages: List[BaseMessage], **kwargs: Any) -> int:
+    """Rough token count (~4 characters per token) used for admission."""
+    chars = sum(len(str(m.content)) for m in messages)
+    chars += len(str(kwargs.get("tools", "")))
+    return chars // 4 + COMPLETION_TOKEN_ESTIMATE
+
+
+def _token_usage(result: ChatResult) -> dict:
+    return (result.llm_output or {}).get("token_usage") or {}
+
+
+class ScheduledChatOpenAI(ChatOpenAI):
+    """ChatOpenAI that waits for the process-wide LLM scheduler before each call."""
+
+    def _record(self, start: float, result: ChatResult) -> None:
+        elapsed = time.monotonic() - start
+        record_latency(self.model_name, elapsed)
+        LLM_SECONDS.observe(elapsed, model=self.model_name, channel=current_channel.get())
+        record_token_usage(self.model_name, _token_usage(result))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        estimate = estimate_tokens(messages, **kwargs)
+        get_llm_scheduler().acquire(current_channel.get(), estimate)
+        start = time.monotonic()
+        result = super()._generate(messages, stop, run_manager, **kwargs)
+        self._record(start, result)
+        actual = _token_usage(result).get("total_tokens")
+        if actual is not None:
+            get_llm_scheduler().settle(estimate, actual)
+        return result
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        estimate = estimate_tokens(messages, **kwargs)
+        await asyncio.to_thread(
+            get_llm_scheduler().acquire, current_channel.get(), estimate
+        )
+        start = time.monotonic()
+        result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        self._record(start, result)
+        actual = _token_usage(result).get("total_tokens")
+        if actual is not None:
+            get_llm_scheduler().settle(estimate, actual)
+        return result
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        get_llm_scheduler().acquire(
+            current_channel.get(), estimate_tokens(messages, **kwargs)
+        )
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.to_thread(
+            get_llm_scheduler().acquire,
+            current_channel.get(),
+            estimate_tokens(messages, **kwargs),
+        )
+        async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+            yield chunk
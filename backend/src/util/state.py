@@ -12,6 +12,12 @@ class SearchCriteria(TypedDict):
     bathrooms: Optional[int]
     max_price: Optional[float]
     min_price: Optional[float]
+    min_sqft: Optional[int]
+    max_price_per_sqft: Optional[float]
+    status: Optional[str]
+    sold_after: Optional[str]
+    near_zip: Optional[str]
+    radius_miles: Optional[float]
 
 
 def update_search_criteria(
@@ -36,8 +42,23 @@ def update_search_criteria(
         result["state"] = new["state"]
         result.pop("city", None)
     
+    # A zip code replaces the city it's searched instead of, and a new
+    # location drops the old radius search unless it restates it
+    if city_in_new or state_in_new or "near_zip" in new:
+        if not (city_in_new or state_in_new):
+            result.pop("city", None)
+            result.pop("state", None)
+        for key in ["near_zip", "radius_miles"]:
+            if key in new:
+                result[key] = new[key]
+            else:
+                result.pop(key, None)
+
     # Merge the remaining criteria
-    for key in ["min_bedroom", "min_bathroom", "max_price", "min_price"]:
+    for key in [
+        "min_bedroom", "min_bathroom", "max_price", "min_price",
+        "min_sqft", "max_price_per_sqft", "status", "sold_after", "radius_miles",
+    ]:
         if key in new:
             result[key] = new[key]
     
@@ -0,0 +1,157 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from src.util.metrics import current_trace_id
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "json" for one object per line, "text" for humans at a terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Longest message or field written; payloads and transcripts are cut to this
+MAX_FIELD_LENGTH = int(os.getenv("LOG_MAX_FIELD_LENGTH", "300"))
+# Share of DEBUG records kept; the rest are dropped before they're queued.
+# All of them by default, so LOG_LEVEL=DEBUG logs everything; sampling is
+# opt-in, e.g. 0.01 to keep DEBUG on under production load
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+CORRELATION_FIELDS = ("call_id", "thread_id", "trace_id")
+
+# Correlation ids for the connection or turn being handled. Bound once per
+# task; asyncio tasks and asyncio.to_thread copy it, so records from the
+# graph's worker threads carry the same ids.
+log_context: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar(
+    "log_context", default=None
+)
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_log_context(**fields: Any) -> None:
+    """Attach correlation ids to every record logged from this context."""
+    log_context.set({**(log_context.get() or {}), **{k: str(v) for k, v in fields.items()}})
+
+
+def truncate(value: Any, limit: int = MAX_FIELD_LENGTH) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...(+{len(text) - limit} chars)"
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds correlation ids to records and samples DEBUG records.
+
+    Runs in the logging thread (the caller), before the record is queued,
+    so it sees the caller's context variables and dropped records cost no
+    more than this check.
+    """
+
+    def __init__(self, debug_sample_rate: float = DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and random.random() >= self.debug_sample_rate:
+            return False
+        context = log_context.get() or {}
+        for field in CORRELATION_FIELDS:
+            if getattr(record, field, None) is None:
+                setattr(record, field, context.get(field))
+        if record.trace_id is None:
+            record.trace_id = current_trace_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Like QueueHandler.prepare, but the traceback is kept apart from the
+        # message so truncating the message never cuts it
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with every field truncated."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": truncate(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key in _RECORD_ATTRS or value is None:
+                continue
+            entry[key] = value if isinstance(value, (int, float, bool)) else truncate(value)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()}"
+        ids = " ".join(
+            f"{field}={getattr(record, field)}"
+            for field in CORRELATION_FIELDS
+            if getattr(record, field, None)
+        )
+        line = truncate(line) + (f" [{ids}]" if ids else "")
+        return f"{line}\n{record.exc_text}" if record.exc_text else line
+
+
+def configure_logging(
+    level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None
+) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue drained by a background thread.
+
+    Callers, including coroutines on the event loop, only pay for building
+    the record and putting it on the queue; formatting and the write to
+    stdout happen on the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    records: queue.Queue = queue.Queue(-1)
+    handler = _QueueHandler(records)
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
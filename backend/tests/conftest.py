@@ -0,0 +1,72 @@
+"""
+A tiny real_estate table and every listing backend over it.
+
+The table has NULLs in the filtered columns, prices either side of bounds
+that float32 can't represent, and more matches than a small limit.
+"""
+
+import sqlite3
+
+import pytest
+
+from data.generate_listings import CREATE_INDEXES, CREATE_TABLE
+from src.listings.sqlite_backend import SqliteListings
+
+# (price, bed, bath, city, state, zip_code, house_size, acre_lot, status, street, prev_sold_date, price_per_sqft)
+ROWS = [
+    (250000, 3, 2, "Austin", "TX", "78701", 1500, 0.2, "for_sale", 1, "2019-05-01", 166.67),
+    (300000, 3, 2, "Austin", "TX", "78702", 2000, 0.3, "sold", 2, "2021-03-10", 150.0),
+    (None, 4, 3, "Austin", "TX", "78701", 2500, None, "for_sale", 3, None, None),
+    (450000, None, 2, "Austin", "TX", "78703", None, 0.1, "for_sale", 4, "2015-01-01", None),
+    (299999, 2, 1, "Dallas", "TX", "75201", 1000, 0.1, "for_sale", 5, None, 299.99),
+    (300001, 5, None, "Dallas", "TX", "75202", 3000, 1.0, "ready_to_build", 6, None, 100.0),
+    (180000, 2, 1, None, "TX", "75203", 900, None, "for_sale", 7, "2020-06-30", 200.0),
+    (520000, 4, 3, "Miami", "FL", "33101", 2600, 0.25, "for_sale", 8, "2018-11-11", 200.0),
+    (75000, 1, 1, "Miami", "FL", "33102", 500, None, "sold", 9, "2022-01-01", 150.0),
+    (610000, 3, 2, "Denver", None, "80201", 1800, 0.5, "for_sale", 10, None, 338.89),
+    (300000, 3, 2, "Austin", "TX", "78701", 1600, 0.2, "for_sale", 11, "2023-02-02", 187.5),
+]
+
+def streets(listings):
+    return [listing["street"] for listing in listings]
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("listings") / "listings.db")
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_TABLE)
+    conn.executemany(f"INSERT INTO real_estate VALUES ({', '.join('?' * len(ROWS[0]))})", ROWS)
+    conn.executescript(CREATE_INDEXES)
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture(scope="module", params=["sqlite", "numpy", "snapshot", "duckdb", "sharded"])
+def backend(request, db_path, tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp(request.param) / "listings")
+    if request.param == "sqlite":
+        return SqliteListings(db_path)
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        from src.listings.numpy_backend import NumpyListings
+
+        return NumpyListings.from_sqlite(db_path)
+    if request.param == "snapshot":
+        pytest.importorskip("numpy")
+        from src.listings.snapshot import SnapshotListings, build_snapshot
+
+        build_snapshot(db_path, directory)
+        return SnapshotListings(directory)
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb")
+        pytest.importorskip("pyarrow")
+        from src.listings.duckdb_backend import DuckDBListings, write_parquet
+
+        write_parquet(db_path, directory)
+        return DuckDBListings(directory)
+    from src.listings.sharded_backend import ShardedListings, write_shards
+
+    write_shards(db_path, directory)
+    return ShardedListings(directory)
@@ -0,0 +1,52 @@
+"""
+Every listing backend answers the same searches as SQLite, over the tiny
+table in conftest.py, in rowid order. Run from the backend directory:
+    python -m pytest tests
+"""
+
+import pytest
+
+from src.listings.sqlite_backend import SqliteListings
+from tests.conftest import streets
+
+SEARCHES = [
+    {},
+    {"state": "TX"},
+    {"city": "Austin", "state": "TX"},
+    {"city": "Nowhere"},
+    {"min_bedroom": 3},
+    {"min_bedroom": 2.5},
+    {"min_bathroom": 2},
+    {"min_sqft": 1500},
+    {"max_price_per_sqft": 200},
+    {"status": "sold"},
+    {"sold_after": "2019-12-31"},
+    # float32 holds neither bound; 300000 itself is on the wrong side of both
+    {"max_price": 299999.99},
+    {"min_price": 300000.01},
+    {"max_price": 300000},
+    {"min_price": 250000, "max_price": 450000},
+    {"zip_codes": ["78701", "33101"]},
+    {"zip_codes": ["99999"]},
+    {"zip_codes": []},
+    {"state": "TX", "zip_codes": ["78701", "75201"], "min_bedroom": 3},
+]
+
+
+
+def test_sqlite_semantics(db_path):
+    sqlite = SqliteListings(db_path)
+    # No filter: every row, NULLs included, in rowid order
+    assert streets(sqlite.search({}, 100)) == list(range(1, 12))
+    # A bound never matches NULL
+    assert 3 not in streets(sqlite.search({"max_price": 10**9}, 100))
+    assert 4 not in streets(sqlite.search({"min_bedroom": 0}, 100))
+    assert streets(sqlite.search({"max_price": 299999.99}, 100)) == [1, 5, 7, 9]
+    assert streets(sqlite.search({"min_price": 300000.01}, 100)) == [4, 6, 8, 10]
+    assert streets(sqlite.search({"zip_codes": ["78701", "33101"]}, 100)) == [1, 3, 8, 11]
+
+
+@pytest.mark.parametrize("criteria", SEARCHES, ids=repr)
+@pytest.mark.parametrize("limit", [2, 100])
+def test_same_results_as_sqlite(backend, db_path, criteria, limit):
+    assert backend.search(criteria, limit) == SqliteListings(db_path).search(criteria, limit)
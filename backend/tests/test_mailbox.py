@@ -0,0 +1,83 @@
+"""Bursts of messages through the thread mailbox, against a stand-in graph."""
+
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+adapters = importlib.import_module("app-retell.adapters")
+mailbox = importlib.import_module("app-retell.mailbox")
+message_handler = importlib.import_module("app-retell.message_handler")
+
+
+class ApprovalGraph:
+    """A thread parked on a booking that awaits the user's approval."""
+
+    def __init__(self):
+        self.pending = True
+        self.inputs = []
+
+    def get_state(self, config):
+        if not self.pending:
+            return SimpleNamespace(next=(), values={"messages": []})
+        booking = AIMessage(content="", tool_calls=[{"name": "book_appointment", "args": {}, "id": "call_1"}])
+        return SimpleNamespace(next=("sensitive_appointment_tools",), values={"messages": [booking]})
+
+    def stream(self, graph_input, config, stream_mode):
+        self.inputs.append(graph_input)
+        self.pending = False
+        yield {"agent": {"messages": [AIMessage(content=f"reply {len(self.inputs)}")]}}
+
+
+async def burst(graph, contents):
+    adapter = adapters.SMSAdapter(contents[0])
+    config = {"configurable": {"user_id": "+15550001", "thread_id": "sms_+15550001", "channel": "sms"}}
+
+    async def run(batch):
+        await message_handler.process_message(adapter, adapter, graph, config, message_handler.burst_input(batch))
+
+    threads = mailbox.ThreadMailbox(window=0.05)
+    await asyncio.gather(*(threads.submit("sms_+15550001", content, run) for content in contents))
+    return threads, adapter
+
+
+def test_approval_then_trailing_message():
+    graph = ApprovalGraph()
+    threads, adapter = asyncio.run(burst(graph, ["Yes", "please"]))
+
+    assert threads.runs == 1
+    # "Yes" alone approves the booking; "please" is the next turn, not a rejection
+    assert graph.inputs == [None, {"messages": [HumanMessage(content="please")]}]
+    assert adapter.responses == ["reply 1", "reply 2"]
+
+
+def test_burst_without_approval_is_one_message():
+    graph = ApprovalGraph()
+    graph.pending = False
+    asyncio.run(burst(graph, ["3 bedrooms", "in Austin"]))
+
+    assert graph.inputs == [{"messages": [HumanMessage(content="3 bedrooms\nin Austin")]}]
+
+
+def test_cancelled_leader_hands_on_its_batch():
+    turns = []
+
+    async def run(batch):
+        turns.append(batch)
+
+    async def scenario():
+        threads = mailbox.ThreadMailbox(window=0.05)
+        leader = asyncio.create_task(threads.submit("web_1", "first", run))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(threads.submit("web_1", "second", run))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower is True
+        # The thread isn't stranded for later messages either
+        assert await asyncio.wait_for(threads.submit("web_1", "third", run), 1) is True
+        return leader
+
+    leader = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert turns == [["second"], ["third"]]
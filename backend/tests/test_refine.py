@@ -0,0 +1,23 @@
+"""Follow-up searches answered from the thread's previous results, per listing backend."""
+
+from src.listings.refine import RefiningSearch
+from src.listings.sqlite_backend import SqliteListings
+
+
+def test_refine_narrowing_and_widening(backend, db_path):
+    sqlite = SqliteListings(db_path)
+    refine = RefiningSearch(candidates=20)
+    steps = [
+        ({"state": "TX"}, "new_thread"),
+        ({"state": "TX", "min_bedroom": 3}, "refined"),
+        ({"state": "TX", "min_bedroom": 3, "zip_codes": ["78701", "78702"]}, "refined"),
+        ({"state": "TX", "min_bedroom": 3, "zip_codes": ["78701"], "max_price": 299999.99}, "refined"),
+        # Refined searches keep the first search's candidates
+        ({"state": "TX", "min_bedroom": 2}, "refined"),
+        ({"min_bedroom": 3}, "widened"),
+        ({}, "widened"),
+    ]
+    for criteria, outcome in steps:
+        results, how = refine.search(backend, "thread", criteria, 2)
+        assert how == outcome, criteria
+        assert results == sqlite.search(criteria, 2), criteria
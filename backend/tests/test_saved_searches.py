@@ -0,0 +1,55 @@
+"""Saved-search matching at ingest, against SQLite over the same listings."""
+
+import pytest
+
+from src.listings.sqlite_backend import SqliteListings
+from tests.conftest import streets
+
+
+def test_saved_search_matches_sqlite(db_path):
+    pytest.importorskip("numpy")
+    from src.listings.saved_searches import SavedSearchIndex, listings_since
+
+    searches = [
+        ("austin", {"state": "TX", "city": "Austin", "max_price": 300000}),
+        ("texas", {"state": "TX", "min_bedroom": 3}),
+        ("cheap", {"max_price": 299999.99}),
+        ("miami", {"state": "FL", "city": "Miami", "status": "sold"}),
+        ("sized", {"city": "Austin", "min_sqft": 1600}),
+        ("for_sale", {"status": "for_sale", "min_bathroom": 2}),
+    ]
+    matches = SavedSearchIndex(searches, db_path).match(listings_since(db_path, 0), limit=100)
+    sqlite = SqliteListings(db_path)
+    for thread_id, criteria in searches:
+        found = sorted(listing["street"] for match, listing in matches if match == thread_id)
+        assert found == sorted(streets(sqlite.search(criteria, 100))), thread_id
+
+
+def test_alert_claims_are_not_shared(tmp_path):
+    from src.listings.saved_searches import SAVED_SEARCH_CLAIM_LEASE_SECONDS, SavedSearches
+
+    path = str(tmp_path / "saved_searches.db")
+    first, second = SavedSearches(path), SavedSearches(path)
+    first.enqueue_alerts([("sms_+15550001", {"street": 1})])
+
+    assert [alert["listing"] for alert in first.claim_alerts()] == [{"street": 1}]
+    assert second.claim_alerts() == []
+    # A worker starting up leaves the others' claims alone
+    assert SavedSearches(path).claim_alerts() == []
+
+    with second.conn:
+        second.conn.execute(
+            "UPDATE search_alerts SET claimed_at = claimed_at - ?", (SAVED_SEARCH_CLAIM_LEASE_SECONDS + 1,)
+        )
+    assert [alert["listing"] for alert in second.claim_alerts()] == [{"street": 1}]
+
+
+def test_alert_text_avoids_carrier_keywords():
+    import importlib
+    import re
+
+    sms_pipeline = importlib.import_module("app-retell.sms_pipeline")
+    text = sms_pipeline.alert_text([{"bed": 3, "bath": 2, "city": "Austin", "state": "TX", "price": 250000}])
+    assert "Reply 'cancel alerts'" in text
+    # Carriers act on these replies themselves, opting the number out of every text
+    assert not re.search(r"\b(stop|stopall|unsubscribe|cancel|end|quit)\b", text.replace("cancel alerts", ""), re.I)
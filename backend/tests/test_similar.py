@@ -0,0 +1,67 @@
+"""The similarity index against reloads of the listings, as csv_to_sql.py does them."""
+
+import sqlite3
+
+import pytest
+
+from data.generate_listings import CREATE_TABLE
+from src.listings import LOAD_TABLE, StaleLoad
+from src.listings.geo import has_zip_centroids, load_zip_centroids, refresh_city_centroids
+from tests.conftest import ROWS
+
+pytest.importorskip("numpy")
+
+from src.listings.similar import SimilarityIndex, similar_listings  # noqa: E402
+
+CENTROIDS = [
+    ("78701", 30.27, -97.74),
+    ("78702", 30.26, -97.71),
+    ("75201", 32.79, -96.80),
+    ("33101", 25.78, -80.19),
+]
+
+
+def load(db_path, load_id, rows):
+    """Replaces real_estate with `rows` under a new load id, like csv_to_sql.py."""
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS real_estate")
+        conn.execute(CREATE_TABLE)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {LOAD_TABLE} (load_id TEXT)")
+        conn.execute(f"DELETE FROM {LOAD_TABLE}")
+        conn.execute(f"INSERT INTO {LOAD_TABLE} VALUES (?)", (load_id,))
+        conn.executemany(f"INSERT INTO real_estate VALUES ({', '.join('?' * len(rows[0]))})", rows)
+    conn.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "listings.db")
+    load(path, "first", ROWS)
+    csv_path = tmp_path / "zips.csv"
+    csv_path.write_text("zip_code,latitude,longitude\n" + "".join(f"{z},{lat},{lon}\n" for z, lat, lon in CENTROIDS))
+    load_zip_centroids(str(csv_path), path)
+    return path
+
+
+def test_index_refused_after_reload(db_path, tmp_path):
+    index_path = SimilarityIndex.build(db_path).save(str(tmp_path / "similar.npz"))
+    index = SimilarityIndex.load(index_path)
+    assert index.load_id == "first"
+    assert similar_listings({"price": 250000, "bed": 3, "zip_code": "78701"}, 2, db_path, index)
+
+    # The centroids outlive the reload; the old index's rowids don't
+    load(db_path, "second", list(reversed(ROWS)))
+    assert has_zip_centroids(db_path)
+    with pytest.raises(StaleLoad):
+        similar_listings({"price": 250000, "bed": 3, "zip_code": "78701"}, 2, db_path, index)
+    index = SimilarityIndex.load(SimilarityIndex.build(db_path).save(index_path))
+    assert similar_listings({"price": 250000, "bed": 3, "zip_code": "78701"}, 2, db_path, index)
+
+
+def test_city_centroids_follow_the_listings(db_path):
+    load(db_path, "second", [row for row in ROWS if row[3] != "Miami"])
+    assert refresh_city_centroids(db_path) == 2
+    conn = sqlite3.connect(db_path)
+    assert [row[0] for row in conn.execute("SELECT city FROM city_centroids ORDER BY city")] == ["Austin", "Dallas"]
+    conn.close()
@@ -0,0 +1,59 @@
+"""The SMS queue shared by several worker processes, each with its own connection."""
+
+import importlib
+import sqlite3
+
+import pytest
+
+sms_pipeline = importlib.import_module("app-retell.sms_pipeline")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sms_queue.db")
+
+
+def age_claims(path, seconds):
+    conn = sqlite3.connect(path)
+    with conn:
+        for table in ("sms_inbound", "sms_outbound"):
+            conn.execute(f"UPDATE {table} SET claimed_at = claimed_at - ?", (seconds,))
+    conn.close()
+
+
+def test_claims_are_not_shared(path):
+    first, second = sms_pipeline.SmsQueue(path), sms_pipeline.SmsQueue(path)
+    first.enqueue_inbound("+15550001", "hello")
+    first.enqueue_outbound("+15550001", "hi")
+
+    assert first.claim_inbound()["body"] == "hello"
+    assert second.claim_inbound() is None
+    assert len(first.claim_outbound_batch(10)) == 1
+    assert second.claim_outbound_batch(10) == []
+
+    # A worker starting up leaves the others' claims alone
+    assert sms_pipeline.SmsQueue(path).claim_inbound() is None
+
+
+def test_expired_claims_are_taken_over(path):
+    first, second = sms_pipeline.SmsQueue(path), sms_pipeline.SmsQueue(path)
+    first.enqueue_inbound("+15550001", "hello")
+    first.enqueue_outbound("+15550001", "hi")
+    first.claim_inbound()
+    first.claim_outbound_batch(10)
+
+    age_claims(path, sms_pipeline.CLAIM_LEASE_SECONDS + 1)
+    job = second.claim_inbound()
+    assert job["body"] == "hello" and job["attempts"] == 1
+    assert [row["body"] for row in second.claim_outbound_batch(10)] == ["hi"]
+    assert first.claim_inbound() is None
+
+
+def test_sender_waits_for_its_turn_in_flight(path):
+    queue = sms_pipeline.SmsQueue(path)
+    queue.enqueue_inbound("+15550001", "first")
+    job = queue.claim_inbound()
+    queue.enqueue_inbound("+15550001", "second")
+    assert queue.claim_inbound() is None
+    queue.complete_inbound(job["ids"])
+    assert queue.claim_inbound()["body"] == "second"
@@ -0,0 +1,24 @@
+"""Listings snapshots, as csv_to_sql.py writes them."""
+
+import sqlite3
+
+import pytest
+
+from data.generate_listings import CREATE_TABLE
+
+pytest.importorskip("numpy")
+
+from src.listings.snapshot import SnapshotListings, build_snapshot  # noqa: E402
+
+
+def test_empty_table(tmp_path):
+    db_path = str(tmp_path / "listings.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(CREATE_TABLE)
+    conn.close()
+    directory = str(tmp_path / "snapshots")
+    build_snapshot(db_path, directory)
+
+    listings = SnapshotListings(directory)
+    assert listings.search({}, 10) == []
+    assert listings.search({"state": "TX", "max_price": 300000}, 10) == []
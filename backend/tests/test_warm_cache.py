@@ -0,0 +1,40 @@
+"""Warm cache lookups and market summaries, per listing backend."""
+
+from src.listings.sqlite_backend import SqliteListings
+from src.listings.warm_cache import QueryLog, WarmCache, cache_key
+
+
+def test_warm_cache_matches_backend(backend, db_path, tmp_path):
+    markets = [
+        {"state": "TX", "city": "Austin"},
+        {"state": "TX", "city": "Austin", "min_bedroom": 3},
+        {"state": "FL", "city": "Miami"},
+    ]
+    query_log = QueryLog(str(tmp_path / "query_log.db"))
+    for criteria in markets:
+        query_log.record(cache_key(criteria))
+    cache = WarmCache(lambda: backend, query_log, db_path, keys=8, listings=10)
+    assert cache.refresh() == len(markets)
+
+    for criteria in markets:
+        results, _ = cache.lookup(criteria, 2)
+        assert results == backend.search(criteria, 2)
+    # Listings without a bed count don't meet a bedroom minimum
+    assert cache.summary(markets[1]) == {
+        "listings": 4,
+        "min_price": 250000,
+        "max_price": 300000,
+        "average_price": 283000,
+        "average_price_per_sqft": 168,
+    }
+    assert cache.lookup({"state": "TX", "city": "Austin", "min_price": 1}) is None
+
+
+def test_refresh_failure_leaves_cache_cold(tmp_path):
+    # A database without the real_estate table, as before the first load
+    db_path = str(tmp_path / "empty.db")
+    query_log = QueryLog(str(tmp_path / "query_log.db"))
+    query_log.record(("TX", "Austin", 0))
+    cache = WarmCache(lambda: SqliteListings(db_path), query_log, db_path)
+    assert cache.refresh() == 0
+    assert cache.lookup({"state": "TX", "city": "Austin"}) is None